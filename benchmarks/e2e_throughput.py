@@ -0,0 +1,404 @@
+"""
+생성 엔드포인트 종단 간(end-to-end) 처리량 벤치마크
+
+로컬 LLM 대역 서버(mock_llm_server.py)를 띄우고, 각 앱을 별도 프로세스로 실행한 뒤
+생성 엔드포인트에 정해진 동시성으로 요청을 보내 처리량과 지연 시간을 측정합니다.
+
+    main5      project/main5.py     POST /generate_conversation/
+    streamlit  streamlit/main.py    POST /generate-stream/ (NDJSON 스트림)
+    main4      project/main4.py     POST /generate_dialogues
+    main4-stream  project/main4.py  POST /generate_dialogues_stream (NDJSON 스트림)
+
+측정 항목 (동시성 단계마다 서버를 새로 띄워 측정):
+    - 초당 요청 수(rps), 지연 시간 p50/p95/p99
+    - 첫 청크까지 시간(응답 본문의 첫 바이트), 첫 레코드까지 시간(상태 메시지가 아닌 첫 NDJSON 줄, 스트리밍 대상만)
+    - 서버 프로세스의 CPU 사용률과 RSS (psutil이 있으면 psutil, 없으면 /proc에서 읽음)
+
+요청마다 seed를 다르게 하고 캐시/체크포인트/수락 제어를 끄므로, 모든 요청이 실제로 LLM 대역을 호출합니다.
+결과는 JSON 파일(기본값: benchmarks/results/)로 저장되고, --compare로 이전 결과와 비교할 수 있습니다.
+
+실행 예시:
+    python benchmarks/e2e_throughput.py
+    python benchmarks/e2e_throughput.py --targets main5 --concurrency 1,8,16 --requests 32 --tokens-per-sec 200
+    python benchmarks/e2e_throughput.py --compare benchmarks/results/e2e-20250601-120000-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+
+from mock_llm_server import MockConfig, build_app
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+sys.path.insert(0, str(ROOT_DIR / "project"))
+from llm_common.token_budget import percentile  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TARGETS = {
+    "main5": {
+        "cwd": ROOT_DIR / "project",
+        "app": "main5:app",
+        "path": "/generate_conversation/",
+        "upstream_env": "LM_STUDIO_API_URL",
+        "upstream_path": "/v1/chat/completions",
+        "streaming": False,
+    },
+    "streamlit": {
+        "cwd": ROOT_DIR / "streamlit",
+        "app": "main:app",
+        "path": "/generate-stream/",
+        "upstream_env": "LM_STUDIO_API_URL",
+        "upstream_path": "/v1/chat/completions",
+        "streaming": True,
+    },
+    "main4": {
+        "cwd": ROOT_DIR / "project",
+        "app": "main4:app",
+        "path": "/generate_dialogues",
+        "upstream_env": "LM_STUDIO_COMPLETIONS_URL",
+        "upstream_path": "/v1/completions",
+        "streaming": False,
+    },
+    "main4-stream": {
+        "cwd": ROOT_DIR / "project",
+        "app": "main4:app",
+        "path": "/generate_dialogues_stream",
+        "upstream_env": "LM_STUDIO_COMPLETIONS_URL",
+        "upstream_path": "/v1/completions",
+        "streaming": True,
+    },
+}
+
+# 측정을 흐리는 기능은 끄고, 나머지(백엔드 동시성 한도, 재시도, 헤징 등)는 기본값 그대로 측정
+BENCH_ENV = {
+    "LLM_CACHE_ENABLED": "false",
+    "LLM_CHECKPOINT_ENABLED": "false",
+    "LLM_ADMISSION_MAX_IN_FLIGHT": "0",
+    "LLM_ADMISSION_MAX_QUEUED_DATES": "0",
+    "LLM_ADMISSION_CLIENT_MAX_IN_FLIGHT": "0",
+    "LLM_ADMISSION_CLIENT_MAX_QUEUED_DATES": "0",
+}
+
+
+def free_port() -> int:
+    """사용 가능한 로컬 포트 반환"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(port: int, config: MockConfig) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(build_app(config), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def start_target(name: str, port: int, mock_url: str) -> subprocess.Popen:
+    target = TARGETS[name]
+    env = {key: value for key, value in os.environ.items() if key not in ("LLM_BACKENDS", "LLM_BACKENDS_FILE")}
+    env.update(BENCH_ENV)
+    env[target["upstream_env"]] = mock_url + target["upstream_path"]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target["app"], "--port", str(port), "--log-level", "warning"],
+        cwd=target["cwd"],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1.0)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"{name} 서버가 시작되지 않았습니다.")
+
+
+def build_payload(name: str, index: int, dates: int) -> Dict:
+    """요청마다 seed를 달리해 요청 병합이 일어나지 않게 함 (같은 index면 커밋이 달라도 같은 프롬프트)"""
+    if name.startswith("main4"):
+        return {
+            "name": "Alice",
+            "age": 17,
+            "gender": "female",
+            "situation": "학교 생활",
+            "start_date": "2025-06-01",
+            "step_days": 1,
+            "num_dialogues_per_step": dates,
+            "seed": index,
+        }
+    return {
+        "person_name": "Alice",
+        "age": 17,
+        "gender": "female",
+        "situation": "학교 생활",
+        "step_days": 1,
+        "num_conversations": dates,
+        "use_cache": False,
+        "seed": index,
+    }
+
+
+def process_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """(누적 CPU 시간(초), RSS(바이트)). 읽을 수 없으면 None"""
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            cpu = process.cpu_times()
+            return cpu.user + cpu.system, process.memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+async def sample_server(pid: int, interval: float, samples: List[Tuple[float, float, int]]) -> None:
+    while True:
+        usage = process_usage(pid)
+        if usage is not None:
+            samples.append((time.perf_counter(), *usage))
+        await asyncio.sleep(interval)
+
+
+def summarize_server(samples: List[Tuple[float, float, int]]) -> Optional[Dict]:
+    if len(samples) < 2:
+        return None
+    cpu_percents = [
+        (cpu - prev_cpu) / (t - prev_t) * 100
+        for (prev_t, prev_cpu, _), (t, cpu, _) in zip(samples, samples[1:])
+        if t > prev_t
+    ]
+    (first_t, first_cpu, _), (last_t, last_cpu, _) = samples[0], samples[-1]
+    rss_mb = [rss / (1024 * 1024) for _, _, rss in samples]
+    return {
+        "cpu_percent_mean": round((last_cpu - first_cpu) / (last_t - first_t) * 100, 1),
+        "cpu_percent_max": round(max(cpu_percents), 1),
+        "cpu_seconds": round(last_cpu - first_cpu, 3),
+        "rss_mb_mean": round(statistics.mean(rss_mb), 1),
+        "rss_mb_peak": round(max(rss_mb), 1),
+    }
+
+
+def latency_summary(values: List[float]) -> Optional[Dict]:
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "mean": round(statistics.mean(values), 1),
+        "max": round(max(values), 1),
+    }
+
+
+async def timed_request(client: httpx.AsyncClient, name: str, payload: Dict) -> Dict:
+    """상태 코드, 전체 지연 시간, 첫 청크/첫 레코드까지 시간(ms)"""
+    started = time.perf_counter()
+    first_chunk = first_record = None
+    pending = b""
+    async with client.stream("POST", TARGETS[name]["path"], json=payload) as response:
+        async for chunk in response.aiter_bytes():
+            if not chunk:
+                continue
+            now = (time.perf_counter() - started) * 1000
+            if first_chunk is None:
+                first_chunk = now
+            if TARGETS[name]["streaming"] and first_record is None:
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    if line.strip() and "status" not in json.loads(line):
+                        first_record = now
+                        break
+    latency = (time.perf_counter() - started) * 1000
+    ok = response.status_code == 200
+    if ok and not TARGETS[name]["streaming"]:
+        first_record = latency # 스트리밍하지 않는 엔드포인트는 응답이 끝나야 레코드를 쓸 수 있음
+    return {"status": response.status_code, "ok": ok, "latency_ms": latency, "first_chunk_ms": first_chunk, "first_record_ms": first_record}
+
+
+async def run_level(base_url: str, name: str, pid: int, concurrency: int, requests: int, dates: int) -> Dict:
+    """concurrency개의 클라이언트가 요청 requests개를 나눠서 차례로 보냄 (closed loop)"""
+    results: List[Dict] = []
+    samples: List[Tuple[float, float, int]] = []
+    next_index = iter(range(requests)) # 단계마다 같은 요청 목록 (서버도 단계마다 새로 띄움)
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        for index in next_index:
+            try:
+                results.append(await timed_request(client, name, build_payload(name, index, dates)))
+            except httpx.HTTPError as e:
+                results.append({"status": type(e).__name__, "ok": False, "latency_ms": None, "first_chunk_ms": None, "first_record_ms": None})
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        sampler = asyncio.create_task(sample_server(pid, 0.25, samples))
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+        sampler.cancel()
+        usage = process_usage(pid)
+        if usage is not None:
+            samples.append((time.perf_counter(), *usage))
+
+    succeeded = [r for r in results if r["ok"]]
+    status_codes: Dict[str, int] = {}
+    for r in results:
+        status_codes[str(r["status"])] = status_codes.get(str(r["status"]), 0) + 1
+    return {
+        "target": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "dates_per_request": dates,
+        "succeeded": len(succeeded),
+        "status_codes": status_codes,
+        "duration_s": round(duration, 3),
+        "rps": round(len(succeeded) / duration, 3),
+        "dates_per_s": round(len(succeeded) * dates / duration, 3),
+        "latency_ms": latency_summary([r["latency_ms"] for r in succeeded]),
+        "first_chunk_ms": latency_summary([r["first_chunk_ms"] for r in succeeded if r["first_chunk_ms"] is not None]),
+        "first_record_ms": latency_summary([r["first_record_ms"] for r in succeeded if r["first_record_ms"] is not None]),
+        "server": summarize_server(samples),
+    }
+
+
+def git_revision() -> Dict:
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """(대상, 동시성)이 같은 단계끼리 rps와 지연 시간 p50/p95 변화율(%)"""
+    previous = {(r["target"], r["concurrency"]): r for r in baseline["results"]}
+
+    def change(new, old) -> Optional[float]:
+        return round((new - old) / old * 100, 1) if new is not None and old else None
+
+    rows = []
+    for r in current["results"]:
+        old = previous.get((r["target"], r["concurrency"]))
+        if old is None:
+            continue
+        rows.append({
+            "target": r["target"],
+            "concurrency": r["concurrency"],
+            "rps": [old["rps"], r["rps"], change(r["rps"], old["rps"])],
+            **{
+                f"latency_{p}_ms": [old["latency_ms"][p], r["latency_ms"][p], change(r["latency_ms"][p], old["latency_ms"][p])]
+                for p in ("p50", "p95")
+                if old["latency_ms"] and r["latency_ms"]
+            },
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="생성 엔드포인트 종단 간 처리량/지연 시간 측정 (LLM 대역 서버 사용)")
+    parser.add_argument("--targets", default="main5,streamlit,main4", help=f"쉼표로 구분 ({', '.join(TARGETS)})")
+    parser.add_argument("--concurrency", default="1,4,8", help="쉼표로 구분한 동시성 단계")
+    parser.add_argument("--requests", type=int, default=16, help="동시성 단계마다 보낼 요청 수")
+    parser.add_argument("--dates", type=int, default=2, help="요청 하나에서 생성할 날짜(회차) 수")
+    parser.add_argument("--ttft", type=float, default=0.3, help="LLM 대역의 첫 토큰까지 시간(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0, help="LLM 대역의 생성 속도")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과 JSON 경로 (기본값: benchmarks/results/e2e-<시각>-<커밋>.json)")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 경로")
+    args = parser.parse_args()
+
+    targets = [name.strip() for name in args.targets.split(",") if name.strip()]
+    unknown = [name for name in targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"알 수 없는 대상: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    mock_config = MockConfig(
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+    mock_port = free_port()
+    mock = start_mock(mock_port, mock_config)
+    revision = git_revision()
+    results = []
+    try:
+        for name in targets:
+            for concurrency in levels:
+                app_port = free_port()
+                proc = start_target(name, app_port, f"http://127.0.0.1:{mock_port}")
+                try:
+                    level = asyncio.run(run_level(
+                        f"http://127.0.0.1:{app_port}", name, proc.pid, concurrency, args.requests, args.dates,
+                    ))
+                finally:
+                    proc.terminate()
+                    proc.wait()
+                print(f"{name} 동시성 {concurrency}: {level['rps']} rps, p95 {(level['latency_ms'] or {}).get('p95')} ms", file=sys.stderr)
+                results.append(level)
+    finally:
+        mock.should_exit = True
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git": revision,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "server_usage_source": "psutil" if psutil is not None else "/proc",
+            "mock": asdict(mock_config),
+            "requests": args.requests,
+            "dates": args.dates,
+        },
+        "results": results,
+    }
+    if args.output:
+        output = Path(args.output)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"e2e-{datetime.now():%Y%m%d-%H%M%S}-{revision['commit'] or 'nogit'}.json"
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        report["comparison"] = {"baseline": args.compare, "baseline_git": baseline["meta"]["git"], "rows": compare(baseline, report)}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"결과 저장: {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+이벤트 루프 블로킹 부하 테스트
+
+느린 LM Studio 대역(stub)을 띄운 뒤 project/main5.py 서버에 긴 대화 생성 요청을 여러 개 보내고,
+그동안 관계없는 엔드포인트(`/`, `/get_situation_options/`)의 응답 시간을 측정합니다.
+LLM 호출이 이벤트 루프를 막지 않는다면 생성 중에도 두 엔드포인트의 지연 시간이 낮게 유지되어야 합니다.
+
+실행 예시:
+    python benchmarks/event_loop_latency.py --generations 4 --upstream-delay 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent / "project"
+
+
+def free_port() -> int:
+    """사용 가능한 로컬 포트 반환"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_stub_app(delay_seconds: float) -> FastAPI:
+    """응답을 delay_seconds 만큼 늦게 돌려주는 LM Studio 대역"""
+    stub = FastAPI()
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(payload: dict):
+        await asyncio.sleep(delay_seconds)
+        content = "\n".join(
+            ["사용자: 오늘 하루는 어떠셨어요? | 감정: 기쁨", "Alice: 조금 피곤했어요. | 감정: 슬픔"] * 30
+        )
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+    return stub
+
+
+def start_stub(port: int, delay_seconds: float) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(build_stub_app(delay_seconds), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def start_app(port: int, upstream_url: str) -> subprocess.Popen:
+    env = dict(os.environ, LM_STUDIO_API_URL=upstream_url)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main5:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_DIR,
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("main5 서버가 시작되지 않았습니다.")
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(base_url: str, generations: int, probe_interval: float) -> dict:
+    payload = {
+        "person_name": "Alice",
+        "age": 17,
+        "gender": "female",
+        "situation": "학교 생활",
+        "step_days": 1,
+        "num_conversations": 1,
+    }
+    probe_latencies = {"/": [], "/get_situation_options/?age=17": []}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        started = time.perf_counter()
+        generation_tasks = [
+            asyncio.create_task(client.post("/generate_conversation/", json=payload)) for _ in range(generations)
+        ]
+
+        # 생성 요청이 모두 끝날 때까지 관계없는 엔드포인트를 주기적으로 호출
+        while not all(task.done() for task in generation_tasks):
+            for path, latencies in probe_latencies.items():
+                t0 = time.perf_counter()
+                await client.get(path)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(probe_interval)
+
+        responses = await asyncio.gather(*generation_tasks)
+        total_seconds = time.perf_counter() - started
+
+    return {
+        "generations": generations,
+        "generation_status_codes": [r.status_code for r in responses],
+        "total_seconds": round(total_seconds, 3),
+        "probes": {
+            path: {
+                "count": len(latencies),
+                "p50_ms": round(statistics.median(latencies), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "max_ms": round(max(latencies), 2),
+            }
+            for path, latencies in probe_latencies.items()
+            if latencies
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 생성 중 관계없는 엔드포인트의 지연 시간 측정")
+    parser.add_argument("--generations", type=int, default=4, help="동시에 보낼 긴 생성 요청 수")
+    parser.add_argument("--upstream-delay", type=float, default=5.0, help="LM Studio 대역의 응답 지연 (초)")
+    parser.add_argument("--probe-interval", type=float, default=0.1, help="프로브 요청 간격 (초)")
+    args = parser.parse_args()
+
+    stub_port, app_port = free_port(), free_port()
+    stub = start_stub(stub_port, args.upstream_delay)
+    app_proc = start_app(app_port, f"http://127.0.0.1:{stub_port}/v1/chat/completions")
+    try:
+        result = asyncio.run(run_load(f"http://127.0.0.1:{app_port}", args.generations, args.probe_interval))
+    finally:
+        app_proc.terminate()
+        app_proc.wait()
+        stub.should_exit = True
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+부하/지연 테스트용 로컬 LLM 대역(mock) 서버
+
+GPU나 실제 모델 없이 각 앱(main.py, main4.py, main5.py, streamlit/main.py)을 벤치마크할 수 있도록
+LM Studio(OpenAI 호환)와 Ollama API를 흉내 냅니다. 응답 내용과 지연 시간은 --seed와 프롬프트로 결정되므로
+같은 설정이면 항상 같은 결과가 나옵니다.
+
+지원하는 엔드포인트:
+    POST /v1/chat/completions   OpenAI 채팅 (stream true/false, SSE)
+    POST /v1/completions        OpenAI 텍스트 완성 (stream true/false, SSE, stream_options.include_usage면 마지막 이벤트에 usage)
+    POST /api/generate          Ollama 생성 (stream 기본값 true, NDJSON)
+    POST /api/chat              Ollama 채팅 (stream 기본값 true, NDJSON)
+    GET  /v1/models, /api/tags  헬스 체크
+    GET  /mock/stats            요청/오류/잘못된 줄 주입 횟수
+
+출력 형식(--output):
+    lines  '참여자: 내용 | 감정: 감정1, 감정2' 줄 (main5.py, streamlit/main.py, main.py 프롬프트)
+    json   날짜별 '날짜'/'대화목록' 객체의 JSON 배열 (main4.py 프롬프트)
+    auto   프롬프트에 'JSON 배열'이 있으면 json, 아니면 lines (기본값)
+발화 수, 대화 상대 이름, 날짜는 프롬프트에서 읽습니다 ('총 N개 내외의 발화', 마지막 줄의 '이름:', 'YYYY-MM-DD', 'N쌍').
+
+요청에 JSON 스키마(response_format의 json_schema, Ollama의 format)가 있으면 --output과 관계없이 스키마에 맞는 JSON을 냅니다.
+실제 서버의 제한된 생성(구조화 출력)처럼 형식 오류는 넣지 않고, max_tokens에 걸려 잘리는 것만 그대로 둡니다.
+    배열 속성 하나의 객체 스키마   {"날짜기록": [...]}처럼 json과 같은 날짜별 기록 배열을 그 속성에 담음 (main4.py json 모드)
+    utterances 속성의 객체 스키마  {"utterances": [{"speaker", "content", "emotions"}, ...]} (main5.py json 모드)
+
+실행 예시:
+    python benchmarks/mock_llm_server.py --port 1234
+    python benchmarks/mock_llm_server.py --port 11434 --ttft 0.8 --tokens-per-sec 25 --error-rate 0.05 --malformed-rate 0.1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.responses import StreamingResponse
+
+EMOTIONS = ["기쁨", "분노", "슬픔", "두려움", "놀람", "혐오"]
+
+USER_LINES = [
+    "안녕하세요, 오늘 하루는 어떠셨어요?",
+    "그런 일이 있었군요. 조금 더 이야기해 주실 수 있을까요?",
+    "많이 속상하셨겠어요. 그때 어떤 기분이 드셨어요?",
+    "정말 잘하셨네요! 스스로 뿌듯하시겠어요.",
+    "걱정되는 마음이 충분히 이해돼요.",
+    "요즘 잠은 잘 주무시고 계세요?",
+    "그 이야기를 들으니 저도 놀랐어요.",
+    "혹시 도움이 필요하면 언제든 말씀해 주세요.",
+]
+PERSON_LINES = [
+    "요즘 시험 때문에 너무 힘들어요.",
+    "친구랑 싸워서 기분이 좋지 않아요.",
+    "오늘은 오랜만에 산책을 해서 기분이 좋았어요.",
+    "갑자기 일이 많아져서 조금 무서워요.",
+    "그 사람이 한 말이 계속 생각나서 화가 나요.",
+    "생각지도 못한 선물을 받아서 깜짝 놀랐어요.",
+    "가족들과 저녁을 먹으면서 많이 웃었어요.",
+    "솔직히 요즘은 아무것도 하기 싫어요.",
+]
+
+
+@dataclass
+class MockConfig:
+    ttft: float = 0.2 # 요청을 받은 뒤 첫 토큰까지 걸리는 시간(초)
+    tokens_per_sec: float = 50.0 # 생성 속도
+    chars_per_token: float = 2.0 # 한국어 토큰 하나를 글자 수로 근사
+    error_rate: float = 0.0 # 요청을 HTTP 오류로 실패시킬 확률
+    error_status: int = 503
+    malformed_rate: float = 0.0 # lines: 줄 하나를 형식에 맞지 않게 만들 확률, json: 응답 하나를 잘린 JSON으로 만들 확률
+    output: str = "auto" # lines, json, auto
+    default_utterances: int = 60 # 프롬프트에서 발화 수를 찾지 못했을 때
+    seed: int = 0
+    model: str = "mock-model"
+
+
+class MockLLM:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self._fault_rng = random.Random(config.seed) # 오류 주입 순서도 --seed로 재현
+        self.stats = {"requests": 0, "errors_injected": 0, "malformed_injected": 0, "completion_tokens": 0}
+
+    # ---- 출력 생성 ----
+
+    def _rng(self, prompt: str, seed: Optional[int]) -> random.Random:
+        digest = hashlib.sha256(f"{self.config.seed}:{seed}:{prompt}".encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _output_format(self, prompt: str) -> str:
+        if self.config.output != "auto":
+            return self.config.output
+        return "json" if "JSON 배열" in prompt else "lines"
+
+    def _malformed(self, rng: random.Random, allowed: bool = True) -> bool:
+        if allowed and rng.random() < self.config.malformed_rate:
+            self.stats["malformed_injected"] += 1
+            return True
+        return False
+
+    def render_lines(self, prompt: str, rng: random.Random) -> str:
+        count_match = re.search(r"총 (\d+)개 내외의 발화", prompt)
+        utterances = int(count_match.group(1)) if count_match else self.config.default_utterances
+        name_match = re.search(r"\n\s*([^\s:]+):\s*$", prompt)
+        person = name_match.group(1) if name_match else "Alice"
+        lines = []
+        for i in range(utterances):
+            # 프롬프트가 '이름:'으로 끝나므로 대화 상대의 발화부터 시작
+            speaker, bank = (person, PERSON_LINES) if i % 2 == 0 else ("사용자", USER_LINES)
+            emotions = ", ".join(rng.sample(EMOTIONS, k=rng.randint(1, 3)))
+            line = f"{speaker}: {rng.choice(bank)} | 감정: {emotions}"
+            if self._malformed(rng):
+                line = rng.choice([
+                    f"{speaker} {rng.choice(bank)}", # 화자 뒤 콜론 없음
+                    f"{speaker}: {rng.choice(bank)}", # 감정 없음
+                    f"{speaker}: {rng.choice(bank)} | 감정: 피곤", # 목록에 없는 감정
+                    "(잠시 침묵)",
+                ])
+            lines.append(line)
+        return "\n".join(lines)
+
+    def render_json(self, prompt: str, rng: random.Random, constrained: bool = False, records_key: Optional[str] = None) -> str:
+        dates = list(dict.fromkeys(re.findall(r"\d{4}-\d{2}-\d{2}", prompt))) or ["2025-06-01"]
+        turns = [int(t) for t in re.findall(r"(\d+)쌍", prompt)] or [5]
+        records = []
+        for i, date in enumerate(dates):
+            dialogues = []
+            minute = rng.randint(0, 59)
+            for t in range(turns[min(i, len(turns) - 1)] * 2):
+                speaker, bank = ("사용자", PERSON_LINES) if t % 2 == 0 else ("챗봇", USER_LINES)
+                dialogues.append({
+                    "시간": f"{(9 + (minute + t) // 60) % 24:02d}:{(minute + t) % 60:02d}",
+                    "화자": speaker,
+                    "텍스트": rng.choice(bank),
+                    "감정": rng.sample(EMOTIONS, k=rng.randint(1, 2)),
+                })
+            records.append({"날짜": date, "대화목록": dialogues})
+        text = json.dumps({records_key: records} if records_key else records, ensure_ascii=False)
+        if self._malformed(rng, not constrained):
+            text = text[: rng.randint(len(text) // 3, len(text) - 2)] # 토큰 한도에 걸려 잘린 응답처럼
+        return text
+
+    def render_utterances(self, prompt: str, schema: Dict, rng: random.Random) -> str:
+        """main5.py json 모드의 {"utterances": [...]} 응답 (화자는 스키마의 enum에서 읽음)"""
+        count_match = re.search(r"총 (\d+)개 내외의 발화", prompt)
+        utterances = int(count_match.group(1)) if count_match else self.config.default_utterances
+        item = schema["properties"]["utterances"]["items"]["properties"]
+        speakers = item["speaker"].get("enum") or ["사용자", "Alice"]
+        person = next((speaker for speaker in speakers if speaker != "사용자"), "Alice")
+        allowed_emotions = item["emotions"]["items"].get("enum") or EMOTIONS
+        items = []
+        for i in range(utterances):
+            speaker, bank = (person, PERSON_LINES) if i % 2 == 0 else ("사용자", USER_LINES)
+            items.append({
+                "speaker": speaker,
+                "content": rng.choice(bank),
+                "emotions": rng.sample(allowed_emotions, k=rng.randint(1, min(3, len(allowed_emotions)))),
+            })
+        return json.dumps({"utterances": items}, ensure_ascii=False)
+
+    def generate(
+        self, prompt: str, seed: Optional[int], max_tokens: Optional[int], schema: Optional[Dict] = None
+    ) -> Tuple[List[str], str]:
+        """(토큰 조각 목록, finish_reason)"""
+        rng = self._rng(prompt, seed)
+        if schema is not None:
+            if schema.get("type") == "object" and "utterances" in schema.get("properties", {}):
+                text = self.render_utterances(prompt, schema, rng)
+            else:
+                records_key = next(iter(schema.get("properties", {})), None) if schema.get("type") == "object" else None
+                text = self.render_json(prompt, rng, constrained=True, records_key=records_key)
+        elif self._output_format(prompt) == "json":
+            text = self.render_json(prompt, rng)
+        else:
+            text = self.render_lines(prompt, rng)
+        size = max(1, int(round(self.config.chars_per_token)))
+        tokens = [text[i:i + size] for i in range(0, len(text), size)]
+        finish_reason = "stop"
+        if max_tokens is not None and len(tokens) > max_tokens:
+            tokens, finish_reason = tokens[:max_tokens], "length"
+        self.stats["completion_tokens"] += len(tokens)
+        return tokens, finish_reason
+
+    # ---- 타이밍과 오류 주입 ----
+
+    def inject_error(self) -> Optional[JSONResponse]:
+        self.stats["requests"] += 1
+        if self._fault_rng.random() < self.config.error_rate:
+            self.stats["errors_injected"] += 1
+            return JSONResponse(
+                status_code=self.config.error_status,
+                content={"error": {"message": "mock: 주입된 오류 (--error-rate)", "type": "server_error"}},
+            )
+        return None
+
+    async def paced(self, tokens: List[str]) -> AsyncIterator[str]:
+        """첫 토큰은 ttft 뒤에, 나머지는 tokens_per_sec 속도로 내보냄 (빠른 설정에서는 이벤트 하나에 여러 토큰)"""
+        await asyncio.sleep(self.config.ttft)
+        per_event = max(1, int(self.config.tokens_per_sec / 100))
+        started = time.perf_counter()
+        for i in range(0, len(tokens), per_event):
+            # 누적 시간 기준으로 기다려 sleep 오차가 쌓이지 않게 함
+            delay = started + i / self.config.tokens_per_sec - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield "".join(tokens[i:i + per_event])
+
+    async def total_delay(self, tokens: List[str]) -> None:
+        await asyncio.sleep(self.config.ttft + len(tokens) / self.config.tokens_per_sec)
+
+    @staticmethod
+    def usage(prompt: str, tokens: List[str]) -> Dict:
+        prompt_tokens = len(prompt) // 2
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+
+
+def response_schema(payload: Dict) -> Optional[Dict]:
+    """요청의 구조화 출력 스키마 (OpenAI: response_format.json_schema.schema, Ollama: format이 객체일 때)"""
+    response_format = payload.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return (response_format.get("json_schema") or {}).get("schema")
+    fmt = payload.get("format")
+    return fmt if isinstance(fmt, dict) else None
+
+
+def chat_prompt(messages: List[Dict]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def sse(event: Dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def build_app(config: MockConfig) -> FastAPI:
+    mock = MockLLM(config)
+    app = FastAPI()
+    app.state.mock = mock
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": config.model, "object": "model"}]}
+
+    @app.get("/api/tags")
+    async def list_tags():
+        return {"models": [{"name": config.model, "model": config.model}]}
+
+    @app.get("/mock/stats")
+    async def get_stats():
+        return {"config": asdict(config), **mock.stats}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        error = mock.inject_error()
+        if error is not None:
+            return error
+        prompt = chat_prompt(payload.get("messages", []))
+        tokens, finish_reason = mock.generate(prompt, payload.get("seed"), payload.get("max_tokens"), response_schema(payload))
+        created, model = int(time.time()), payload.get("model", config.model)
+        if payload.get("stream"):
+            async def stream():
+                async for piece in mock.paced(tokens):
+                    yield sse({"object": "chat.completion.chunk", "created": created, "model": model,
+                               "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                yield sse({"object": "chat.completion.chunk", "created": created, "model": model,
+                           "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+        await mock.total_delay(tokens)
+        return {
+            "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": finish_reason}],
+            "usage": mock.usage(prompt, tokens),
+        }
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+        error = mock.inject_error()
+        if error is not None:
+            return error
+        prompt = payload.get("prompt", "")
+        prompt = "\n".join(prompt) if isinstance(prompt, list) else prompt
+        tokens, finish_reason = mock.generate(prompt, payload.get("seed"), payload.get("max_tokens"), response_schema(payload))
+        created, model = int(time.time()), payload.get("model", config.model)
+        if payload.get("stream"):
+            async def stream():
+                async for piece in mock.paced(tokens):
+                    yield sse({"object": "text_completion", "created": created, "model": model,
+                               "choices": [{"index": 0, "text": piece, "finish_reason": None}]})
+                final = {"object": "text_completion", "created": created, "model": model,
+                         "choices": [{"index": 0, "text": "", "finish_reason": finish_reason}]}
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    final["usage"] = mock.usage(prompt, tokens)
+                yield sse(final)
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+        await mock.total_delay(tokens)
+        return {
+            "object": "text_completion", "created": created, "model": model,
+            "choices": [{"index": 0, "text": "".join(tokens), "finish_reason": finish_reason}],
+            "usage": mock.usage(prompt, tokens),
+        }
+
+    async def ollama_response(payload: dict, prompt: str, chat: bool):
+        error = mock.inject_error()
+        if error is not None:
+            return error
+        options = payload.get("options") or {}
+        tokens, _ = mock.generate(prompt, options.get("seed"), options.get("num_predict"), response_schema(payload))
+        model = payload.get("model", config.model)
+
+        def body(content: str, done: bool) -> Dict:
+            event = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "done": done}
+            if chat:
+                event["message"] = {"role": "assistant", "content": content}
+            else:
+                event["response"] = content
+            if done:
+                event.update(done_reason="stop", prompt_eval_count=len(prompt) // 2, eval_count=len(tokens))
+            return event
+
+        if payload.get("stream", True):
+            async def stream():
+                async for piece in mock.paced(tokens):
+                    yield json.dumps(body(piece, False), ensure_ascii=False) + "\n"
+                yield json.dumps(body("", True), ensure_ascii=False) + "\n"
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        await mock.total_delay(tokens)
+        return body("".join(tokens), True)
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request):
+        payload = await request.json() # Ollama 문서의 curl 예시처럼 Content-Type 없이 보내는 요청도 받음
+        return await ollama_response(payload, payload.get("prompt", ""), chat=False)
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        payload = await request.json()
+        return await ollama_response(payload, chat_prompt(payload.get("messages", [])), chat=True)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LM Studio/Ollama API를 흉내 내는 로컬 LLM 대역 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234, help="LM Studio 기본 포트 1234, Ollama 기본 포트 11434")
+    parser.add_argument("--ttft", type=float, default=MockConfig.ttft, help="첫 토큰까지 시간(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=MockConfig.tokens_per_sec)
+    parser.add_argument("--chars-per-token", type=float, default=MockConfig.chars_per_token)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate, help="HTTP 오류로 응답할 확률")
+    parser.add_argument("--error-status", type=int, default=MockConfig.error_status)
+    parser.add_argument("--malformed-rate", type=float, default=MockConfig.malformed_rate, help="형식이 잘못된 줄(또는 잘린 JSON)을 낼 확률")
+    parser.add_argument("--output", choices=["auto", "lines", "json"], default=MockConfig.output)
+    parser.add_argument("--default-utterances", type=int, default=MockConfig.default_utterances)
+    parser.add_argument("--seed", type=int, default=MockConfig.seed)
+    parser.add_argument("--model", default=MockConfig.model)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        chars_per_token=args.chars_per_token,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        malformed_rate=args.malformed_rate,
+        output=args.output,
+        default_utterances=args.default_utterances,
+        seed=args.seed,
+        model=args.model,
+    )
+    uvicorn.run(build_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+응답 형식(text 줄 형식 / json 구조화 출력)별 발화 파싱 수율 비교
+
+형식 오류를 섞어 내는 로컬 대역 서버(mock_llm_server.py, --malformed-rate)를 띄우고,
+main5 앱을 같은 프로세스에서 실행해 같은 요청을 output_mode=text와 json으로 한 번씩 보냅니다.
+json 모드는 요청에 JSON 스키마(response_format)를 넣으므로 대역 서버도 실제 서버의 제한된 생성처럼
+형식 오류 없이 스키마에 맞는 응답을 냅니다 (max_tokens에 걸려 잘리는 것은 그대로).
+
+모드별로 기대 발화 수 대비 파싱한 발화 수(parse_yield), 이유별 파싱 오류 수,
+발화가 부족해 반복으로 채운 날짜 수(padded_dates), 완료 토큰 수를 출력합니다.
+
+실행 예시:
+    python benchmarks/output_mode_bench.py
+    python benchmarks/output_mode_bench.py --malformed-rate 0.2 --requests 10 --dates 3
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "project"))
+
+from mock_llm_server import MockConfig, build_app  # noqa: E402
+
+MODES = ("text", "json")
+
+
+def free_port() -> int:
+    """사용 가능한 로컬 포트 반환"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(port: int, config: MockConfig):
+    """대역 서버를 스레드에서 실행하고 (uvicorn 서버, 대역 서버 앱) 반환"""
+    mock_app = build_app(config)
+    server = uvicorn.Server(uvicorn.Config(mock_app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, mock_app
+
+
+def count_padding(main5) -> Dict:
+    """main5.fit_utterance_count를 감싸 발화가 부족해 반복으로 채운 날짜 수를 셈"""
+    counter = {"padded_dates": 0}
+    fit_utterance_count = main5.fit_utterance_count
+
+    def counting_fit(parsed_data, total_utterances, rng=None):
+        if parsed_data and len(parsed_data) < total_utterances * 0.5:
+            counter["padded_dates"] += 1
+        return fit_utterance_count(parsed_data, total_utterances, rng)
+
+    main5.fit_utterance_count = counting_fit
+    return counter
+
+
+def run_mode(client, main5, mock_app, padding: Dict, mode: str, requests: int, dates: int) -> Dict:
+    parse_before = main5.utterance_parser.snapshot()
+    tokens_before = mock_app.state.mock.stats["completion_tokens"]
+    padding["padded_dates"] = 0
+    expected = generated = 0
+    for index in range(requests):
+        response = client.post("/generate_conversation/", json={
+            "person_name": "Alice", "age": 17, "gender": "female", "situation": "학교 생활",
+            "step_days": 1, "num_conversations": dates, "use_cache": False, "seed": index, "output_mode": mode,
+        })
+        response.raise_for_status()
+        for conversation in response.json():
+            expected += conversation["total_utterances_expected"]
+            generated += conversation["total_utterances_generated"]
+    parse_after = main5.utterance_parser.snapshot()
+    stats = {key: parse_after[key] - parse_before[key] for key in parse_after}
+    return {
+        "mode": mode,
+        "expected_utterances": expected,
+        "parsed_utterances": stats["parsed"],
+        "parse_yield": round(stats["parsed"] / expected, 4) if expected else None,
+        "returned_utterances": generated,
+        "padded_dates": padding["padded_dates"],
+        "parse_errors": {reason: count for reason, count in stats.items() if reason not in ("lines", "parsed")},
+        "completion_tokens": mock_app.state.mock.stats["completion_tokens"] - tokens_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="text/json 응답 형식별 발화 파싱 수율 비교")
+    parser.add_argument("--requests", type=int, default=5, help="모드별 요청 수 (요청마다 seed가 다름)")
+    parser.add_argument("--dates", type=int, default=2, help="요청 하나의 날짜 수")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="대역 서버가 text 모드에서 형식이 잘못된 줄을 낼 확률")
+    parser.add_argument("--seed", type=int, default=0, help="대역 서버 시드")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    mock, mock_app = start_mock(mock_port, MockConfig(
+        ttft=0.0, tokens_per_sec=1_000_000, malformed_rate=args.malformed_rate, seed=args.seed,
+    ))
+
+    # main5를 불러오기 전에 대역 서버를 가리키도록 하고, 캐시/체크포인트/수락 제한은 끔
+    for key in ("LLM_BACKENDS", "LLM_BACKENDS_FILE"):
+        os.environ.pop(key, None)
+    os.environ["LM_STUDIO_API_URL"] = f"http://127.0.0.1:{mock_port}/v1/chat/completions"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["LLM_CHECKPOINT_ENABLED"] = "false"
+    for key in ("LLM_ADMISSION_MAX_IN_FLIGHT", "LLM_ADMISSION_MAX_QUEUED_DATES",
+                "LLM_ADMISSION_CLIENT_MAX_IN_FLIGHT", "LLM_ADMISSION_CLIENT_MAX_QUEUED_DATES"):
+        os.environ[key] = "0"
+    from fastapi.testclient import TestClient
+    import main5
+
+    padding = count_padding(main5)
+    try:
+        with TestClient(main5.app) as client:
+            results = [run_mode(client, main5, mock_app, padding, mode, args.requests, args.dates) for mode in MODES]
+    finally:
+        mock.should_exit = True
+
+    report = {
+        "mock": {"malformed_rate": args.malformed_rate, "seed": args.seed},
+        "requests": args.requests,
+        "dates": args.dates,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+발화 파서(utterance_parser.py) 골든 코퍼스 검사와 마이크로벤치마크
+
+golden/utterances/의 LM 응답 예시(형식 오류가 섞인 응답 포함)를 현재 파서와 변경 전 파서
+(main5/streamlit의 줄 단위 split 구현)로 각각 파싱해, 두 결과가 같은지와 저장된 기대 결과
+(<이름>.expected.json: 발화 목록과 이유별 오류 수)와 같은지 확인합니다.
+그다음 코퍼스 줄을 반복해 만든 긴 응답(기본값 10만 줄)을 두 파서로 파싱하는 시간을 비교합니다.
+두 파서를 라운드마다 번갈아 실행하고(GC는 측정 중에 끔) 라운드별 속도비의 중앙값과 사분위 범위를 보고하므로,
+CPU 부하가 측정 도중에 바뀌어도 한쪽 파서에만 치우치지 않습니다.
+
+코퍼스에 응답을 추가하면 cases.json에 항목을 넣고 --update로 기대 결과를 만든 뒤 내용을 직접 확인하세요.
+
+실행 예시:
+    python benchmarks/parser_bench.py
+    python benchmarks/parser_bench.py --lines 1000000 --repeat 11
+    python benchmarks/parser_bench.py --update
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "project"))
+
+from llm_common.utterance_parser import UtteranceParser  # noqa: E402
+
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden" / "utterances"
+
+
+def legacy_extract_utterances(raw_text: str, person_name: str, emotions: List[str], rng: Optional[random.Random] = None) -> List[Dict]:
+    """변경 전 extract_utterances (줄마다 split/strip/replace, 감정은 리스트에서 선형 탐색)"""
+    rng = rng or random
+    parsed_data = []
+    lines = raw_text.strip().split('\n')
+
+    for line in lines:
+        if ':' in line and '|' in line:
+            try:
+                parts = line.split('|')
+                speaker_content = parts[0].strip()
+                emotion_content = parts[1].strip()
+
+                speaker_name, content = speaker_content.split(':', 1)
+                speaker_name = speaker_name.strip()
+                content = content.strip()
+
+                emotions_str = emotion_content.replace('감정:', '').strip()
+                parsed_emotions = [e.strip() for e in emotions_str.split(',') if e.strip() in emotions]
+
+                if speaker_name in ["사용자", person_name]:
+                    parsed_data.append({
+                        "speaker": speaker_name,
+                        "content": content,
+                        "emotions": parsed_emotions if parsed_emotions else [rng.choice(emotions)]
+                    })
+            except Exception:
+                pass
+    return parsed_data
+
+
+def read_text(path: Path) -> str:
+    with open(path, encoding="utf-8", newline="") as f: # CRLF 줄도 그대로 읽음
+        return f.read()
+
+
+def load_cases() -> List[Dict]:
+    return json.loads((GOLDEN_DIR / "cases.json").read_text(encoding="utf-8"))["cases"]
+
+
+def check_golden(update: bool) -> List[Dict]:
+    results = []
+    for case in load_cases():
+        text = read_text(GOLDEN_DIR / case["file"])
+        parser = UtteranceParser(case["emotions"])
+        utterances = parser.parse(text, case["person_name"], random.Random(case["seed"]))
+        legacy = legacy_extract_utterances(text, case["person_name"], case["emotions"], random.Random(case["seed"]))
+        actual = {"utterances": utterances, "stats": parser.snapshot()}
+
+        expected_path = GOLDEN_DIR / (Path(case["file"]).stem + ".expected.json")
+        if update:
+            expected_path.write_text(json.dumps(actual, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        expected = json.loads(expected_path.read_text(encoding="utf-8")) if expected_path.exists() else None
+        results.append({
+            "case": case["file"],
+            "matches_legacy": utterances == legacy,
+            "matches_expected": actual == expected,
+            **actual["stats"],
+        })
+    return results
+
+
+def build_corpus_text(lines: int) -> str:
+    """코퍼스의 Alice 응답 줄을 반복해 lines줄짜리 응답 생성 (정상 줄과 형식 오류 줄의 비율은 코퍼스와 같음)"""
+    source = []
+    for case in load_cases():
+        if case["person_name"] == "Alice":
+            source.extend(read_text(GOLDEN_DIR / case["file"]).replace("\r\n", "\n").split("\n"))
+    return "\n".join(source[i % len(source)] for i in range(lines))
+
+
+def time_once(fn) -> float:
+    gc.collect()
+    gc.disable() # 결과 dict를 많이 만들므로 GC가 도는 시점에 따라 측정값이 크게 흔들림
+    try:
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def quartiles(values: List[float]) -> List[float]:
+    """(25, 50, 75) 백분위수"""
+    return statistics.quantiles(values, n=4, method="inclusive") if len(values) > 1 else values * 3
+
+
+def run_bench(lines: int, repeat: int, warmup: int) -> Dict:
+    text = build_corpus_text(lines)
+    emotions = load_cases()[0]["emotions"]
+    parser = UtteranceParser(emotions)
+
+    def legacy():
+        legacy_extract_utterances(text, "Alice", emotions, random.Random(0))
+
+    def current():
+        parser.parse(text, "Alice", random.Random(0))
+
+    for _ in range(warmup):
+        legacy()
+        current()
+    legacy_times, parser_times, ratios = [], [], []
+    for round_index in range(repeat):
+        # 라운드마다 실행 순서를 바꿔 캐시/주파수 변화가 한쪽에만 유리하지 않도록 함
+        first, second = (legacy, current) if round_index % 2 == 0 else (current, legacy)
+        elapsed = {first: time_once(first), second: time_once(second)}
+        legacy_times.append(elapsed[legacy])
+        parser_times.append(elapsed[current])
+        ratios.append(elapsed[legacy] / elapsed[current])
+
+    legacy_q, parser_q, ratio_q = quartiles(legacy_times), quartiles(parser_times), quartiles(ratios)
+    return {
+        "lines": lines,
+        "rounds": repeat,
+        "parsed_utterances": len(parser.parse(text, "Alice", random.Random(0))),
+        "legacy_ms_median": round(legacy_q[1] * 1000, 2),
+        "parser_ms_median": round(parser_q[1] * 1000, 2),
+        "parser_lines_per_sec": round(lines / parser_q[1]),
+        # 같은 라운드의 두 측정값끼리 나눈 속도비 (중앙값과 사분위 범위)
+        "speedup_median": round(ratio_q[1], 2),
+        "speedup_iqr": [round(ratio_q[0], 2), round(ratio_q[2], 2)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="발화 파서 골든 코퍼스 검사와 파싱 속도 비교")
+    parser.add_argument("--lines", type=int, default=100_000, help="벤치마크용 응답의 줄 수")
+    parser.add_argument("--repeat", type=int, default=21, help="측정 라운드 수 (라운드마다 두 파서를 한 번씩 실행, 중앙값 사용)")
+    parser.add_argument("--warmup", type=int, default=2, help="측정 전에 버리는 라운드 수")
+    parser.add_argument("--update", action="store_true", help="현재 파서 결과로 기대 결과 파일을 다시 씀")
+    args = parser.parse_args()
+
+    golden = check_golden(args.update)
+    result = {"golden": golden, "bench": run_bench(args.lines, args.repeat, args.warmup)}
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if not all(case["matches_legacy"] and case["matches_expected"] for case in golden):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
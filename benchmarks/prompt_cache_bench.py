@@ -0,0 +1,251 @@
+"""
+프롬프트(KV) 캐시 재사용에 따른 첫 토큰까지 시간(TTFT) 벤치마크
+
+접두사 캐시를 흉내 내는 로컬 대역 서버를 띄우고, 변경 전 프롬프트 레이아웃(요청별 값이 지시문 중간에 섞임)과
+현재 레이아웃(main5.PROMPT_INSTRUCTIONS 고정 접두사 + 요청별 값)을 같은 요청 순서로 보내 TTFT를 비교합니다.
+
+대역 서버는 llama.cpp 서버처럼 슬롯마다 마지막으로 처리한 프롬프트를 기억하고,
+새 프롬프트와 공통 접두사 길이만큼은 프리필(prefill)을 건너뜁니다. 토큰 수는 글자 수로 근사합니다.
+--server-mode llamacpp이면 요청에 cache_prompt 힌트가 있을 때만 재사용하고(예전 llama.cpp 기본 동작),
+auto이면 LM Studio/vLLM처럼 항상 재사용합니다.
+
+실행 예시:
+    python benchmarks/prompt_cache_bench.py
+    python benchmarks/prompt_cache_bench.py --server-mode auto --requests 20 --dates 5
+    python benchmarks/prompt_cache_bench.py --url http://localhost:8080   # 실제 llama.cpp 서버에 대해 측정
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "project"))
+
+# main5를 불러올 때 체크포인트/캐시 파일을 만들지 않도록 설정
+os.environ.setdefault("LLM_CHECKPOINT_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import main5  # noqa: E402
+from llm_common.llm_backends import Backend, build_chat_payload  # noqa: E402
+from llm_common.token_budget import percentile  # noqa: E402
+
+
+def legacy_prompt(person_name, age, gender, situation, conversation_length_minutes, current_date, rng):
+    """변경 전 main5.generate_prompt 레이아웃 (이름/날짜/감정이 지시문 중간에 들어감)"""
+    num_utterances = rng.randint(conversation_length_minutes * 10, conversation_length_minutes * 11)
+    initial_emotions = rng.sample(main5.EMOTIONS, k=rng.randint(2, min(len(main5.EMOTIONS), 4)))
+    initial_emotion_str = ", ".join(initial_emotions)
+    prompt = f"""
+    당신은 공감형 대화 생성 챗봇입니다. 아래 정보를 바탕으로 사용자(챗봇)와 {person_name} 간의 자연스러운 대화문을 생성해주세요.
+
+    ---
+    **대화 정보:**
+    - **참여자:** 사용자(챗봇)와 {person_name}
+    - **{person_name} 정보:**
+        - **이름:** {person_name}
+        - **나이:** {age}세 ({main5.get_age_group(age)} 그룹)
+        - **성별:** {gender}
+    - **상황:** {situation}
+    - **현재 날짜:** {current_date}
+    - **대화 목표:** {person_name}의 감정을 이해하고 공감하며, 자연스러운 대화 흐름을 유지합니다.
+    - **대화 길이:** 약 {conversation_length_minutes}분 (총 {num_utterances}개 내외의 발화)
+    - **포함될 감정:** {main5.EMOTIONS} 중 적어도 {initial_emotion_str}을(를) 포함하며, 대화 흐름에 따라 자연스럽게 여러 감정이 나타나도록 해주세요. 하나의 감정에 고정되지 않고, 대화 중간에 감정이 변화하는 것처럼 보이도록 생성해주세요.
+
+    ---
+    **대화 형식:**
+    각 발화는 '참여자: [내용] | 감정: [감정1], [감정2]' 형식으로 표현해주세요. 감정은 쉼표로 구분하여 여러 개를 표현할 수 있습니다.
+    최소 1개에서 최대 3개의 감정을 표현해주세요.
+    예시:
+    사용자: 안녕하세요! 오늘 하루는 어떠셨어요? | 감정: 기쁨
+    {person_name}: 아, 네. 그냥 그랬어요. 좀 피곤하네요. | 감정: 슬픔, 피곤
+
+    ---
+    **대화 시작:**
+    사용자: 안녕하세요, {person_name}님. 요즘 {situation} 관련해서 어떠신지 궁금해서요.
+    {person_name}:
+    """
+    return prompt, num_utterances
+
+
+LAYOUTS = {"legacy": legacy_prompt, "prefix": main5.generate_prompt}
+
+
+class PrefixCacheStandIn:
+    """슬롯별 마지막 프롬프트와의 공통 접두사만큼 프리필을 건너뛰는 대역 서버"""
+
+    def __init__(self, mode: str, slots: int, prefill_ms_per_token: float, tokens_per_sec: float, output_tokens: int):
+        self.mode = mode
+        self.slots: List[str] = [""] * slots
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.requests: List[Dict] = []
+
+    def reset(self) -> None:
+        self.slots = [""] * len(self.slots)
+        self.requests = []
+
+    @staticmethod
+    def render(messages: List[Dict]) -> str:
+        """채팅 템플릿 적용 결과 근사 (역할 표시 + 내용)"""
+        return "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages) + "<|assistant|>\n"
+
+    def prefill(self, prompt: str, cache_prompt: bool) -> Dict:
+        reuse = self.mode == "auto" or cache_prompt
+        best_slot, best_common = 0, 0
+        for i, previous in enumerate(self.slots):
+            common = os.path.commonprefix([previous, prompt]) if reuse else ""
+            if len(common) > best_common:
+                best_slot, best_common = i, len(common)
+        if best_common == 0:
+            # 재사용할 슬롯이 없으면 가장 오래 쓰지 않은 슬롯을 덮어씀
+            best_slot = len(self.slots) - 1
+        self.slots.pop(best_slot)
+        self.slots.insert(0, prompt)
+        stats = {"prompt_tokens": len(prompt), "cached_tokens": best_common}
+        self.requests.append(stats)
+        return stats
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(payload: dict):
+            stats = self.prefill(self.render(payload["messages"]), bool(payload.get("cache_prompt")))
+            uncached = stats["prompt_tokens"] - stats["cached_tokens"]
+
+            async def stream():
+                await asyncio.sleep(uncached * self.prefill_ms_per_token / 1000)
+                for _ in range(self.output_tokens):
+                    delta = {"choices": [{"index": 0, "delta": {"content": "네 "}}]}
+                    yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(1 / self.tokens_per_sec)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stand_in(stand_in: PrefixCacheStandIn) -> str:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(stand_in.app(), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def build_workload(requests: int, dates: int, seed: int) -> List[Dict]:
+    """여러 사용자의 요청(요청마다 날짜 여러 개)을 순서대로 나열한 워크로드"""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(requests):
+        age = rng.choice([16, 25, 45, 70])
+        person = {
+            "person_name": rng.choice(["Alice", "Peter", "Sue"]),
+            "age": age,
+            "gender": rng.choice(["male", "female"]),
+            "situation": rng.choice(main5.SITUATION_OPTIONS[main5.get_age_group(age)]),
+        }
+        start = datetime(2025, 6, 1) + timedelta(days=rng.randrange(30))
+        for i in range(dates):
+            workload.append({**person, "current_date": (start + timedelta(days=i)).strftime("%Y-%m-%d"), "minutes": rng.randint(5, 10)})
+    return workload
+
+
+async def measure_ttft(client: httpx.AsyncClient, backend: Backend, messages: List[Dict]) -> float:
+    payload = build_chat_payload(backend, main5.LM_STUDIO_MODEL, messages, 32, stream=True, temperature=0.7)
+    started = time.perf_counter()
+    async with client.stream("POST", backend.chat_url(), json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data: ") and line[len("data: "):].strip() != "[DONE]":
+                return time.perf_counter() - started
+    return time.perf_counter() - started
+
+
+async def run_config(url: str, layout: str, cache_hints: bool, workload: List[Dict], stand_in: Optional[PrefixCacheStandIn]) -> Dict:
+    if stand_in is not None:
+        stand_in.reset()
+    backend = Backend(name="bench", url=url, cache_hints=cache_hints)
+    ttfts = []
+    async with httpx.AsyncClient(timeout=None) as client:
+        for item in workload:
+            rng = random.Random(f"{item['person_name']}:{item['current_date']}")
+            prompt, _ = LAYOUTS[layout](
+                item["person_name"], item["age"], item["gender"], item["situation"], item["minutes"], item["current_date"], rng
+            )
+            ttfts.append(await measure_ttft(client, backend, [{"role": "user", "content": prompt}]))
+    result = {
+        "layout": layout,
+        "cache_hints": cache_hints,
+        "requests": len(ttfts),
+        "ttft_mean_ms": round(sum(ttfts) / len(ttfts) * 1000, 1),
+        "ttft_p50_ms": round(percentile(ttfts, 50) * 1000, 1),
+        "ttft_p95_ms": round(percentile(ttfts, 95) * 1000, 1),
+    }
+    if stand_in is not None:
+        prompt_tokens = sum(r["prompt_tokens"] for r in stand_in.requests)
+        result["prompt_tokens"] = prompt_tokens
+        result["cached_token_ratio"] = round(sum(r["cached_tokens"] for r in stand_in.requests) / prompt_tokens, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="프롬프트 레이아웃/캐시 힌트별 TTFT 비교")
+    parser.add_argument("--url", help="측정할 OpenAI 호환 서버 기본 URL (없으면 로컬 대역 서버 사용)")
+    parser.add_argument("--server-mode", choices=["llamacpp", "auto"], default="llamacpp", help="대역 서버의 캐시 재사용 조건")
+    parser.add_argument("--slots", type=int, default=1, help="대역 서버의 KV 캐시 슬롯 수")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5, help="대역 서버의 토큰당 프리필 시간(ms)")
+    parser.add_argument("--tokens-per-sec", type=float, default=50, help="대역 서버의 생성 속도")
+    parser.add_argument("--output-tokens", type=int, default=4, help="대역 서버가 요청마다 생성할 토큰 수")
+    parser.add_argument("--requests", type=int, default=10, help="요청 수 (요청마다 참여자/상황이 다름)")
+    parser.add_argument("--dates", type=int, default=3, help="요청 하나의 날짜 수")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stand_in = None
+    url = args.url
+    if url is None:
+        stand_in = PrefixCacheStandIn(args.server_mode, args.slots, args.prefill_ms_per_token, args.tokens_per_sec, args.output_tokens)
+        url = start_stand_in(stand_in)
+
+    workload = build_workload(args.requests, args.dates, args.seed)
+    results = []
+    for layout in LAYOUTS:
+        for cache_hints in (False, True):
+            results.append(asyncio.run(run_config(url, layout, cache_hints, workload, stand_in)))
+
+    baseline = results[0]["ttft_mean_ms"]
+    for result in results:
+        result["ttft_mean_speedup"] = round(baseline / result["ttft_mean_ms"], 2) if result["ttft_mean_ms"] else None
+    print(json.dumps({
+        "server": "stand-in" if stand_in is not None else url,
+        "server_mode": args.server_mode if stand_in is not None else None,
+        "prefix_chars": len(main5.PROMPT_INSTRUCTIONS),
+        "results": results,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+SSE 디코더 벤치마크
+
+녹화된(또는 합성한) LM Studio 스트림을 여러 청크 크기로 잘라 StreamDecoder에 넣고,
+처리 속도(MB/s, 이벤트/s)와 복원한 텍스트가 원본과 같은지 확인합니다.
+비교를 위해 예전 방식(청크마다 decode + splitlines)으로 잃어버리는 이벤트 수도 함께 출력합니다.
+
+실행 예시:
+    python benchmarks/sse_decoder_bench.py
+    python benchmarks/sse_decoder_bench.py --recording lm_studio_stream.bin --chunk-sizes 1 3 64 4096
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Tuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "project"))
+
+from llm_common.sse_decoder import StreamDecoder  # noqa: E402
+
+SAMPLE_LINES = [
+    "사용자: 안녕하세요, Alice님. 요즘 학교 생활은 어떠세요? | 감정: 기쁨",
+    "Alice: 요즘 시험 때문에 너무 힘들어요. | 감정: 슬픔, 두려움",
+    "사용자: 많이 지치셨겠어요. 어떤 과목이 제일 걱정되세요? | 감정: 슬픔",
+    "Alice: 수학이요. 아무리 해도 점수가 안 올라서 화가 나요. | 감정: 분노",
+]
+
+
+def synthesize_stream(utterances: int) -> Tuple[bytes, str]:
+    """LM Studio처럼 토큰 몇 글자씩 data: 이벤트로 보내는 스트림과 원본 텍스트 생성"""
+    text = "\n".join(SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(utterances))
+    events = []
+    for start in range(0, len(text), 3):
+        delta = {"choices": [{"index": 0, "delta": {"content": text[start:start + 3]}}]}
+        events.append(f"data: {json.dumps(delta, ensure_ascii=False)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode("utf-8"), text
+
+
+def split_chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def decode_with_stream_decoder(chunks) -> Tuple[str, dict]:
+    decoder = StreamDecoder("sse")
+    parts = []
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            parts.append(event["choices"][0]["delta"].get("content", ""))
+    for event in decoder.close():
+        parts.append(event["choices"][0]["delta"].get("content", ""))
+    return "".join(parts), decoder.stats
+
+
+def decode_per_chunk(chunks) -> Tuple[str, int]:
+    """예전 call_lm_studio_stream 방식: 청크마다 따로 decode/splitlines (경계에 걸린 이벤트는 버려짐)"""
+    parts, dropped = [], 0
+    for chunk in chunks:
+        try:
+            chunk_str = chunk.decode("utf-8")
+        except UnicodeDecodeError:
+            dropped += 1
+            continue
+        for line in chunk_str.splitlines():
+            if line.startswith("data: "):
+                json_data = line[len("data: "):]
+                if json_data.strip() == "[DONE]":
+                    continue
+                try:
+                    parts.append(json.loads(json_data)["choices"][0]["delta"].get("content", ""))
+                except json.JSONDecodeError:
+                    dropped += 1
+    return "".join(parts), dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StreamDecoder 처리량/정확도 벤치마크")
+    parser.add_argument("--recording", type=Path, help="녹화한 원시 SSE 바이트 파일 (없으면 합성 스트림 사용)")
+    parser.add_argument("--utterances", type=int, default=2000, help="합성 스트림의 발화 수")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1, 7, 64, 1024, 16384])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.recording:
+        data, expected_text = args.recording.read_bytes(), None
+    else:
+        data, expected_text = synthesize_stream(args.utterances)
+
+    results = []
+    for size in args.chunk_sizes:
+        chunks = split_chunks(data, size)
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            text, stats = decode_with_stream_decoder(chunks)
+            best = min(best, time.perf_counter() - t0)
+        legacy_text, legacy_dropped = decode_per_chunk(chunks)
+        results.append({
+            "chunk_size": size,
+            "chunks": len(chunks),
+            "seconds": round(best, 4),
+            "mb_per_sec": round(len(data) / best / 1e6, 2),
+            "events_per_sec": round(stats["events"] / best),
+            "events": stats["events"],
+            "malformed_events": stats["malformed_events"],
+            "decode_errors": stats["decode_errors"],
+            "text_matches": text == expected_text if expected_text is not None else None,
+            "legacy_dropped_chunks_or_events": legacy_dropped,
+            "legacy_text_matches": legacy_text == expected_text if expected_text is not None else None,
+        })
+
+    print(json.dumps({"stream_bytes": len(data), "results": results}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
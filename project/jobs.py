@@ -0,0 +1,179 @@
+"""
+오래 걸리는 대화 생성을 위한 비동기 작업(job) 관리
+
+요청을 받으면 작업 id만 바로 돌려주고, 생성은 앱이 관리하는 백그라운드 태스크에서 실행합니다.
+브라우저 새로고침이나 프록시 타임아웃으로 HTTP 연결이 끊어져도 생성은 계속되며,
+클라이언트는 상태 조회(부분 결과 포함)나 이벤트 스트림으로 진행 상황을 다시 받을 수 있습니다.
+
+- 동시에 실행하는 작업 수는 LLM_JOB_MAX_RUNNING으로 제한하고, 나머지는 queued 상태로 대기합니다.
+- 이벤트는 작업별로 모두 보관하므로 늦게 연결한 구독자도 처음부터 다시 받습니다.
+- 끝난 작업은 LLM_JOB_RETENTION_SECONDS 동안 보관한 뒤 새 작업을 받을 때 정리합니다.
+
+환경 변수:
+    LLM_JOB_MAX_RUNNING        동시에 실행할 최대 작업 수 (기본값: 2)
+    LLM_JOB_RETENTION_SECONDS  끝난 작업을 보관하는 시간(초) (기본값: 3600)
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+LLM_JOB_MAX_RUNNING = int(os.getenv("LLM_JOB_MAX_RUNNING", "2"))
+LLM_JOB_RETENTION_SECONDS = float(os.getenv("LLM_JOB_RETENTION_SECONDS", "3600"))
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class Job:
+    def __init__(self, job_id: str, request: Dict, total: int):
+        self.id = job_id
+        self.request = request
+        self.total = total
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.results: Dict[int, Any] = {} # 날짜 인덱스 -> 생성된 대화문 (부분 결과)
+        self.error: Optional[str] = None
+        self.events: List[Dict] = []
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    async def _publish(self, event: Dict) -> None:
+        async with self.changed:
+            self.events.append(event)
+            self.changed.notify_all()
+
+    async def set_status(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        if status == "running":
+            self.started_at = time.time()
+        elif status in TERMINAL_STATUSES:
+            self.finished_at = time.time()
+        if error is not None:
+            self.error = error
+        event = {"event": "status", "status": status}
+        if error is not None:
+            event["error"] = error
+        await self._publish(event)
+
+    async def add_result(self, index: int, result: Any) -> None:
+        """날짜 하나의 대화문이 완성될 때마다 호출 (완료 순서대로 이벤트 전송)"""
+        self.results[index] = result
+        await self._publish({"event": "conversation", "index": index, "completed": len(self.results), "total": self.total, "data": result})
+
+    async def subscribe(self) -> AsyncIterator[Dict]:
+        """지금까지의 이벤트를 재생한 뒤 작업이 끝날 때까지 새 이벤트를 전달"""
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.events) or self.finished)
+                pending = self.events[position:]
+            for event in pending:
+                yield event
+            position += len(pending)
+            if self.finished and position >= len(self.events):
+                break
+
+    def snapshot(self, include_results: bool = True) -> Dict:
+        snapshot = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {"completed": len(self.results), "total": self.total},
+            "error": self.error,
+        }
+        if include_results:
+            # 부분 결과도 날짜(인덱스) 순서대로 반환
+            snapshot["results"] = [self.results[i] for i in sorted(self.results)]
+        return snapshot
+
+
+class JobManager:
+    def __init__(self, max_running: int = LLM_JOB_MAX_RUNNING, retention_seconds: float = LLM_JOB_RETENTION_SECONDS):
+        self.max_running = max_running
+        self.retention_seconds = retention_seconds
+        self.jobs: Dict[str, Job] = {}
+        self._slots: Optional[asyncio.Semaphore] = None # 이벤트 루프 안에서 처음 사용할 때 생성
+
+    def _prune(self) -> None:
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished and job.finished_at is not None and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def submit(
+        self,
+        request: Dict,
+        total: int,
+        runner: Callable[[Job], Awaitable[None]],
+        job_id: Optional[str] = None,
+        on_finished: Optional[Callable[[], None]] = None,
+    ) -> Job:
+        """작업을 등록하고 백그라운드에서 runner(job)를 실행 (runner는 job.add_result로 부분 결과를 보고)
+
+        job_id를 지정했는데 같은 ID의 작업이 아직 진행 중이면 새로 실행하지 않고 그 작업을 반환합니다.
+        on_finished는 작업이 어떻게 끝나든(실행 슬롯을 기다리다 취소된 경우 포함) 한 번 호출되며,
+        기존 작업을 반환할 때는 바로 호출됩니다 (수락 티켓 반환 등).
+        """
+        self._prune()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        existing = self.jobs.get(job_id) if job_id is not None else None
+        if existing is not None and not existing.finished:
+            if on_finished is not None:
+                on_finished()
+            return existing
+        job = Job(job_id or uuid.uuid4().hex, request, total)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, runner, on_finished))
+        return job
+
+    async def _run(self, job: Job, runner: Callable[[Job], Awaitable[None]], on_finished: Optional[Callable[[], None]]) -> None:
+        try:
+            async with self._slots:
+                await job.set_status("running")
+                await runner(job)
+            await job.set_status("succeeded")
+        except asyncio.CancelledError:
+            await job.set_status("cancelled")
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e) or repr(e)
+            await job.set_status("failed", error=str(detail))
+        finally:
+            if on_finished is not None:
+                on_finished()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """작업을 취소하고 실제로 멈출 때까지 대기 (이미 끝난 작업은 그대로 반환)"""
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished and job.task is not None:
+            job.task.cancel()
+            await asyncio.wait([job.task])
+        return job
+
+    async def shutdown(self) -> None:
+        """앱 종료 시 진행 중인 작업 취소"""
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_running": self.max_running, "jobs": len(self.jobs), "by_status": counts}
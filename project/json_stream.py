@@ -0,0 +1,167 @@
+"""
+날짜 기록 JSON 배열 응답용 증분 파서 (main4.py 스트리밍 생성)
+
+main4.py의 응답 형식 [{"날짜": ..., "대화목록": [{...}, {...}]}, ...]을 LLM이 보내는 텍스트 조각 단위로 읽어,
+대화목록 항목 하나의 닫는 괄호가 도착하면 그 항목만 json.loads로 디코딩해 바로 돌려줍니다.
+버퍼에는 지금 읽고 있는 항목(또는 날짜 기록의 필드 값) 하나의 원문만 남기므로 응답 길이와 관계없이 메모리 사용량이 일정합니다.
+
+- 첫 '[' 앞의 텍스트(코드 블록 표시 ```json, json 모드 응답의 {"날짜기록": 등)와 최상위 배열이 닫힌 뒤의 텍스트는 무시
+- 날짜 기록 객체의 대화목록 외 필드(날짜 등)는 record에 모아 두므로, 항목을 받을 때 그 기록의 날짜를 알 수 있음
+  (날짜 필드가 대화목록보다 뒤에 오면 항목을 받는 시점에는 아직 비어 있음)
+- 문자열 안은 다음 따옴표/역슬래시까지 한 번에 건너뛰므로 긴 텍스트도 글자마다 검사하지 않음
+- 형식이 잘못된 항목은 건너뛰고 stats["invalid_items"]로 셈 (전체 문법 검사는 하지 않음)
+
+feed가 돌려주는 이벤트:
+    ("item", 기록 번호, 대화목록 항목 dict)     대화목록 항목 하나가 닫힐 때
+    ("record", 기록 번호, 대화목록 외 필드 dict)  날짜 기록 객체 하나가 닫힐 때
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+# 컨테이너 깊이: 1 = 최상위 배열, 2 = 날짜 기록 객체, 3 = 대화목록 배열
+_RECORD_DEPTH = 2
+_ITEMS_DEPTH = 3
+
+
+class JsonArrayStreamParser:
+    def __init__(self, items_key: str = "대화목록"):
+        self.items_key = items_key
+        self._stack: List[str] = [] # 열려 있는 '[' / '{'
+        self._in_string = False
+        self._escape = False # 조각이 문자열 안의 역슬래시로 끝남
+        self._capture: Optional[str] = None # 읽고 있는 원문 종류: key, value, item
+        self._carry = "" # 이전 조각들에서 이어지는 캡처 원문
+        self._expect_key = False # 날짜 기록 객체에서 다음 문자열이 키인지
+        self._key: Optional[str] = None
+        self._in_items = False # 현재 날짜 기록의 대화목록 배열 안인지
+        self.record_index = -1
+        self.record: Dict[str, Any] = {} # 현재 날짜 기록의 대화목록 외 필드
+        self.started = False
+        self.closed = False # 최상위 배열이 닫힘 (응답이 끝까지 왔음)
+        self.stats = {"chars": 0, "records": 0, "items": 0, "invalid_items": 0}
+
+    def feed(self, text: str) -> List[Tuple[str, int, Dict[str, Any]]]:
+        """텍스트 조각을 추가하고, 이번 조각으로 닫힌 항목/기록 이벤트 목록을 반환"""
+        self.stats["chars"] += len(text)
+        events: List[Tuple[str, int, Dict[str, Any]]] = []
+        stack = self._stack
+        length = len(text)
+        start = 0 # 이번 조각에서 캡처가 시작된 위치 (이전 조각에서 이어지면 0)
+        i = 0
+        if self._escape and length:
+            self._escape = False
+            i = 1
+        while i < length and not self.closed:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    i = length
+                    break
+                j = match.start()
+                if text[j] == "\\":
+                    if j + 1 == length:
+                        self._escape = True
+                        i = length
+                        break
+                    i = j + 2
+                    continue
+                self._in_string = False
+                i = j + 1
+                if self._capture == "key":
+                    self._key = _loads(self._take(text, start, i))
+                continue
+
+            if not self.started:
+                i = text.find("[", i)
+                if i < 0:
+                    break
+                self.started = True
+                stack.append("[")
+                i += 1
+                continue
+
+            c = text[i]
+            depth = len(stack)
+            if c == '"':
+                self._in_string = True
+                if depth == _RECORD_DEPTH and self._capture is None:
+                    self._capture = "key" if self._expect_key else "value"
+                    start = i
+            elif c == "{" or c == "[":
+                if depth == 1 and c == "{":
+                    self.record_index += 1
+                    self.record = {}
+                    self._expect_key = True
+                    self._key = None
+                    self._in_items = False
+                elif depth == _RECORD_DEPTH and self._capture is None and not self._expect_key:
+                    if c == "[" and self._key == self.items_key:
+                        self._in_items = True
+                    else:
+                        self._capture = "value"
+                        start = i
+                elif depth == _ITEMS_DEPTH and self._in_items and c == "{" and self._capture is None:
+                    self._capture = "item"
+                    start = i
+                stack.append(c)
+            elif c == "}" or c == "]":
+                if depth == _RECORD_DEPTH and self._capture == "value":
+                    self._store_value(self._take(text, start, i))
+                stack.pop()
+                depth -= 1
+                if self._capture == "item" and depth == _ITEMS_DEPTH:
+                    self._emit_item(self._take(text, start, i + 1), events)
+                elif depth == _RECORD_DEPTH and c == "]" and self._in_items:
+                    self._in_items = False
+                elif depth == 1 and c == "}":
+                    self.stats["records"] += 1
+                    events.append(("record", self.record_index, self.record))
+                elif depth == 0:
+                    self.closed = True
+            elif depth == _RECORD_DEPTH:
+                if c == ",":
+                    if self._capture == "value":
+                        self._store_value(self._take(text, start, i))
+                    self._expect_key = True
+                elif c == ":":
+                    self._expect_key = False
+                elif c not in _WHITESPACE and self._capture is None and not self._expect_key:
+                    self._capture = "value" # 숫자, true/false/null
+                    start = i
+            i += 1
+
+        if self._capture is not None:
+            self._carry += text[start:]
+        return events
+
+    def _take(self, text: str, start: int, end: int) -> str:
+        """캡처를 끝내고 이전 조각에서 이어진 부분까지 합친 원문 반환"""
+        raw = self._carry + text[start:end]
+        self._carry = ""
+        self._capture = None
+        return raw
+
+    def _store_value(self, raw: str) -> None:
+        value = _loads(raw)
+        if self._key is not None and value is not None:
+            self.record[self._key] = value
+
+    def _emit_item(self, raw: str, events: List[Tuple[str, int, Dict[str, Any]]]) -> None:
+        item = _loads(raw)
+        if isinstance(item, dict):
+            self.stats["items"] += 1
+            events.append(("item", self.record_index, item))
+        else:
+            self.stats["invalid_items"] += 1
+
+
+def _loads(raw: str) -> Any:
+    """JSON 원문 디코딩 (형식이 잘못되면 None)"""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
@@ -0,0 +1,8 @@
+"""
+대화문 생성 앱(project/main*.py, streamlit/main.py)이 함께 쓰는 LLM 클라이언트 모듈
+
+백엔드 선택/서킷 브레이커(llm_backends), 재시도(llm_retry), 헤징(hedging), 중복 요청 병합(singleflight),
+응답 캐시(llm_cache), 토큰 예산(token_budget), SSE 디코더(sse_decoder), 수락 제어(admission),
+메트릭(metrics), 체크포인트(checkpoint), 발화 파서(utterance_parser)를 `llm_common.<모듈>`로 가져와 씁니다.
+project/ 밖의 앱은 project/ 디렉토리를 sys.path에 추가한 뒤 가져옵니다.
+"""
@@ -0,0 +1,161 @@
+"""
+생성 요청 수락 제어 (admission control / backpressure)
+
+동시에 진행 중인 생성 요청 수와 아직 끝나지 않은 날짜 수를 전체와 클라이언트별로 제한합니다.
+한도를 넘는 요청은 백엔드에 쌓지 않고 바로 429로 거절하며, Retry-After는 현재 대기 중인 날짜 수와
+최근에 관측한 처리량(초당 완료한 날짜 수)으로 계산한 예상 대기 시간입니다.
+
+- 클라이언트는 X-Client-Id 헤더(없으면 접속 IP)로 구분합니다.
+- 한도보다 많은 날짜를 요청해도, 해당 범위(전체 또는 클라이언트)에 진행 중인 요청이 없으면 단독으로 실행합니다.
+- 한도를 0으로 설정하면 그 한도는 적용하지 않습니다.
+
+환경 변수:
+    LLM_ADMISSION_MAX_IN_FLIGHT            전체 동시 생성 요청 수 (기본값: 8)
+    LLM_ADMISSION_MAX_QUEUED_DATES         전체에서 아직 끝나지 않은 날짜 수 (기본값: 120)
+    LLM_ADMISSION_CLIENT_MAX_IN_FLIGHT     클라이언트 하나의 동시 생성 요청 수 (기본값: 2)
+    LLM_ADMISSION_CLIENT_MAX_QUEUED_DATES  클라이언트 하나에서 아직 끝나지 않은 날짜 수 (기본값: 60)
+    LLM_ADMISSION_RATE_WINDOW              처리량을 계산할 최근 시간 범위(초) (기본값: 300)
+    LLM_ADMISSION_DEFAULT_RETRY_AFTER      처리량 표본이 없을 때의 Retry-After(초) (기본값: 30)
+    LLM_ADMISSION_MAX_RETRY_AFTER          Retry-After 최댓값(초) (기본값: 600)
+"""
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from .metrics import ADMISSION_REJECTIONS_TOTAL
+
+LLM_ADMISSION_MAX_IN_FLIGHT = int(os.getenv("LLM_ADMISSION_MAX_IN_FLIGHT", "8"))
+LLM_ADMISSION_MAX_QUEUED_DATES = int(os.getenv("LLM_ADMISSION_MAX_QUEUED_DATES", "120"))
+LLM_ADMISSION_CLIENT_MAX_IN_FLIGHT = int(os.getenv("LLM_ADMISSION_CLIENT_MAX_IN_FLIGHT", "2"))
+LLM_ADMISSION_CLIENT_MAX_QUEUED_DATES = int(os.getenv("LLM_ADMISSION_CLIENT_MAX_QUEUED_DATES", "60"))
+LLM_ADMISSION_RATE_WINDOW = float(os.getenv("LLM_ADMISSION_RATE_WINDOW", "300"))
+LLM_ADMISSION_DEFAULT_RETRY_AFTER = float(os.getenv("LLM_ADMISSION_DEFAULT_RETRY_AFTER", "30"))
+LLM_ADMISSION_MAX_RETRY_AFTER = float(os.getenv("LLM_ADMISSION_MAX_RETRY_AFTER", "600"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"요청이 많아 지금은 처리할 수 없습니다 ({reason}). {math.ceil(retry_after)}초 후에 다시 시도해주세요.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """수락된 요청 하나 (끝나지 않은 날짜 수를 추적하고, 끝나면 release)"""
+
+    def __init__(self, controller: "AdmissionController", client: str, dates: int):
+        self.controller = controller
+        self.client = client
+        self.remaining = dates
+        self.released = False
+
+    def date_done(self) -> None:
+        """날짜 하나가 완료될 때마다 호출"""
+        if self.remaining > 0 and not self.released:
+            self.remaining -= 1
+            self.controller._observe_completion()
+
+    def release(self) -> None:
+        """요청이 끝나면(성공, 실패, 취소 모두) 호출. 여러 번 호출해도 한 번만 반영"""
+        if not self.released:
+            self.released = True
+            self.controller._tickets.remove(self)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int = LLM_ADMISSION_MAX_IN_FLIGHT,
+        max_queued_dates: int = LLM_ADMISSION_MAX_QUEUED_DATES,
+        client_max_in_flight: int = LLM_ADMISSION_CLIENT_MAX_IN_FLIGHT,
+        client_max_queued_dates: int = LLM_ADMISSION_CLIENT_MAX_QUEUED_DATES,
+        rate_window: float = LLM_ADMISSION_RATE_WINDOW,
+        default_retry_after: float = LLM_ADMISSION_DEFAULT_RETRY_AFTER,
+        max_retry_after: float = LLM_ADMISSION_MAX_RETRY_AFTER,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queued_dates = max_queued_dates
+        self.client_max_in_flight = client_max_in_flight
+        self.client_max_queued_dates = client_max_queued_dates
+        self.rate_window = rate_window
+        self.default_retry_after = default_retry_after
+        self.max_retry_after = max_retry_after
+        self._tickets: List[AdmissionTicket] = []
+        self._completions = deque() # 최근 날짜 완료 시각 (처리량 계산용)
+        self.stats = {"admitted": 0, "rejected": 0, "rejected_by_reason": {}}
+
+    def _observe_completion(self) -> None:
+        self._completions.append(time.monotonic())
+
+    def throughput(self) -> Optional[float]:
+        """최근 rate_window 동안 초당 완료한 날짜 수 (표본이 부족하면 None)"""
+        now = time.monotonic()
+        while self._completions and now - self._completions[0] > self.rate_window:
+            self._completions.popleft()
+        if len(self._completions) < 2:
+            return None
+        elapsed = self._completions[-1] - self._completions[0]
+        return (len(self._completions) - 1) / elapsed if elapsed > 0 else None
+
+    def _retry_after(self, dates_to_drain: float, share: float) -> float:
+        """dates_to_drain개의 날짜가 끝날 때까지의 예상 시간 (share: 해당 범위가 차지하는 처리량 비율)"""
+        rate = self.throughput()
+        if rate is None:
+            return self.default_retry_after
+        seconds = dates_to_drain / (rate * max(share, 1e-6))
+        return min(self.max_retry_after, max(1.0, seconds))
+
+    def _check(self, tickets: List[AdmissionTicket], dates: int, max_in_flight: int, max_queued_dates: int, scope: str) -> Optional[AdmissionRejected]:
+        if not tickets:
+            return None # 진행 중인 요청이 없으면 한도보다 큰 요청도 단독으로 실행
+        share = len(tickets) / len(self._tickets)
+        if max_in_flight > 0 and len(tickets) >= max_in_flight:
+            # 가장 먼저 끝날 요청이 남은 날짜를 처리할 때까지 (처리량은 진행 중인 요청들이 나눠 씀)
+            soonest = min(ticket.remaining for ticket in tickets)
+            return AdmissionRejected(f"{scope}_in_flight", self._retry_after(soonest * len(tickets), share))
+        pending = sum(ticket.remaining for ticket in tickets)
+        if max_queued_dates > 0 and pending + dates > max_queued_dates:
+            excess = min(pending, pending + dates - max_queued_dates)
+            return AdmissionRejected(f"{scope}_queued_dates", self._retry_after(excess, share))
+        return None
+
+    def admit(self, client: str, dates: int, force: bool = False) -> AdmissionTicket:
+        """한도 안이면 티켓을 발급하고, 넘으면 AdmissionRejected를 발생 (force: 한도 검사 없이 사용량에만 반영)"""
+        client_tickets = [ticket for ticket in self._tickets if ticket.client == client]
+        rejection = None if force else (
+            self._check(client_tickets, dates, self.client_max_in_flight, self.client_max_queued_dates, "client")
+            or self._check(self._tickets, dates, self.max_in_flight, self.max_queued_dates, "global")
+        )
+        if rejection is not None:
+            self.stats["rejected"] += 1
+            by_reason = self.stats["rejected_by_reason"]
+            by_reason[rejection.reason] = by_reason.get(rejection.reason, 0) + 1
+            ADMISSION_REJECTIONS_TOTAL.inc(reason=rejection.reason)
+            raise rejection
+        ticket = AdmissionTicket(self, client, dates)
+        self._tickets.append(ticket)
+        self.stats["admitted"] += 1
+        return ticket
+
+    def snapshot(self) -> Dict:
+        rate = self.throughput()
+        clients: Dict[str, Dict[str, int]] = {}
+        for ticket in self._tickets:
+            entry = clients.setdefault(ticket.client, {"in_flight": 0, "queued_dates": 0})
+            entry["in_flight"] += 1
+            entry["queued_dates"] += ticket.remaining
+        return {
+            "limits": {
+                "max_in_flight": self.max_in_flight,
+                "max_queued_dates": self.max_queued_dates,
+                "client_max_in_flight": self.client_max_in_flight,
+                "client_max_queued_dates": self.client_max_queued_dates,
+            },
+            "in_flight": len(self._tickets),
+            "queued_dates": sum(ticket.remaining for ticket in self._tickets),
+            "dates_per_second": round(rate, 3) if rate is not None else None,
+            "clients": clients,
+            **self.stats,
+        }
@@ -0,0 +1,202 @@
+"""
+여러 날짜 대화문 생성의 체크포인트 저장소 (SQLite)
+
+날짜 하나의 대화문이 완성될 때마다 작업 ID(job_id) 기준으로 바로 기록해 두고,
+서버가 재시작되거나 생성이 중간에 실패한 뒤 같은 job_id로 다시 요청하면 저장된 날짜는 건너뛰고 남은 날짜만 생성합니다.
+날짜 하나를 쓰는 작업이 트랜잭션 하나이므로 프로세스가 중간에 죽어도 완료된 날짜는 그대로 남습니다.
+
+- jobs 테이블: 작업별 요청 본문, 생성할 날짜 수, 상태(queued, running, succeeded, failed, cancelled), 실행 방식(job, request)
+  (/jobs로 받은 작업은 실행 전에 queued로 기록해, 실행 슬롯을 기다리던 중에 서버가 재시작되어도 이어서 실행)
+- checkpoints 테이블: (job_id, 날짜 인덱스)별 완성된 대화문 JSON
+
+환경 변수:
+    LLM_CHECKPOINT_ENABLED         체크포인트 사용 여부 (기본값: true)
+    LLM_CHECKPOINT_PATH            SQLite 파일 경로 (기본값: checkpoints.sqlite3)
+    LLM_CHECKPOINT_RETENTION_DAYS  끝난 작업의 체크포인트를 보관하는 기간(일) (기본값: 7)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Collection, Dict, List, Optional
+
+LLM_CHECKPOINT_ENABLED = os.getenv("LLM_CHECKPOINT_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CHECKPOINT_PATH = os.getenv("LLM_CHECKPOINT_PATH", "checkpoints.sqlite3")
+LLM_CHECKPOINT_RETENTION_DAYS = float(os.getenv("LLM_CHECKPOINT_RETENTION_DAYS", "7"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id TEXT NOT NULL,
+    date_index INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, date_index)
+);
+"""
+
+
+class CheckpointConflictError(Exception):
+    """이미 있는 job_id를 다른 요청 내용으로 이어서 생성하려고 할 때"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"job_id {job_id}는 다른 요청 내용으로 이미 생성 중이거나 생성된 작업입니다.")
+        self.job_id = job_id
+
+
+class CheckpointStore:
+    def __init__(self, path: str = LLM_CHECKPOINT_PATH, enabled: bool = LLM_CHECKPOINT_ENABLED):
+        self.enabled = enabled
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {"jobs_started": 0, "jobs_resumed": 0, "dates_saved": 0, "dates_restored": 0}
+        if self.enabled:
+            if self.path.parent != Path("."):
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+            # 이벤트 루프와 스레드풀 어디서 호출해도 되도록 연결 하나를 락으로 보호해 공유
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL") # 쓰는 중에 죽어도 마지막으로 커밋된 날짜까지는 보존
+            self._conn.execute("PRAGMA synchronous=FULL") # 날짜당 한 번만 쓰므로 커밋마다 fsync해도 부담이 적음
+            self._conn.executescript(SCHEMA)
+
+    def start_job(
+        self, job_id: str, request: Dict, total: int, mode: str = "request", ignored_fields: Collection[str] = ()
+    ) -> Dict[int, Dict]:
+        """작업을 등록(이미 있으면 이어서 실행)하고 지금까지 저장된 날짜별 대화문을 반환
+
+        request는 그대로 저장해 재시작 후 같은 설정으로 이어서 생성하고,
+        이미 있는 작업과 같은 요청인지는 ignored_fields(생성 결과에 영향을 주지 않는 실행 옵션)를 뺀 나머지로만 비교합니다.
+        """
+        if not self.enabled:
+            return {}
+        with self._lock:
+            previous = self._register(job_id, request, total, mode, ignored_fields, "running")
+            completed = self._load(job_id)
+            if previous in (None, "queued") and not completed:
+                self.stats["jobs_started"] += 1
+            else:
+                self.stats["jobs_resumed"] += 1
+                self.stats["dates_restored"] += len(completed)
+            return completed
+
+    def queue_job(
+        self, job_id: str, request: Dict, total: int, mode: str = "job", ignored_fields: Collection[str] = ()
+    ) -> None:
+        """실행을 기다리는 작업을 queued로 기록 (재시작 후 unfinished_jobs에 포함, 다른 요청 내용이면 CheckpointConflictError)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._register(job_id, request, total, mode, ignored_fields, "queued")
+
+    def _register(
+        self, job_id: str, request: Dict, total: int, mode: str, ignored_fields: Collection[str], status: str
+    ) -> Optional[str]:
+        """작업 행을 추가하거나 상태를 바꾸고 이전 상태를 반환 (새 작업이면 None)"""
+        request_json = json.dumps(request, ensure_ascii=False, sort_keys=True)
+        now = time.time()
+        row = self._conn.execute("SELECT request, status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, request, total, status, mode, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, request_json, total, status, mode, now, now),
+            )
+            return None
+        if _identity(json.loads(row[0]), ignored_fields) != _identity(request, ignored_fields):
+            raise CheckpointConflictError(job_id)
+        # 실행 옵션은 마지막 요청의 값으로 갱신
+        self._conn.execute(
+            "UPDATE jobs SET request = ?, status = ?, mode = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+            (request_json, status, mode, now, job_id),
+        )
+        return row[1]
+
+    def _load(self, job_id: str) -> Dict[int, Dict]:
+        rows = self._conn.execute(
+            "SELECT date_index, data FROM checkpoints WHERE job_id = ? ORDER BY date_index", (job_id,)
+        ).fetchall()
+        return {index: json.loads(data) for index, data in rows}
+
+    def load(self, job_id: str) -> Dict[int, Dict]:
+        """저장된 날짜별 대화문 (날짜 인덱스 -> 대화문)"""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            return self._load(job_id)
+
+    def save(self, job_id: str, index: int, data: Dict) -> None:
+        """날짜 하나의 대화문을 바로 디스크에 기록"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, date_index, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, index, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+            self.stats["dates_saved"] += 1
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def unfinished_jobs(self, mode: str = "job") -> List[Dict]:
+        """서버가 멈추기 전에 끝나지 않은(실행 중이거나 실행을 기다리던) 작업 목록 (재시작 후 이어서 생성할 대상)"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, request, total FROM jobs WHERE status IN ('queued', 'running') AND mode = ? ORDER BY created_at",
+                (mode,),
+            ).fetchall()
+        return [{"job_id": job_id, "request": json.loads(request), "total": total} for job_id, request, total in rows]
+
+    def prune(self, retention_days: float = LLM_CHECKPOINT_RETENTION_DAYS) -> int:
+        """retention_days보다 오래전에 끝난 작업과 체크포인트 삭제"""
+        if not self.enabled:
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status NOT IN ('queued', 'running') AND updated_at < ?", (cutoff,)
+            ).fetchall()]
+            for job_id in expired:
+                self._conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return len(expired)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def snapshot(self) -> Dict:
+        snapshot = {"enabled": self.enabled, "path": str(self.path), **self.stats}
+        if self.enabled and self._conn is not None:
+            with self._lock:
+                snapshot["jobs_by_status"] = dict(
+                    self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+                )
+                snapshot["stored_dates"] = self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return snapshot
+
+
+def _identity(request: Dict, ignored_fields: Collection[str]) -> Dict:
+    """같은 작업인지 비교할 요청 내용 (ignored_fields 제외)"""
+    return {key: value for key, value in request.items() if key not in ignored_fields}
@@ -0,0 +1,240 @@
+"""
+LLM 요청 헤징 (tail latency 줄이기)
+
+생성이 관측한 지연 시간의 백분위수(기본 p95)를 넘길 때까지 끝나지 않으면(스트리밍은 첫 토큰이 오지 않으면)
+다른 백엔드에 같은 요청을 한 번 더 보내고, 먼저 끝난 쪽 결과를 사용한 뒤 나머지 요청은 취소합니다.
+가끔 300초 타임아웃 근처까지 멈춰 있는 생성 때문에 전체 요청이 늦어지는 것을 막기 위한 것입니다.
+
+- run(): 비스트리밍 호출. 먼저 성공한 쪽의 결과를 반환
+- stream(): 스트리밍 호출. 먼저 min_tokens개의 청크를 보낸 쪽을 선택해 계속 전달
+지연 시간 표본은 헤징 사용 여부와 관계없이 항상 기록하므로, 켜기 전에 /hedge-stats/에서 임계값을 확인할 수 있습니다.
+
+환경 변수:
+    LLM_HEDGE_ENABLED      헤징 사용 여부 (기본값: false)
+    LLM_HEDGE_PERCENTILE   헤지 요청을 보낼 지연 시간 백분위수 (기본값: 95)
+    LLM_HEDGE_MIN_SAMPLES  헤징을 시작할 최소 지연 시간 표본 수 (기본값: 20)
+    LLM_HEDGE_WINDOW       보관할 최근 지연 시간 표본 수 (기본값: 200)
+    LLM_HEDGE_MIN_TOKENS   스트리밍에서 임계 시간 안에 받아야 할 청크(토큰) 수 (기본값: 1)
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from .token_budget import percentile
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+LLM_HEDGE_MIN_TOKENS = int(os.getenv("LLM_HEDGE_MIN_TOKENS", "1"))
+
+_END = object() # 스트림 종료 표시
+
+
+class _StreamRunner:
+    """스트림 하나를 별도 태스크로 읽어 큐에 쌓고, min_tokens 도달/종료 시 changed 이벤트로 알림"""
+
+    def __init__(self, source: AsyncIterator[Any], min_tokens: int, changed: asyncio.Event):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.count = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.started = asyncio.get_running_loop().time()
+        self.ready_at: Optional[float] = None # min_tokens개를 받았거나 정상 종료한 시각
+        self._min_tokens = min_tokens
+        self._changed = changed
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                self.queue.put_nowait(item)
+                self.count += 1
+                if self.count == self._min_tokens:
+                    self.ready_at = asyncio.get_running_loop().time()
+                    self._changed.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.error is None and self.ready_at is None:
+                self.ready_at = asyncio.get_running_loop().time() # min_tokens보다 짧게 끝난 정상 응답
+            self.done = True
+            self.queue.put_nowait(_END)
+            self._changed.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        enabled: bool = LLM_HEDGE_ENABLED,
+        pct: float = LLM_HEDGE_PERCENTILE,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        window: int = LLM_HEDGE_WINDOW,
+        min_tokens: int = LLM_HEDGE_MIN_TOKENS,
+    ):
+        self.enabled = enabled
+        self.pct = pct
+        self.min_samples = min_samples
+        self.min_tokens = max(1, min_tokens)
+        self._samples = deque(maxlen=window)
+        self.stats = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "skipped_no_backend": 0, # 임계 시간을 넘겼지만 여유 있는 다른 백엔드가 없어 헤지하지 않음
+            "estimated_latency_saved_seconds": 0.0,
+        }
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        """헤지 요청을 보낼 대기 시간 (헤징이 꺼져 있거나 표본이 부족하면 None)"""
+        if not self.enabled or len(self._samples) < self.min_samples:
+            return None
+        return percentile(self._samples, self.pct)
+
+    def _estimate_saved(self, elapsed: float) -> float:
+        """헤지 쪽이 이겼을 때 절약한 시간 추정: elapsed까지 끝나지 않았던 과거 요청들의 평균 지연 - elapsed"""
+        tail = [s for s in self._samples if s > elapsed]
+        return sum(tail) / len(tail) - elapsed if tail else 0.0
+
+    def _record_outcome(self, hedged: bool, hedge_won: bool, primary_elapsed: float) -> None:
+        if hedge_won:
+            self.stats["hedge_wins"] += 1
+            self.stats["estimated_latency_saved_seconds"] += self._estimate_saved(primary_elapsed)
+        elif hedged:
+            self.stats["primary_wins"] += 1
+        # 헤지 쪽이 이기면 primary의 실제 지연은 알 수 없으므로 그 시점까지의 경과 시간(하한)을 기록
+        # (헤지 요청의 지연을 기록하면 느린 요청이 표본에서 빠져 임계값이 점점 낮아짐)
+        self.record(primary_elapsed)
+
+    async def run(self, primary: Callable[[], Awaitable[Any]], alternative: Callable[[], Optional[Awaitable[Any]]]) -> Any:
+        """primary()를 실행하고 임계 시간 안에 끝나지 않으면 alternative()(다른 백엔드 요청, 없으면 None)와 경쟁"""
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        threshold = self.threshold()
+        primary_task = asyncio.ensure_future(primary())
+        tasks: Set[asyncio.Future] = {primary_task}
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+                if not done:
+                    hedge = alternative()
+                    if hedge is None:
+                        self.stats["skipped_no_backend"] += 1
+                    else:
+                        self.stats["hedged"] += 1
+                        tasks.add(asyncio.ensure_future(hedge))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_outcome(len(tasks) > 1, task is not primary_task, loop.time() - started)
+                        return task.result()
+                    # 한쪽이 실패해도 다른 쪽이 아직 진행 중이면 기다림 (primary의 오류를 우선 보고)
+                    if error is None or task is primary_task:
+                        error = task.exception()
+            raise error
+        finally:
+            # 진 쪽 요청 취소 (호출자가 취소된 경우에는 양쪽 모두 취소)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def stream(
+        self,
+        primary: Callable[[], AsyncIterator[Any]],
+        alternative: Callable[[], Optional[AsyncIterator[Any]]],
+    ) -> AsyncIterator[Any]:
+        """primary() 스트림이 임계 시간 안에 min_tokens개를 보내지 않으면 alternative() 스트림과 경쟁시켜 먼저 도달한 쪽을 전달"""
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        threshold = self.threshold()
+        if threshold is None:
+            # 헤징하지 않을 때는 태스크 없이 그대로 전달하고 min_tokens 도달 시간만 기록
+            started = loop.time()
+            count = 0
+            source = primary()
+            try:
+                async for item in source:
+                    count += 1
+                    if count == self.min_tokens:
+                        self.record(loop.time() - started)
+                    yield item
+                if count < self.min_tokens:
+                    self.record(loop.time() - started)
+            finally:
+                await source.aclose()
+            return
+
+        changed = asyncio.Event()
+        primary_runner = _StreamRunner(primary(), self.min_tokens, changed)
+        runners = [primary_runner]
+        try:
+            try:
+                await asyncio.wait_for(self._wait_ready(runners, changed), timeout=threshold)
+            except asyncio.TimeoutError:
+                hedge = alternative()
+                if hedge is None:
+                    self.stats["skipped_no_backend"] += 1
+                else:
+                    self.stats["hedged"] += 1
+                    runners.append(_StreamRunner(hedge, self.min_tokens, changed))
+            winner = await self._wait_ready(runners, changed)
+            if winner is None:
+                raise primary_runner.error or runners[-1].error
+            for runner in runners:
+                if runner is not winner:
+                    runner.task.cancel()
+            self._record_outcome(len(runners) > 1, winner is not primary_runner, winner.ready_at - primary_runner.started)
+
+            while True:
+                item = await winner.queue.get()
+                if item is _END:
+                    break
+                yield item
+            if winner.error is not None:
+                raise winner.error
+        finally:
+            for runner in runners:
+                if not runner.task.done():
+                    runner.task.cancel()
+
+    @staticmethod
+    async def _wait_ready(runners, changed: asyncio.Event) -> Optional[_StreamRunner]:
+        """min_tokens에 먼저 도달한 스트림 반환 (모두 실패하면 None)"""
+        while True:
+            changed.clear()
+            for runner in runners:
+                if runner.ready:
+                    return runner
+            if all(runner.done for runner in runners):
+                return None
+            await changed.wait()
+
+    def snapshot(self) -> Dict:
+        samples = list(self._samples)
+        hedged = self.stats["hedged"]
+        return {
+            "enabled": self.enabled,
+            "percentile": self.pct,
+            "min_samples": self.min_samples,
+            "min_tokens": self.min_tokens,
+            "samples": len(samples),
+            "threshold_seconds": round(percentile(samples, self.pct), 3) if samples else None,
+            **self.stats,
+            "estimated_latency_saved_seconds": round(self.stats["estimated_latency_saved_seconds"], 3),
+            "hedge_rate": round(hedged / self.stats["requests"], 3) if self.stats["requests"] else None,
+            "hedge_win_rate": round(self.stats["hedge_wins"] / hedged, 3) if hedged else None,
+        }
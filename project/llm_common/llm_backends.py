@@ -0,0 +1,333 @@
+"""
+여러 추론 서버(LM Studio 등 OpenAI 호환 서버, Ollama)를 묶어 관리하는 백엔드 레지스트리
+
+백엔드 목록은 환경 변수 LLM_BACKENDS(JSON 배열) 또는 LLM_BACKENDS_FILE(JSON 파일 경로)로 지정합니다.
+둘 다 없으면 각 앱의 기본 URL 하나만 사용합니다.
+
+백엔드마다 서킷 브레이커를 둡니다. 연속 실패가 LLM_MAX_CONSECUTIVE_FAILURES번에 이르면
+LLM_CIRCUIT_OPEN_SECONDS 동안 그 백엔드로 요청을 보내지 않고(open), 그 뒤에는 요청 하나만 시험 삼아 보냅니다(half-open).
+시험 요청이 성공하면 다시 정상 라우팅하고, 실패하면 다시 open 상태가 됩니다.
+실패로 세는 것은 백엔드 자체의 문제(연결 오류, 타임아웃, 5xx 응답)뿐이며, 4xx 같은 요청 쪽 오류는 서킷에 반영하지 않습니다.
+모든 백엔드가 open 상태이면 pick()이 CircuitOpenError를 발생시켜 호출자가 바로 실패 처리할 수 있습니다.
+
+cache_hints를 켠 백엔드에는 프롬프트(KV) 캐시를 재사용하도록 백엔드별 힌트를 함께 보냅니다.
+(OpenAI 호환 서버: llama.cpp 서버의 cache_prompt, Ollama: 모델과 KV 캐시를 메모리에 유지하는 keep_alive)
+LM Studio나 vLLM처럼 접두사 캐시를 자동으로 쓰는 서버는 힌트 없이도 프롬프트 앞부분이 같으면 재사용합니다.
+
+response_schema(JSON 스키마)를 주면 백엔드가 스키마에 맞는 토큰만 생성하도록 제한합니다 (구조화 출력).
+(OpenAI 호환 서버: response_format의 json_schema (llama.cpp 서버는 이를 GBNF 문법으로 바꿔 적용), Ollama: format)
+
+예시:
+    LLM_BACKENDS='[
+        {"name": "gpu1", "url": "http://10.0.0.11:1234", "kind": "openai", "weight": 2},
+        {"name": "gpu2", "url": "http://10.0.0.12:11434", "kind": "ollama", "model": "gemma2:9b", "cache_hints": true}
+    ]'
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+
+# 라우팅 전략: least_outstanding(처리 중인 요청이 가장 적은 백엔드) 또는 tokens_per_sec(관측 처리량이 가장 높은 백엔드)
+LLM_ROUTING_STRATEGY = os.getenv("LLM_ROUTING_STRATEGY", "least_outstanding")
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "15"))
+# 연속으로 이 횟수만큼 실패하면 다음 헬스 체크가 성공할 때까지 라우팅 대상에서 제외
+LLM_MAX_CONSECUTIVE_FAILURES = int(os.getenv("LLM_MAX_CONSECUTIVE_FAILURES", "3"))
+# 서킷이 열린 뒤 시험 요청을 보내기까지 기다리는 시간 (초)
+LLM_CIRCUIT_OPEN_SECONDS = float(os.getenv("LLM_CIRCUIT_OPEN_SECONDS", "30"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LM_STUDIO_MAX_CONCURRENCY", "4"))
+# 백엔드 설정에 cache_hints가 없을 때의 기본값과 Ollama keep_alive 값
+LLM_CACHE_HINTS = os.getenv("LLM_CACHE_HINTS", "false").lower() in ("1", "true", "yes")
+LLM_OLLAMA_KEEP_ALIVE = os.getenv("LLM_OLLAMA_KEEP_ALIVE", "30m")
+
+# 백엔드 종류별 경로
+CHAT_PATHS = {"openai": "/v1/chat/completions", "ollama": "/api/chat"}
+HEALTH_PATHS = {"openai": "/v1/models", "ollama": "/api/tags"}
+# 설정된 URL에서 떼어 낼 API 경로 (앞에 붙은 리버스 프록시 경로 등은 유지)
+API_PATH_SUFFIXES = (
+    "/v1/chat/completions", "/v1/completions", "/v1/models", "/v1",
+    "/api/chat", "/api/generate", "/api/tags",
+)
+
+
+@dataclass
+class Backend:
+    name: str
+    url: str # API 경로를 뺀 기본 URL (예: http://localhost:1234, http://gateway/llm)
+    kind: str = "openai" # "openai" 또는 "ollama"
+    model: Optional[str] = None # 지정하면 요청의 모델명을 이 값으로 대체
+    weight: float = 1.0
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    cache_hints: bool = LLM_CACHE_HINTS # 프롬프트 캐시 재사용 힌트 전송 여부
+    outstanding: int = 0
+    healthy: bool = True
+    consecutive_failures: int = 0
+    completed: int = 0
+    failed: int = 0
+    tokens_per_sec: Optional[float] = None # 완료된 생성의 토큰/초 지수이동평균
+    circuit_open_until: float = 0.0 # time.monotonic() 기준, 이 시각 전까지는 요청을 보내지 않음
+
+    def endpoint(self, path: str) -> str:
+        return self.url.rstrip("/") + path
+
+    def chat_url(self) -> str:
+        return self.endpoint(CHAT_PATHS[self.kind])
+
+    def observe(self, completion_tokens: int, seconds: float) -> None:
+        """완료된 생성의 처리량을 반영 (EWMA, alpha=0.3)"""
+        if completion_tokens <= 0 or seconds <= 0:
+            return
+        rate = completion_tokens / seconds
+        if self.tokens_per_sec is None:
+            self.tokens_per_sec = rate
+        else:
+            self.tokens_per_sec = 0.7 * self.tokens_per_sec + 0.3 * rate
+
+    def circuit_state(self, now: float) -> str:
+        """서킷 브레이커 상태: closed(정상), open(요청 차단), half_open(시험 요청 허용)"""
+        if self.circuit_open_until > now:
+            return "open"
+        if self.consecutive_failures >= LLM_MAX_CONSECUTIVE_FAILURES:
+            return "half_open"
+        return "closed"
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "url": self.url,
+            "kind": self.kind,
+            "model": self.model,
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "cache_hints": self.cache_hints,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "completed": self.completed,
+            "failed": self.failed,
+            "tokens_per_sec": round(self.tokens_per_sec, 2) if self.tokens_per_sec is not None else None,
+            "circuit": self.circuit_state(now),
+            "circuit_retry_in": round(self.circuit_open_until - now, 1) if self.circuit_open_until > now else None,
+        }
+
+
+class CircuitOpenError(Exception):
+    """모든 백엔드의 서킷이 열려 있어 요청을 보낼 수 없음 (retry_after: 가장 먼저 시험 요청이 가능해지기까지 남은 초)"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"모든 LLM 백엔드의 서킷이 열려 있습니다. {retry_after:.0f}초 후 다시 시도해주세요.")
+        self.retry_after = retry_after
+
+
+def base_url(url: str) -> str:
+    """전체 API URL에서 알려진 API 경로만 떼어 낸 기본 URL (예: http://gateway/llm/v1/chat/completions -> http://gateway/llm)"""
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/")
+    for suffix in API_PATH_SUFFIXES:
+        if path.endswith(suffix):
+            path = path[: -len(suffix)]
+            break
+    return f"{parts.scheme}://{parts.netloc}{path}"
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """서킷 브레이커에 반영할 실패인지 (연결 오류, 타임아웃, 5xx 응답만 해당)"""
+    if isinstance(error, (httpx.TransportError, requests.ConnectionError, requests.Timeout, asyncio.TimeoutError)):
+        return True
+    response = getattr(error, "response", None) # httpx.HTTPStatusError, requests.HTTPError
+    status_code = getattr(response, "status_code", None)
+    return status_code is not None and status_code >= 500
+
+
+class BackendRegistry:
+    def __init__(self, backends: List[Backend], strategy: str = LLM_ROUTING_STRATEGY):
+        if not backends:
+            raise ValueError("백엔드가 하나 이상 필요합니다.")
+        self.backends = backends
+        self.strategy = strategy
+        # 동기 엔드포인트(스레드풀)와 비동기 엔드포인트가 함께 카운터를 갱신하므로 잠금 사용
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_url: str, default_kind: str = "openai", default_model: Optional[str] = None) -> "BackendRegistry":
+        raw = os.getenv("LLM_BACKENDS")
+        if not raw and os.getenv("LLM_BACKENDS_FILE"):
+            with open(os.getenv("LLM_BACKENDS_FILE"), encoding="utf-8") as f:
+                raw = f.read()
+        if raw:
+            backends = []
+            for i, entry in enumerate(json.loads(raw)):
+                backends.append(Backend(
+                    name=entry.get("name", f"backend-{i}"),
+                    url=base_url(entry["url"]),
+                    kind=entry.get("kind", "openai"),
+                    model=entry.get("model"),
+                    weight=float(entry.get("weight", 1.0)),
+                    max_concurrency=int(entry.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+                    cache_hints=bool(entry.get("cache_hints", LLM_CACHE_HINTS)),
+                ))
+        else:
+            backends = [Backend(name="default", url=base_url(default_url), kind=default_kind, model=default_model)]
+        return cls(backends)
+
+    def candidates(self) -> List[Backend]:
+        now = time.monotonic()
+        # 서킷이 열린 백엔드는 제외하고, half-open 백엔드는 처리 중인 요청이 없을 때만 시험 요청 하나를 받음
+        allowed = [
+            b for b in self.backends
+            if b.circuit_state(now) == "closed" or (b.circuit_state(now) == "half_open" and b.outstanding == 0)
+        ]
+        if not allowed:
+            retry_after = min(max(b.circuit_open_until - now, 0.0) for b in self.backends)
+            raise CircuitOpenError(retry_after)
+        healthy = [b for b in allowed if b.healthy and b.weight > 0]
+        # 모두 비정상으로 표시된 경우에도 요청은 보내봄 (헬스 체크 정보가 오래되었을 수 있음)
+        return healthy or allowed
+
+    def _choose(self, backends: List[Backend]) -> Backend:
+        if self.strategy == "tokens_per_sec":
+            # 아직 처리량을 관측하지 못한 백엔드를 먼저 사용해 측정값을 확보
+            unmeasured = [b for b in backends if b.tokens_per_sec is None]
+            if unmeasured:
+                return min(unmeasured, key=lambda b: (b.outstanding + 1) / b.weight)
+            return max(backends, key=lambda b: b.tokens_per_sec * b.weight / (b.outstanding + 1))
+        return min(backends, key=lambda b: (b.outstanding + 1) / b.weight)
+
+    def pick(self) -> Backend:
+        """라우팅 전략에 따라 요청을 보낼 백엔드 선택 (모든 서킷이 열려 있으면 CircuitOpenError)"""
+        with self._lock:
+            return self._choose(self.candidates())
+
+    def pick_alternative(self, exclude: str) -> Optional[Backend]:
+        """헤지 요청용으로 exclude가 아닌, 동시 처리 한도에 여유가 있는 백엔드 선택 (없으면 None)"""
+        with self._lock:
+            try:
+                backends = self.candidates()
+            except CircuitOpenError:
+                return None
+            backends = [b for b in backends if b.name != exclude and b.outstanding < b.max_concurrency]
+            return self._choose(backends) if backends else None
+
+    @contextmanager
+    def track(self, backend: Backend):
+        """요청 하나를 처리하는 동안 outstanding 카운트를 유지하고 성공/실패를 기록"""
+        with self._lock:
+            backend.outstanding += 1
+        try:
+            yield backend
+        except GeneratorExit:
+            # 호출자가 스트림을 일찍 닫은 경우: 백엔드는 정상적으로 응답하고 있었으므로 성공으로 기록
+            self._record_success(backend)
+            raise
+        except Exception as e:
+            if not is_backend_failure(e):
+                # 잘못된 요청(4xx)이나 응답 처리 중 오류는 백엔드 상태와 무관하므로 연속 실패 횟수를 바꾸지 않음
+                raise
+            with self._lock:
+                backend.failed += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= LLM_MAX_CONSECUTIVE_FAILURES:
+                    backend.healthy = False
+                    backend.circuit_open_until = time.monotonic() + LLM_CIRCUIT_OPEN_SECONDS
+            raise
+        else:
+            self._record_success(backend)
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def _record_success(self, backend: Backend) -> None:
+        with self._lock:
+            backend.completed += 1
+            backend.consecutive_failures = 0
+            backend.circuit_open_until = 0.0
+
+    async def check_health(self, client: httpx.AsyncClient) -> None:
+        async def check(backend: Backend) -> None:
+            try:
+                response = await client.get(backend.endpoint(HEALTH_PATHS[backend.kind]), timeout=5.0)
+                # 인증 실패(401)나 경로 오류(404)도 요청을 처리할 수 없는 상태이므로 2xx만 정상으로 봄
+                ok = response.is_success
+            except httpx.HTTPError:
+                ok = False
+            with self._lock:
+                backend.healthy = ok
+                if ok:
+                    backend.consecutive_failures = 0
+
+        await asyncio.gather(*(check(b) for b in self.backends))
+
+    async def health_check_loop(self, client: httpx.AsyncClient, interval: float = LLM_HEALTH_CHECK_INTERVAL) -> None:
+        """앱 lifespan 동안 백그라운드에서 주기적으로 헬스 체크"""
+        while True:
+            await self.check_health(client)
+            await asyncio.sleep(interval)
+
+    def snapshot(self) -> Dict:
+        return {"strategy": self.strategy, "backends": [b.snapshot() for b in self.backends]}
+
+
+def build_chat_payload(
+    backend: Backend,
+    model: str,
+    messages: List[Dict],
+    max_tokens: int,
+    stream: bool = False,
+    response_schema: Optional[Dict] = None,
+    **sampling,
+) -> Dict:
+    """백엔드 종류에 맞는 채팅 요청 본문 생성 (sampling: temperature, top_p 등, response_schema: 구조화 출력용 JSON 스키마)"""
+    if backend.kind == "ollama":
+        payload = {
+            "model": backend.model or model,
+            "messages": messages,
+            "stream": stream,
+            "options": {"num_predict": max_tokens, **sampling},
+        }
+        if backend.cache_hints:
+            payload["keep_alive"] = LLM_OLLAMA_KEEP_ALIVE # 요청 사이에 모델이 내려가면 KV 캐시도 사라짐
+        if response_schema is not None:
+            payload["format"] = response_schema
+        return payload
+    payload = {
+        "model": backend.model or model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "stream": stream,
+        **sampling,
+    }
+    if backend.cache_hints:
+        payload["cache_prompt"] = True # llama.cpp 서버: 이전 요청과 같은 접두사의 KV 캐시 재사용
+    if response_schema is not None:
+        payload["response_format"] = json_schema_format(response_schema)
+    return payload
+
+
+def json_schema_format(schema: Dict, name: str = "response") -> Dict:
+    """OpenAI 호환 서버의 response_format 값 (strict: 스키마 밖의 토큰은 생성하지 않음)"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def extract_chat_result(backend: Backend, completion: Dict) -> Tuple[str, int]:
+    """비스트리밍 응답에서 (생성 텍스트, 완료 토큰 수) 추출"""
+    if backend.kind == "ollama":
+        return completion["message"]["content"], completion.get("eval_count", 0)
+    usage = completion.get("usage") or {}
+    return completion["choices"][0]["message"]["content"], usage.get("completion_tokens", 0)
+
+
+def extract_stream_delta(backend: Backend, event: Dict) -> Optional[str]:
+    """스트리밍 이벤트(JSON) 하나에서 새로 생성된 텍스트 조각 추출"""
+    if backend.kind == "ollama":
+        return (event.get("message") or {}).get("content")
+    if event.get("choices"):
+        return event["choices"][0].get("delta", {}).get("content")
+    return None
@@ -0,0 +1,130 @@
+"""
+LLM 생성 결과 캐시 (메모리 LRU + 디스크 저장소)
+
+같은 프롬프트와 샘플링 파라미터로 요청하면 LLM을 다시 호출하지 않고 저장된 결과를 돌려줍니다.
+키는 정규화한 프롬프트(메시지)와 모델, 샘플링 파라미터의 SHA-256 해시입니다.
+
+환경 변수:
+    LLM_CACHE_ENABLED       캐시 사용 여부 (기본값: true)
+    LLM_CACHE_DIR           디스크 저장 경로 (기본값: llm_cache)
+    LLM_CACHE_MAX_BYTES     디스크 저장소 최대 크기, 초과하면 오래된 항목부터 삭제 (기본값: 200MB)
+    LLM_CACHE_MEMORY_ITEMS  메모리 LRU에 보관할 항목 수 (기본값: 256)
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+
+
+def normalize_text(text: str) -> str:
+    """줄마다 앞뒤 공백을 제거하고 빈 줄을 없애 들여쓰기 차이로 키가 달라지지 않게 함"""
+    return "\n".join(line.strip() for line in text.strip().splitlines() if line.strip())
+
+
+def make_cache_key(model: str, messages: List[Dict], **params) -> str:
+    """모델, 메시지, 샘플링 파라미터로 캐시 키 생성"""
+    normalized = {
+        "model": model,
+        "messages": [{"role": m["role"], "content": normalize_text(m["content"])} for m in messages],
+        "params": params,
+    }
+    raw = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        directory: str = LLM_CACHE_DIR,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+        enabled: bool = LLM_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._disk_bytes = 0
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.directory.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key]
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    value = json.load(f)["response"]
+            except (OSError, ValueError, KeyError):
+                self.stats["misses"] += 1
+                return None
+            os.utime(path) # 최근 사용 시각 갱신 (디스크 eviction 순서에 반영)
+            self._remember(key, value)
+            self.stats["disk_hits"] += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remember(key, value)
+            path = self._path(key)
+            data = json.dumps({"response": value}, ensure_ascii=False).encode("utf-8")
+            previous_size = path.stat().st_size if path.exists() else 0
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(data) - previous_size
+            self.stats["stores"] += 1
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """디스크 저장소가 max_bytes 이하가 될 때까지 가장 오래 사용하지 않은 항목부터 삭제"""
+        entries = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in entries:
+            if self._disk_bytes <= self.max_bytes:
+                break
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            self._memory.pop(path.stem, None)
+            self._disk_bytes -= size
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            "enabled": self.enabled,
+            **self.stats,
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_bytes,
+        }
@@ -0,0 +1,88 @@
+"""
+LLM 호출 재시도 정책 (시도별 타임아웃 + 지터를 준 지수 백오프)
+
+연결 실패, 타임아웃, 과부하 응답(429, 5xx)처럼 일시적인 오류만 재시도하고,
+요청 자체가 잘못된 경우(4xx 등)나 응답 파싱 오류는 바로 실패시킵니다.
+재시도 대기 시간은 "full jitter" 방식으로 0 ~ min(max_delay, base_delay * 2^attempt) 사이에서 무작위로 정해
+여러 요청이 동시에 실패해도 같은 순간에 다시 몰리지 않게 합니다.
+
+환경 변수:
+    LLM_RETRY_MAX_ATTEMPTS   첫 시도를 포함한 최대 시도 횟수 (기본값: 3)
+    LLM_RETRY_BASE_DELAY     백오프 기본 대기 시간(초) (기본값: 0.5)
+    LLM_RETRY_MAX_DELAY      백오프 최대 대기 시간(초) (기본값: 8)
+    LLM_ATTEMPT_TIMEOUT      시도 하나의 응답 대기 시간(초). 스트리밍에서는 청크 사이 최대 대기 시간 (기본값: 300)
+    LLM_CONNECT_TIMEOUT      연결 수립 타임아웃(초) (기본값: 10)
+"""
+import asyncio
+import os
+import random
+from typing import Dict, Optional
+
+import httpx
+
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "300"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+# 재시도할 HTTP 상태 코드 (요청 시간 초과, 과부하, 게이트웨이/서버 일시 오류)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient(exc: BaseException) -> bool:
+    """다시 시도하면 성공할 수 있는 오류인지 판단"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    # 연결 실패, 읽기/쓰기 오류, 타임아웃, 서버가 연결을 끊은 경우 등
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = LLM_RETRY_MAX_ATTEMPTS,
+        base_delay: float = LLM_RETRY_BASE_DELAY,
+        max_delay: float = LLM_RETRY_MAX_DELAY,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        rng: Optional[random.Random] = None,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.connect_timeout = connect_timeout
+        # 백오프 지터 전용 RNG (요청 seed로 만든 RNG와 섞이지 않도록 분리)
+        self._rng = rng or random.Random()
+        self.stats = {"attempts": 0, "retries": 0, "exhausted": 0, "circuit_open": 0}
+
+    def timeout(self) -> httpx.Timeout:
+        """시도 하나에 적용할 httpx 타임아웃 (읽기 타임아웃은 바이트/청크 사이 대기 시간에 적용됨)"""
+        return httpx.Timeout(self.attempt_timeout, connect=min(self.connect_timeout, self.attempt_timeout))
+
+    def delay(self, attempt: int) -> float:
+        """attempt번째(0부터) 실패 뒤 기다릴 시간 (full jitter)"""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def should_retry(self, exc: BaseException, attempt: int) -> bool:
+        """attempt번째(0부터) 시도가 exc로 실패했을 때 다시 시도할지 결정하고 통계에 반영"""
+        if not is_transient(exc):
+            return False
+        if attempt + 1 >= self.max_attempts:
+            self.stats["exhausted"] += 1
+            return False
+        self.stats["retries"] += 1
+        return True
+
+    async def backoff(self, attempt: int) -> None:
+        await asyncio.sleep(self.delay(attempt))
+
+    def snapshot(self) -> Dict:
+        return {
+            "max_attempts": self.max_attempts,
+            "base_delay": self.base_delay,
+            "max_delay": self.max_delay,
+            "attempt_timeout": self.attempt_timeout,
+            **self.stats,
+        }
@@ -0,0 +1,258 @@
+"""
+Prometheus 텍스트 형식으로 내보내는 간단한 메트릭 (카운터, 게이지, 히스토그램)
+
+prometheus_client 없이 /metrics 엔드포인트에서 render() 결과를 그대로 돌려주면
+Prometheus가 수집할 수 있습니다. 두 앱(project/main5.py, streamlit/main.py)이 같은 이름을 쓰도록
+공통 메트릭을 이 모듈에 정의합니다.
+
+- http_requests_total / http_request_duration_seconds: 엔드포인트(라우트 경로)별 요청 수와 지연 (MetricsMiddleware)
+- llm_*: 백엔드/모델별 첫 토큰까지 시간, 전체 생성 시간, 완료 토큰 수와 토큰/초, 진행 중인 생성 수
+- conversation_utterances_*: 파싱된 발화 수와 프롬프트에서 기대한 발화 수 (파싱 수율)
+- conversation_parse_errors_total: 형식 오류 등으로 버리거나 보정한 줄 수 (이유별)
+- admission_rejections_total: 수락 제어(admission.py)가 거절한 요청 수
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 기본 히스토그램 구간
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKENS_PER_SEC_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+YIELD_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0, 1.1, 1.25, 1.5, 2.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: 레이블 {self.labelnames}이(가) 필요합니다 (받은 값: {tuple(labels)}).")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LLM_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], List[float]] = {} # 구간별 개수 + [합계]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * len(self.buckets) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LLM_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS_TOTAL = registry.counter(
+    "http_requests_total", "엔드포인트별 HTTP 요청 수", ("method", "path", "status")
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "엔드포인트별 요청 처리 시간 (스트리밍 응답은 마지막 청크까지)", ("method", "path"), HTTP_LATENCY_BUCKETS
+)
+LLM_REQUESTS_TOTAL = registry.counter(
+    "llm_requests_total", "백엔드로 보낸 LLM 요청 수 (outcome: success, error, cancelled)", ("backend", "model", "outcome")
+)
+LLM_TIME_TO_FIRST_TOKEN = registry.histogram(
+    "llm_time_to_first_token_seconds", "스트리밍 생성에서 첫 토큰을 받기까지 걸린 시간", ("backend", "model")
+)
+LLM_GENERATION_SECONDS = registry.histogram(
+    "llm_generation_seconds", "LLM 생성 전체 시간", ("backend", "model")
+)
+LLM_COMPLETION_TOKENS = registry.counter(
+    "llm_completion_tokens_total", "생성된 완료 토큰 수 (스트리밍은 델타 수로 근사)", ("backend", "model")
+)
+LLM_TOKENS_PER_SECOND = registry.histogram(
+    "llm_tokens_per_second", "생성 하나의 완료 토큰/초", ("backend", "model"), TOKENS_PER_SEC_BUCKETS
+)
+LLM_IN_FLIGHT = registry.gauge(
+    "llm_generations_in_flight", "백엔드에서 진행 중인 LLM 생성 수", ("backend",)
+)
+UTTERANCES_PARSED = registry.counter(
+    "conversation_utterances_parsed_total", "LLM 응답에서 형식에 맞게 파싱된 발화 수", ()
+)
+UTTERANCES_EXPECTED = registry.counter(
+    "conversation_utterances_expected_total", "프롬프트에서 요청한 발화 수", ()
+)
+PARSE_YIELD = registry.histogram(
+    "conversation_parse_yield_ratio", "대화 하나의 파싱된 발화 수 / 기대 발화 수", (), YIELD_BUCKETS
+)
+PARSE_ERRORS_TOTAL = registry.counter(
+    "conversation_parse_errors_total", "LLM 응답에서 버리거나 보정한 줄/감정 수 (utterance_parser.py)", ("reason",)
+)
+ADMISSION_REJECTIONS_TOTAL = registry.counter(
+    "admission_rejections_total", "수락 한도를 넘어 429로 거절한 생성 요청 수", ("reason",)
+)
+
+
+def observe_generation(backend: str, model: str, seconds: float, completion_tokens: int) -> None:
+    """완료된 LLM 생성 하나의 시간과 토큰 처리량 기록"""
+    LLM_REQUESTS_TOTAL.inc(backend=backend, model=model, outcome="success")
+    LLM_GENERATION_SECONDS.observe(seconds, backend=backend, model=model)
+    if completion_tokens > 0:
+        LLM_COMPLETION_TOKENS.inc(completion_tokens, backend=backend, model=model)
+        if seconds > 0:
+            LLM_TOKENS_PER_SECOND.observe(completion_tokens / seconds, backend=backend, model=model)
+
+
+@contextmanager
+def track_generation(backend: str, model: str):
+    """생성 하나가 진행되는 동안 in-flight 게이지를 유지하고 실패/취소를 기록 (성공은 observe_generation으로 기록)"""
+    LLM_IN_FLIGHT.inc(backend=backend)
+    try:
+        yield
+    except GeneratorExit:
+        raise # 호출자가 스트림을 일찍 닫은 경우: 결과 기록은 스트림 쪽에서 처리
+    except asyncio.CancelledError:
+        LLM_REQUESTS_TOTAL.inc(backend=backend, model=model, outcome="cancelled")
+        raise
+    except Exception:
+        LLM_REQUESTS_TOTAL.inc(backend=backend, model=model, outcome="error")
+        raise
+    finally:
+        LLM_IN_FLIGHT.dec(backend=backend)
+
+
+def observe_parse_yield(parsed: int, expected: int) -> None:
+    """대화 하나의 파싱 수율 기록"""
+    UTTERANCES_PARSED.inc(parsed)
+    UTTERANCES_EXPECTED.inc(expected)
+    if expected > 0:
+        PARSE_YIELD.observe(parsed / expected)
+
+
+class MetricsMiddleware:
+    """엔드포인트별 요청 수와 처리 시간을 기록하는 ASGI 미들웨어 (경로는 라우트 템플릿 기준)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 매칭된 라우트가 없으면(404 등) 경로별로 늘어나지 않도록 하나로 묶음
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS_TOTAL.inc(method=scope["method"], path=path, status=str(status["code"]))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=scope["method"], path=path)
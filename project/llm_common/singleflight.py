@@ -0,0 +1,103 @@
+"""
+동일한 생성 요청 병합 (single-flight)
+
+같은 키의 요청이 이미 처리 중이면 새로 LLM을 호출하지 않고 진행 중인 작업의 결과를 함께 받습니다.
+- SingleFlight: 코루틴 하나의 결과(값 또는 예외)를 공유
+- StreamFlight: 비동기 스트림의 청크를 모든 구독자에게 같은 순서로 전달 (늦게 합류한 구독자는 지난 청크부터 재생)
+생성 작업은 구독자와 별도의 태스크로 실행되므로, 먼저 요청한 클라이언트가 연결을 끊어도 다른 구독자는 계속 받습니다.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        # shield: 대기 중인 요청 하나가 취소되어도 공유 작업은 계속 진행
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        """같은 키의 작업이 진행 중이라 새 요청이 합류하게 되는지 여부"""
+        return key in self._inflight
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "in_flight": len(self._inflight)}
+
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+
+class StreamFlight:
+    def __init__(self):
+        self._inflight: Dict[str, _Broadcast] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def _pump(self, key: str, broadcast: _Broadcast, source: AsyncIterator[Any]) -> None:
+        try:
+            async for chunk in source:
+                async with broadcast.changed:
+                    broadcast.chunks.append(chunk)
+                    broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            self._inflight.pop(key, None)
+            self._tasks.pop(key, None)
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
+
+    def subscribe(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """같은 키의 스트림에 합류하거나 새로 시작하고, 청크를 받을 비동기 반복자를 반환
+
+        등록은 반환하기 전에 바로 끝나므로(SingleFlight.do처럼 await 없이), 직후의 in_flight 검사에서 이 스트림이 보입니다.
+        새로 시작한 스트림은 구독자가 읽기 시작하기 전에도 별도 태스크에서 끝까지 읽히므로 factory의 finally는 항상 실행됩니다.
+        """
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._inflight[key] = broadcast
+            self._tasks[key] = asyncio.ensure_future(self._pump(key, broadcast, factory()))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        return self._replay(broadcast)
+
+    async def _replay(self, broadcast: _Broadcast) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            async with broadcast.changed:
+                await broadcast.changed.wait_for(lambda: position < len(broadcast.chunks) or broadcast.done)
+                pending = broadcast.chunks[position:]
+                finished = broadcast.done
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(broadcast.chunks):
+                break
+        if broadcast.error is not None:
+            raise broadcast.error
+
+    def in_flight(self, key: str) -> bool:
+        """같은 키의 작업이 진행 중이라 새 요청이 합류하게 되는지 여부"""
+        return key in self._inflight
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "in_flight": len(self._inflight)}
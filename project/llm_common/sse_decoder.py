@@ -0,0 +1,92 @@
+"""
+LLM 스트리밍 응답용 증분 디코더 (SSE / NDJSON)
+
+TCP 청크 경계는 줄이나 UTF-8 멀티바이트 문자(한글 등)의 중간에 올 수 있으므로
+청크를 바이트 그대로 버퍼에 쌓고, 줄바꿈(\n)이 도착한 완성된 줄만 디코딩합니다.
+UTF-8에서 0x0A 바이트는 멀티바이트 문자 안에 나타나지 않으므로 완성된 줄은 항상 온전히 디코딩됩니다.
+
+- mode="sse": OpenAI 호환 서버(LM Studio 등)의 `data: {...}` 이벤트. 빈 줄에서 이벤트를 마무리합니다.
+- mode="ndjson": Ollama처럼 한 줄에 JSON 객체 하나씩 보내는 스트림
+"""
+import json
+from typing import Any, Dict, List
+
+DONE_MARKER = "[DONE]"
+
+
+class StreamDecoder:
+    def __init__(self, mode: str = "sse"):
+        if mode not in ("sse", "ndjson"):
+            raise ValueError(f"지원하지 않는 스트림 형식입니다: {mode}")
+        self.mode = mode
+        self._buffer = bytearray()
+        self._data_lines: List[str] = [] # 현재 SSE 이벤트의 data 필드들
+        self.done = False
+        self.stats = {"bytes": 0, "lines": 0, "events": 0, "malformed_events": 0, "decode_errors": 0}
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """청크를 추가하고, 이번 청크로 완성된 JSON 이벤트 목록을 반환"""
+        self.stats["bytes"] += len(chunk)
+        self._buffer += chunk
+        events = []
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start)
+            if end < 0:
+                break
+            self._handle_line(self._buffer[start:end], events)
+            start = end + 1
+        if start:
+            # 처리한 줄만 한 번에 잘라내서 불필요한 복사를 줄임
+            del self._buffer[:start]
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """스트림이 끝났을 때 남은 줄과 마무리되지 않은 이벤트를 처리"""
+        events = []
+        if self._buffer:
+            self._handle_line(self._buffer, events)
+            self._buffer = bytearray()
+        self._dispatch(events)
+        return events
+
+    def _handle_line(self, raw: bytearray, events: List[Dict[str, Any]]) -> None:
+        self.stats["lines"] += 1
+        if raw.endswith(b"\r"):
+            raw = raw[:-1]
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            self.stats["decode_errors"] += 1
+            line = raw.decode("utf-8", errors="replace")
+
+        if self.mode == "ndjson":
+            if line.strip():
+                self._data_lines.append(line)
+                self._dispatch(events)
+            return
+
+        if not line:
+            self._dispatch(events) # 빈 줄 = SSE 이벤트 끝
+        elif line.startswith(":"):
+            return # SSE 주석 (keep-alive 등)
+        elif line.startswith("data:"):
+            value = line[5:]
+            self._data_lines.append(value[1:] if value.startswith(" ") else value)
+        # event:, id:, retry: 필드는 사용하지 않음
+
+    def _dispatch(self, events: List[Dict[str, Any]]) -> None:
+        if not self._data_lines:
+            return
+        data = "\n".join(self._data_lines)
+        self._data_lines = []
+        if data.strip() == DONE_MARKER:
+            self.done = True
+            return
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            self.stats["malformed_events"] += 1
+            return
+        self.stats["events"] += 1
+        events.append(event)
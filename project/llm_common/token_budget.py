@@ -0,0 +1,144 @@
+"""
+관측한 발화당 완료 토큰 수로 max_tokens를 정하는 적응형 토큰 예산
+
+(모델, 상황)별로 최근 생성의 "완료 토큰 수 / 파싱된 발화 수"를 기록하고,
+그 분포의 백분위수(기본 p90)에 여유율을 곱해 다음 요청의 max_tokens를 계산합니다.
+표본이 충분하지 않으면 기존의 고정 배수(fallback)를 그대로 사용합니다.
+상한(LLM_TOKEN_BUDGET_MAX)은 생성 단위(날짜) 하나당 값이라 여러 날짜를 한 번에 생성하면 날짜 수만큼 곱해 적용하고,
+fallback은 호출자가 정한 값을 그대로 돌려줍니다.
+
+상황은 사용자가 자유롭게 입력하는 값이므로 공백을 정리해 키로 쓰고,
+키 수가 LLM_TOKEN_BUDGET_MAX_KEYS를 넘으면 가장 오래 쓰지 않은 (모델, 상황)의 표본부터 버립니다.
+
+예산이 부족해 응답이 잘리면(finish_reason == "length") 호출자가 fallback 예산으로 한 번 다시 요청하고
+record_truncation()으로 횟수를 남깁니다.
+
+환경 변수:
+    LLM_TOKEN_BUDGET_PERCENTILE  사용할 백분위수 (기본값: 90)
+    LLM_TOKEN_BUDGET_HEADROOM    백분위수에 곱할 여유율 (기본값: 1.15)
+    LLM_TOKEN_BUDGET_MIN_SAMPLES 적응형 예산을 쓰기 시작할 최소 표본 수 (기본값: 5)
+    LLM_TOKEN_BUDGET_WINDOW      (모델, 상황)별로 보관할 최근 표본 수 (기본값: 200)
+    LLM_TOKEN_BUDGET_MAX         생성 단위(날짜) 하나당 적응형 max_tokens 상한 (기본값: 8192)
+    LLM_TOKEN_BUDGET_MAX_KEYS    표본을 보관할 (모델, 상황) 최대 개수 (기본값: 256)
+"""
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+LLM_TOKEN_BUDGET_PERCENTILE = float(os.getenv("LLM_TOKEN_BUDGET_PERCENTILE", "90"))
+LLM_TOKEN_BUDGET_HEADROOM = float(os.getenv("LLM_TOKEN_BUDGET_HEADROOM", "1.15"))
+LLM_TOKEN_BUDGET_MIN_SAMPLES = int(os.getenv("LLM_TOKEN_BUDGET_MIN_SAMPLES", "5"))
+LLM_TOKEN_BUDGET_WINDOW = int(os.getenv("LLM_TOKEN_BUDGET_WINDOW", "200"))
+LLM_TOKEN_BUDGET_MAX = int(os.getenv("LLM_TOKEN_BUDGET_MAX", "8192"))
+LLM_TOKEN_BUDGET_MAX_KEYS = int(os.getenv("LLM_TOKEN_BUDGET_MAX_KEYS", "256"))
+# 예산을 이 단위로 올림 (값이 조금씩 바뀔 때마다 캐시 키가 달라지지 않도록)
+BUDGET_ROUNDING = 256
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("값이 없습니다.")
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class TokenBudget:
+    def __init__(
+        self,
+        pct: float = LLM_TOKEN_BUDGET_PERCENTILE,
+        headroom: float = LLM_TOKEN_BUDGET_HEADROOM,
+        min_samples: int = LLM_TOKEN_BUDGET_MIN_SAMPLES,
+        window: int = LLM_TOKEN_BUDGET_WINDOW,
+        max_tokens: int = LLM_TOKEN_BUDGET_MAX,
+        max_keys: int = LLM_TOKEN_BUDGET_MAX_KEYS,
+    ):
+        self.pct = pct
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.window = window
+        self.max_tokens = max_tokens
+        self.max_keys = max_keys
+        # 최근에 쓴 키가 뒤로 가도록 유지 (LRU)
+        self._samples: "OrderedDict[Tuple[str, str], Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"evicted_keys": 0, "truncated": 0, "length_retries": 0}
+
+    def record(self, model: str, situation: str, completion_tokens: int, parsed_utterances: int) -> None:
+        """생성 한 번의 발화당 완료 토큰 수 기록 (토큰 수를 모르거나 파싱된 발화가 없으면 무시)"""
+        if completion_tokens <= 0 or parsed_utterances <= 0:
+            return
+        key = budget_key(model, situation)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+                while len(self._samples) > self.max_keys:
+                    self._samples.popitem(last=False)
+                    self.stats["evicted_keys"] += 1
+            else:
+                self._samples.move_to_end(key)
+            samples.append(completion_tokens / parsed_utterances)
+
+    def tokens_per_utterance(self, model: str, situation: str) -> Optional[float]:
+        key = budget_key(model, situation)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                return None
+            self._samples.move_to_end(key)
+            samples = list(samples)
+        if len(samples) < self.min_samples:
+            return None
+        return percentile(samples, self.pct)
+
+    def budget(self, model: str, situation: str, expected_utterances: int, fallback_tokens: int, units: int = 1) -> int:
+        """다음 생성에 쓸 max_tokens 계산 (표본이 부족하면 fallback_tokens를 상한 없이 그대로 사용)
+
+        units: 한 번의 호출로 생성하는 단위(날짜) 수. 상한은 max_tokens * units
+        """
+        per_utterance = self.tokens_per_utterance(model, situation)
+        if per_utterance is None:
+            return fallback_tokens
+        tokens = math.ceil(per_utterance * expected_utterances * self.headroom)
+        tokens = math.ceil(tokens / BUDGET_ROUNDING) * BUDGET_ROUNDING
+        return max(BUDGET_ROUNDING, min(tokens, self.max_tokens * units))
+
+    def record_truncation(self, retried: bool) -> None:
+        """예산이 부족해 응답이 잘린 횟수 기록 (retried: fallback 예산으로 다시 요청했는지)"""
+        with self._lock:
+            self.stats["truncated"] += 1
+            if retried:
+                self.stats["length_retries"] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            items = [(key, list(samples)) for key, samples in self._samples.items()]
+            counters = dict(self.stats)
+        stats = []
+        for (model, situation), samples in items:
+            stats.append({
+                "model": model,
+                "situation": situation,
+                "samples": len(samples),
+                "p50_tokens_per_utterance": round(percentile(samples, 50), 2),
+                f"p{self.pct:g}_tokens_per_utterance": round(percentile(samples, self.pct), 2),
+                "adaptive": len(samples) >= self.min_samples,
+            })
+        return {
+            "percentile": self.pct,
+            "headroom": self.headroom,
+            "min_samples": self.min_samples,
+            "max_tokens": self.max_tokens,
+            "max_keys": self.max_keys,
+            **counters,
+            "stats": stats,
+        }
+
+
+def budget_key(model: str, situation: str) -> Tuple[str, str]:
+    """표본을 모을 키 (상황 앞뒤 공백과 연속 공백 정리)"""
+    return model, " ".join(situation.split())
@@ -0,0 +1,164 @@
+"""
+LLM 응답의 '참여자: 내용 | 감정: 감정1, 감정2' 줄 파서
+
+미리 컴파일한 정규식 하나로 응답 전체를 한 번만 훑어 줄마다 화자/내용/감정 구간을 잘라냅니다.
+기존 구현(줄마다 split/strip/replace를 여러 번 하고 예외를 삼키던 방식)과 같은 결과를 내며,
+버린 줄과 보정한 줄은 예외 대신 이유별 카운터(stats, conversation_parse_errors_total)로 남깁니다.
+
+- 형식: 첫 ':' 앞이 화자, 그 뒤부터 첫 '|' 전까지가 내용, 다음 '|' 전까지가 감정 (세 번째 구간부터는 무시)
+- 화자가 '사용자' 또는 대화 상대 이름이 아니면 버림
+- 감정은 목록에 있는 것만 남기고(순서와 중복 유지), 하나도 없으면 rng로 임의 감정 하나를 넣음
+- 같은 감정 구간 문자열은 반복해서 나오므로 해석 결과를 캐시
+
+구조화 출력(JSON 스키마) 모드의 응답 {"utterances": [{"speaker", "content", "emotions"}, ...]}은 parse_json으로 읽습니다.
+화자/감정 처리와 카운터는 같고, 토큰 한도에 걸려 잘린 응답에서도 끝까지 닫힌 발화 객체는 살립니다.
+
+오류 이유:
+    malformed        형식에 맞지 않아 버린 줄 (빈 줄은 제외) 또는 필드가 맞지 않는 발화 객체
+    invalid_json     JSON으로 읽을 수 없어 그 뒤를 버린 응답 (주로 토큰 한도에 걸려 잘린 경우)
+    unknown_speaker  화자가 사용자/대화 상대가 아니라 버린 줄
+    unknown_emotion  목록에 없어 버린 감정 수
+    emotion_fallback 유효한 감정이 없어 임의 감정을 넣은 줄
+"""
+import json
+import random
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metrics import PARSE_ERRORS_TOTAL
+
+# 한 줄: (화자):(내용)|(감정)[|나머지] 또는 그 밖의 비어 있지 않은 줄(형식 오류)
+_LINE_PATTERN = re.compile(
+    r"^(?:([^:|\n]*):([^|\n]*)\|([^|\n]*)[^\n]*|([^\n]*\S[^\n]*))$",
+    re.MULTILINE,
+)
+_EMOTION_CACHE_SIZE = 1024
+ERROR_REASONS = ("malformed", "invalid_json", "unknown_speaker", "unknown_emotion", "emotion_fallback")
+_json_decoder = json.JSONDecoder()
+
+
+class UtteranceParser:
+    def __init__(self, emotions: Iterable[str], user_speaker: str = "사용자"):
+        self.emotions = list(emotions)
+        self._emotion_set = frozenset(self.emotions)
+        self.user_speaker = user_speaker
+        self._emotion_cache: Dict[str, Tuple[Tuple[str, ...], int]] = {}
+        self.stats = {"lines": 0, "parsed": 0, **{reason: 0 for reason in ERROR_REASONS}}
+
+    def _parse_emotions(self, segment: str) -> Tuple[Tuple[str, ...], int]:
+        """감정 구간 -> (목록에 있는 감정들, 버린 감정 수)"""
+        cached = self._emotion_cache.get(segment)
+        if cached is None:
+            tokens = [token.strip() for token in segment.replace("감정:", "").split(",")]
+            valid = tuple(token for token in tokens if token in self._emotion_set)
+            unknown = sum(1 for token in tokens if token and token not in self._emotion_set)
+            if len(self._emotion_cache) >= _EMOTION_CACHE_SIZE:
+                self._emotion_cache.clear()
+            cached = self._emotion_cache[segment] = (valid, unknown)
+        return cached
+
+    def parse(self, raw_text: str, person_name: str, rng: Optional[random.Random] = None) -> List[Dict]:
+        """응답 텍스트에서 형식에 맞는 발화만 추출 (개수 조절 없음)"""
+        rng = rng or random
+        speakers = (self.user_speaker, person_name)
+        cached_emotions = self._emotion_cache.get
+        utterances: List[Dict] = []
+        append = utterances.append
+        # 긴 응답에서는 줄마다 드는 비용이 대부분이라 카운터는 지역 변수로 세고 끝에 한 번만 반영
+        lines = malformed = unknown_speaker = unknown_emotion = emotion_fallback = 0
+        for speaker, content, emotion_segment, other in _LINE_PATTERN.findall(raw_text):
+            lines += 1
+            if other:
+                malformed += 1
+                continue
+            speaker = speaker.strip()
+            if speaker not in speakers:
+                unknown_speaker += 1
+                continue
+            emotions, unknown = cached_emotions(emotion_segment) or self._parse_emotions(emotion_segment)
+            unknown_emotion += unknown
+            if not emotions:
+                emotion_fallback += 1
+                emotions = (rng.choice(self.emotions),)
+            append({"speaker": speaker, "content": content.strip(), "emotions": list(emotions)})
+        self._record(lines, len(utterances), {
+            "malformed": malformed,
+            "unknown_speaker": unknown_speaker,
+            "unknown_emotion": unknown_emotion,
+            "emotion_fallback": emotion_fallback,
+        })
+        return utterances
+
+    def parse_json(self, raw_text: str, person_name: str, rng: Optional[random.Random] = None) -> List[Dict]:
+        """구조화 출력 응답에서 발화 추출 (개수 조절 없음)"""
+        rng = rng or random
+        speakers = (self.user_speaker, person_name)
+        counts = dict.fromkeys(ERROR_REASONS, 0)
+        items, complete = _json_items(raw_text)
+        if not complete:
+            counts["invalid_json"] += 1
+        utterances = []
+        for item in items:
+            if not (
+                isinstance(item, dict)
+                and isinstance(item.get("speaker"), str)
+                and isinstance(item.get("content"), str)
+                and isinstance(item.get("emotions"), list)
+            ):
+                counts["malformed"] += 1
+                continue
+            speaker = item["speaker"].strip()
+            if speaker not in speakers:
+                counts["unknown_speaker"] += 1
+                continue
+            tokens = [emotion.strip() for emotion in item["emotions"] if isinstance(emotion, str)]
+            emotions = [emotion for emotion in tokens if emotion in self._emotion_set]
+            counts["unknown_emotion"] += len(item["emotions"]) - len(emotions)
+            if not emotions:
+                counts["emotion_fallback"] += 1
+                emotions = [rng.choice(self.emotions)]
+            utterances.append({"speaker": speaker, "content": item["content"].strip(), "emotions": emotions})
+        self._record(len(items), len(utterances), counts)
+        return utterances
+
+    def _record(self, lines: int, parsed: int, counts: Dict[str, int]) -> None:
+        self.stats["lines"] += lines
+        self.stats["parsed"] += parsed
+        for reason, count in counts.items():
+            if count:
+                self.stats[reason] += count
+                PARSE_ERRORS_TOTAL.inc(count, reason=reason)
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats)
+
+
+def _json_items(raw_text: str) -> Tuple[List, bool]:
+    """응답의 발화 배열 -> (끝까지 읽은 항목들, 응답 전체가 올바른 JSON인지)
+
+    응답이 잘렸으면 배열 앞에서부터 완전히 닫힌 항목만 돌려줍니다.
+    """
+    try:
+        document = json.loads(raw_text)
+    except ValueError:
+        pass
+    else:
+        items = document.get("utterances") if isinstance(document, dict) else document
+        return (items, True) if isinstance(items, list) else ([], False)
+
+    start = raw_text.find("[")
+    if start < 0:
+        return [], False
+    items = []
+    position = start + 1
+    while True:
+        while position < len(raw_text) and raw_text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(raw_text) or raw_text[position] == "]":
+            break
+        try:
+            item, position = _json_decoder.raw_decode(raw_text, position)
+        except ValueError:
+            break
+        items.append(item)
+    return items, False
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, HTTPException
 from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
 from typing import Optional
@@ -6,10 +6,37 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import random
 import json
+import math
 import uuid
-import requests
+import os
+import asyncio
+import time
+import httpx
+from contextlib import asynccontextmanager
+from llm_common.llm_backends import BackendRegistry, CircuitOpenError, build_chat_payload, extract_chat_result
 
-app = FastAPI()
+# Ollama 기본 엔드포인트 (LLM_BACKENDS 환경 변수로 여러 추론 서버를 지정할 수 있음)
+OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = "gemma2:9b"
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300")) # 응답 대기 시간(초), 다른 앱의 LLM 클라이언트와 같은 5분
+# 날짜 하나의 생성 토큰 상한 (/api/chat의 num_predict, OpenAI 호환 백엔드는 max_tokens). Ollama는 -1이면 상한 없음
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "4096"))
+
+llm_registry = BackendRegistry.from_env(OLLAMA_API_URL, default_kind="ollama", default_model=OLLAMA_MODEL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """LLM 호출용 공유 HTTP 클라이언트(keep-alive 커넥션 풀)를 만들고 백엔드 헬스 체크를 백그라운드로 실행
+    /generate-dummy/는 동기 엔드포인트(스레드 풀에서 실행)이므로 LLM 호출에는 동기 httpx.Client를 씁니다."""
+    app.state.llm_client = httpx.Client(timeout=OLLAMA_TIMEOUT)
+    health_client = httpx.AsyncClient()
+    health_task = asyncio.create_task(llm_registry.health_check_loop(health_client))
+    yield
+    health_task.cancel()
+    await health_client.aclose()
+    app.state.llm_client.close()
+
+app = FastAPI(lifespan=lifespan)
 
 BASE_DIR = Path(__file__).parent
 OUTPUT_FOLDER = BASE_DIR / "dummy_data"
@@ -60,21 +87,34 @@ def get_dialogue_from_llm(name, age, gender, situation, minutes, dialogue_count,
         "각 대화문은 1~2문장으로, 자연스럽고 현실적으로 만들어줘. "
         "각 대화문은 json 배열로 반환해줘. 예시: [\"대화1\", \"대화2\", ...]"
     )
-    response = requests.post(
-        "http://localhost:11434/api/generate",
-        json={
-            "model": "gemma2:9b",
-            "prompt": prompt,
-            "stream": False
-        }
-    )
-    result = response.json()
     try:
-        dialogues = json.loads(result["response"])
+        backend = llm_registry.pick()
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"LLM API 호출 오류: {e}", headers={"Retry-After": str(math.ceil(e.retry_after))})
+    # 서킷 브레이커가 실패를 기록하도록 track 블록 밖에서 HTTPException으로 바꿈
+    try:
+        with llm_registry.track(backend):
+            started = time.time()
+            response = app.state.llm_client.post(
+                backend.chat_url(),
+                json=build_chat_payload(backend, OLLAMA_MODEL, [{"role": "user", "content": prompt}], OLLAMA_NUM_PREDICT),
+            )
+            response.raise_for_status()
+            text, completion_tokens = extract_chat_result(backend, response.json())
+            backend.observe(completion_tokens, time.time() - started)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"LLM API 응답 오류: {e.response.status_code} - {e.response.text}")
+    except httpx.HTTPError as e:
+        # 연결 실패, 타임아웃 등
+        raise HTTPException(status_code=503, detail=f"LLM API 호출 오류: {e!r}. LLM 서버가 실행 중인지 확인해주세요 ({backend.url}).")
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=502, detail=f"LLM API 응답 형식 오류: {e!r}")
+    try:
+        dialogues = json.loads(text)
         if isinstance(dialogues, list):
             return dialogues
     except Exception:
-        return result["response"].split("\n")
+        return text.split("\n")
     return []
 
 @app.post("/generate-dummy/")
@@ -117,6 +157,10 @@ def generate_dummy(data: DummyRequest, background_tasks: BackgroundTasks):
         json.dump(result, f, ensure_ascii=False, indent=2)
     return {"filename": filename, "path": str(filepath)}
 
+@app.get("/backends/")
+def get_backends():
+    return llm_registry.snapshot()
+
 @app.get("/download/{filename}")
 def download_file(filename: str):
     filepath = OUTPUT_FOLDER / filename
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import requests
+import httpx
 import json
 import random
 from datetime import date, datetime, timedelta # datetime 임포트 추가
 from typing import List, Dict, Union
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """앱 시작 시 LM Studio용 공유 HTTP 클라이언트(keep-alive 커넥션 풀)를 만들고 종료 시 닫기"""
+    app.state.lm_client = httpx.AsyncClient(timeout=180.0) # LM Studio 요청 타임아웃 3분
+    yield
+    await app.state.lm_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # 요청 바디 정의
 class DialogueRequest(BaseModel):
@@ -61,7 +69,7 @@ async def generate_dialogues(request: DialogueRequest):
                 "stop": ["```", "```json"]
             }
             
-            lm_res = requests.post(api_url, headers=headers, json=body, timeout=180) 
+            lm_res = await app.state.lm_client.post(api_url, headers=headers, json=body)
             lm_res.raise_for_status() 
 
             lm_result = lm_res.json()
@@ -135,7 +143,7 @@ async def generate_dialogues(request: DialogueRequest):
 
         return {"status": "success", "message": "대화문이 성공적으로 생성되었습니다.", "data": dialogue_results}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail={
             "message": f"LM Studio API 요청 중 오류 발생: {e}",
             "error_details": str(e)
@@ -1,16 +1,50 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-import requests
+import httpx
 import json
+import os
 import random
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Union
+from typing import AsyncGenerator, List, Dict, Union, Optional, Tuple
+from contextlib import asynccontextmanager
+from json_stream import JsonArrayStreamParser
+from llm_common.llm_backends import base_url, json_schema_format
+from llm_common.sse_decoder import StreamDecoder
+from llm_common.token_budget import TokenBudget
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """앱 시작 시 LM Studio용 공유 HTTP 클라이언트(keep-alive 커넥션 풀)를 만들고 종료 시 닫기"""
+    app.state.lm_client = httpx.AsyncClient(timeout=300.0) # LM Studio 요청 타임아웃 5분
+    yield
+    await app.state.lm_client.aclose()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="AI 공감형 대화문 생성기 API (감정 포함)",
     description="LM Studio를 활용하여 사용자 설정에 맞는 감정 변화를 포함하는 공감형 대화문을 생성합니다."
 )
 
+# 관측한 발화당 완료 토큰 수로 max_tokens 결정 (표본이 부족하면 fallback_tokens 사용)
+token_budget = TokenBudget()
+# 표본이 부족할 때의 날짜당 max_tokens: 기존 4096을 최소값으로, 대화가 길면 발화당 토큰 수 추정치로 늘림
+# (대화목록 항목 하나가 시간/화자/텍스트/감정 키를 포함해 60토큰 안팎이므로 턴이 많은 날짜는 4096에서 잘림)
+FALLBACK_MIN_TOKENS = 4096
+FALLBACK_TOKENS_PER_UTTERANCE = 60
+# 로드한 모델의 컨텍스트 길이 (max_tokens는 여기서 프롬프트 몫을 뺀 값을 넘지 않음)
+LM_STUDIO_CONTEXT_TOKENS = int(os.getenv("LM_STUDIO_CONTEXT_TOKENS", "32768"))
+PROMPT_RESERVE_TOKENS = 2048 # 여러 날짜를 묶은 프롬프트도 이 안에 들어감
+
+def max_output_tokens() -> int:
+    """컨텍스트 길이에서 프롬프트 몫을 뺀 생성 토큰 상한"""
+    return max(FALLBACK_MIN_TOKENS, LM_STUDIO_CONTEXT_TOKENS - PROMPT_RESERVE_TOKENS)
+
+def fallback_tokens(plans: List[Dict]) -> int:
+    """적응형 예산을 쓸 수 없거나 응답이 잘렸을 때 쓰는 max_tokens (컨텍스트 길이를 넘지 않음)"""
+    tokens = sum(max(FALLBACK_MIN_TOKENS, plan["turns"] * 2 * FALLBACK_TOKENS_PER_UTTERANCE) for plan in plans)
+    return min(tokens, max_output_tokens())
+
 # 요청 바디 정의 (기존과 동일)
 class DialogueRequest(BaseModel):
     name: str = Field(..., example="Alice", description="대화할 사람의 이름")
@@ -20,6 +54,8 @@ class DialogueRequest(BaseModel):
     start_date: str = Field(..., example="2025-06-01", description="대화 리포트의 기준 시작 날짜 (YYYY-MM-DD 형식)")
     step_days: int = Field(..., ge=1, example=3, description="각 회차(날짜) 간의 간격 (일)")
     num_dialogues_per_step: int = Field(..., ge=1, example=4, description="생성할 회차(날짜)의 갯수")
+    seed: Optional[int] = Field(None, example=42, description="지정하면 같은 입력에 대해 항상 같은 프롬프트/시간/샘플링 시드를 사용 (재현 가능한 생성)")
+    batch_size: int = Field(1, ge=1, le=10, example=1, description="한 번의 LLM 호출로 함께 생성할 날짜 수 (짧은 대화에서 반복되는 지시문과 요청 오버헤드를 줄임)")
 
     class Config:
         json_schema_extra = {
@@ -36,173 +72,564 @@ class DialogueRequest(BaseModel):
             ]
         }
 
-@app.post("/generate_dialogues", response_model=Dict[str, Union[str, List[Dict[str, Union[str, List[Dict[str, Union[str, List[str]]]]]]]]])
+EMOTIONS = ["기쁨", "분노", "슬픔", "두려움", "놀람", "혐오"]
+LM_STUDIO_COMPLETIONS_URL = os.getenv("LM_STUDIO_COMPLETIONS_URL", "http://localhost:1234/v1/completions") # LM Studio 서버 URL 확인
+LM_STUDIO_MODEL = "eeve-korean-instruct-10.8b-v1.0" # 사용 중인 모델 이름 확인
+# 응답 형식: text(프롬프트 예시로만 JSON 형식 요청) 또는 json(response_format의 JSON 스키마로 생성 자체를 제한)
+LLM_OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "text")
+# json 모드는 채팅 API로 호출 (response_format은 /v1/chat/completions에서만 적용되고, /v1/completions에서는 무시되거나 거부됨)
+LM_STUDIO_CHAT_URL = os.getenv("LM_STUDIO_CHAT_URL", base_url(LM_STUDIO_COMPLETIONS_URL) + "/v1/chat/completions")
+# json 모드 응답의 최상위 객체에서 날짜 기록 배열을 담는 필드 (strict 스키마는 최상위가 객체여야 함)
+DATE_RECORDS_KEY = "날짜기록"
+
+# 여러 날짜 묶음 생성 통계 (묶음 호출 수, 묶음에서 바로 얻은 날짜 수, 단일 날짜 호출로 다시 생성한 날짜 수)
+batch_stats = {"batched_calls": 0, "batched_dates": 0, "fallback_dates": 0}
+
+def make_request_rng(seed: Optional[int], key: str) -> random.Random:
+    """seed가 주어지면 (seed, key)로 결정되는 독립 RNG를, 없으면 임의 시드 RNG를 반환"""
+    return random.Random(f"{seed}:{key}") if seed is not None else random.Random()
+
+def plan_dialogue_date(request: DialogueRequest, i: int) -> Dict:
+    """i번째 회차 날짜의 대화 길이, 턴 수, 시작 시각을 정함 (날짜별 RNG 사용)"""
+    current_date = date.fromisoformat(request.start_date) + timedelta(days=request.step_days * i)
+    current_date_str = current_date.strftime("%Y-%m-%d")
+    rng = make_request_rng(request.seed, current_date_str)
+    minutes = rng.uniform(5, 10)
+    # 챗봇-사용자 '쌍' 대화 턴 수. 각 턴은 2개의 발화로 구성.
+    dialogue_turns_count = rng.randint(int(minutes * 5), int(minutes * 5.5))
+    dialogue_start_time = datetime.combine(current_date, datetime.min.time()) + timedelta(hours=rng.randint(8, 10), minutes=rng.randint(0, 59))
+    # 프롬프트 예시의 챗봇 응답 시각과 백엔드 시드도 여기서 한 번만 뽑음 (재시도로 본문을 다시 만들어도 같은 값, 이후 RNG 사용 순서도 그대로)
+    example_reply_minutes = rng.randint(1, 2)
+    backend_seed = rng.randrange(2**31) if request.seed is not None else None
+    return {
+        "date": current_date,
+        "date_str": current_date_str,
+        "rng": rng,
+        "minutes": minutes,
+        "turns": dialogue_turns_count,
+        "start_time": dialogue_start_time,
+        "example_reply_minutes": example_reply_minutes,
+        "backend_seed": backend_seed,
+    }
+
+def example_records(plan: Dict) -> str:
+    """프롬프트에 넣는 날짜 기록 배열 예시 (첫 날짜 기준)"""
+    return (
+        f"[\n"
+        f"  {{\n"
+        f"    \"날짜\": \"{plan['date_str']}\",\n"
+        f"    \"대화목록\": [\n"
+        f"      {{\n"
+        f"        \"시간\": \"{plan['start_time'].strftime('%H:%M')}\",\n"
+        f"        \"화자\": \"사용자\",\n"
+        f"        \"텍스트\": \"오늘 학교에서 발표를 망쳐서 너무 슬프고 화가 나요.\",\n"
+        f"        \"감정\": [\"슬픔\", \"분노\"]\n"
+        f"      }},\n"
+        f"      {{\n"
+        f"        \"시간\": \"{(plan['start_time'] + timedelta(minutes=plan['example_reply_minutes'])).strftime('%H:%M')}\",\n"
+        f"        \"화자\": \"챗봇\",\n"
+        f"        \"텍스트\": \"정말 속상하고 힘들었겠어요. 어떤 부분이 가장 힘들었나요? 제가 공감해 드릴게요.\",\n"
+        f"        \"감정\": [\"슬픔\"]\n" # 챗봇의 감정도 EMOTIONS 안에서만 (json 모드 스키마의 enum과 같은 값)
+        f"      }}\n"
+        f"    ]\n"
+        f"  }}\n"
+        f"]"
+    )
+
+def build_dialogue_prompt(request: DialogueRequest, plans: List[Dict]) -> str:
+    """하나 이상의 날짜에 대한 대화 기록을 JSON 배열로 요청하는 프롬프트 생성"""
+    first = plans[0]
+    if len(plans) == 1:
+        date_instruction = (
+            f"오늘 날짜는 {first['date_str']} 입니다.\n"
+            f"{first['minutes']:.1f}분 동안 진행될 챗봇과 사용자의 공감형 대화문 {first['turns']}쌍(턴)을 생성해줘. "
+        )
+    else:
+        # 여러 날짜를 한 번에 요청: 날짜마다 길이와 턴 수를 따로 지정하고, 날짜마다 기록 객체 하나씩 받음
+        date_lines = "".join(
+            f"- {plan['date_str']}: {plan['minutes']:.1f}분 동안 진행될 대화 {plan['turns']}쌍(턴)\n" for plan in plans
+        )
+        date_instruction = (
+            f"다음 {len(plans)}개 날짜 각각에 대해 챗봇과 사용자의 공감형 대화문을 생성해줘. 날짜마다 서로 다른 대화여야 해.\n"
+            f"{date_lines}"
+            f"배열에는 위의 날짜마다 정확히 하나의 날짜 기록 객체가 날짜 순서대로 있어야 하고, '날짜' 값은 위에 적힌 날짜와 같아야 해. "
+        )
+
+    example = example_records(first)
+    if LLM_OUTPUT_MODE == "json":
+        # 스키마와 같은 모양: 날짜 기록 배열을 최상위 객체의 필드 하나에 담음
+        output_instruction = f"응답은 반드시 날짜 기록 배열을 '{DATE_RECORDS_KEY}' 필드에 담은 JSON 객체 하나로만 제공해야 해."
+        output_name = "JSON 객체"
+        example = f"{{\n  \"{DATE_RECORDS_KEY}\": " + example.replace("\n", "\n  ") + "\n}"
+    else:
+        output_instruction = "응답은 반드시 JSON 배열 형태로만 제공해야 해."
+        output_name = "JSON 배열"
+
+    # LM Studio API 프롬프트 생성 - JSON 형식 예시를 더욱 명확하고 요청하신 구조에 가깝게 제시
+    return (
+        f"당신은 사용자의 감정을 공감하고 지원하는 챗봇입니다. "
+        f"사용자는 '{request.name}'(나이: {request.age}세, 성별: {'남성' if request.gender == 'male' else '여성'})이며, 현재 '{request.situation}' 상황에 있습니다. "
+        f"{date_instruction}"
+        "각 대화는 1~2문장으로 자연스럽고 현실적으로 만들어줘. "
+        "대화는 사용자의 감정을 이해하고 긍정적인 방향으로 이끌어가는 데 초점을 맞춰야 해. "
+        f"대화가 진행됨에 따라 사용자와 챗봇의 감정이 자연스럽게 변화하는 모습을 보여줘. "
+        f"생성된 대화에 나타나는 감정은 '{', '.join(EMOTIONS)}' 중 하나 또는 여러 개가 될 수 있어. "
+        f"{output_instruction} 배열의 각 요소는 하나의 날짜에 대한 대화 기록 객체여야 해. "
+        "각 날짜 기록 객체는 '날짜' 필드와 '대화목록' 배열을 포함해야 해. "
+        "각 대화목록 요소는 '시간', '화자', '텍스트', '감정' 필드를 포함해야 해. '감정'은 해당 대화 텍스트에서 느껴지는 주요 감정들을 담은 배열이야.\n"
+        f"다른 설명이나 추가적인 문장 없이 {output_name}만 출력해야 해. 다음 예시 형식을 정확히 따라야 해.\n"
+        f"예시:\n"
+        f"{example}"
+    )
+
+def dialogue_records_schema(plans: List[Dict]) -> Dict:
+    """json 모드 응답 스키마 (요청한 날짜마다 기록 객체 하나, 화자와 감정은 허용된 값만)
+    strict 모드는 최상위가 객체여야 하므로 날짜 기록 배열을 DATE_RECORDS_KEY 필드에 담습니다."""
+    records = {
+        "type": "array",
+        "minItems": len(plans),
+        "maxItems": len(plans),
+        "items": {
+            "type": "object",
+            "properties": {
+                "날짜": {"type": "string", "enum": [plan["date_str"] for plan in plans]},
+                "대화목록": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "시간": {"type": "string"},
+                            "화자": {"type": "string", "enum": ["사용자", "챗봇"]},
+                            "텍스트": {"type": "string", "minLength": 1},
+                            "감정": {"type": "array", "items": {"type": "string", "enum": EMOTIONS}, "minItems": 1, "maxItems": 3},
+                        },
+                        "required": ["시간", "화자", "텍스트", "감정"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["날짜", "대화목록"],
+            "additionalProperties": False,
+        },
+    }
+    return {
+        "type": "object",
+        "properties": {DATE_RECORDS_KEY: records},
+        "required": [DATE_RECORDS_KEY],
+        "additionalProperties": False,
+    }
+
+def completion_url() -> str:
+    """요청을 보낼 LM Studio API URL (json 모드는 채팅 API, text 모드는 completions API)"""
+    return LM_STUDIO_CHAT_URL if LLM_OUTPUT_MODE == "json" else LM_STUDIO_COMPLETIONS_URL
+
+def build_completion_body(request: DialogueRequest, plans: List[Dict], max_tokens: int) -> Dict:
+    """LM Studio API 요청 본문 생성 (json 모드는 채팅 API 형식에 response_format 스키마 포함)"""
+    prompt = build_dialogue_prompt(request, plans)
+    body = {
+        "model": LM_STUDIO_MODEL,
+        "max_tokens": max_tokens,
+        "temperature": 0.7,
+        "stop": ["```", "```json"] # JSON 응답 외 다른 출력 방지
+    }
+    if LLM_OUTPUT_MODE == "json":
+        body["messages"] = [{"role": "user", "content": prompt}]
+        body["response_format"] = json_schema_format(dialogue_records_schema(plans), "dialogue_records")
+    else:
+        body["prompt"] = prompt
+    if plans[0]["backend_seed"] is not None:
+        body["seed"] = plans[0]["backend_seed"] # 백엔드 샘플링 시드
+    return body
+
+def check_lm_response(lm_res: httpx.Response) -> None:
+    """LM Studio 응답이 HTTP 오류면 HTTPException 500 (오류 본문을 error_details에 포함)"""
+    try:
+        lm_res.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        try:
+            error_detail = lm_res.json()
+        except json.JSONDecodeError:
+            error_detail = lm_res.text
+        raise HTTPException(status_code=500, detail={"message": f"LM Studio API 오류: {e}", "error_details": error_detail})
+
+def completion_text(choice: Dict) -> Optional[str]:
+    """응답 choices 항목 하나의 생성 텍스트 (completions API는 text, 채팅 API는 message.content)"""
+    if "text" in choice:
+        return choice["text"]
+    return (choice.get("message") or {}).get("content")
+
+async def request_completion(request: DialogueRequest, plans: List[Dict], max_tokens: int) -> Tuple[str, Dict]:
+    """LM Studio API 호출 후 (코드 블록을 제거한 응답 텍스트, 원본 응답 JSON) 반환"""
+    headers = {"Content-Type": "application/json"}
+    body = build_completion_body(request, plans, max_tokens)
+    lm_res = await app.state.lm_client.post(completion_url(), headers=headers, json=body)
+    check_lm_response(lm_res)
+
+    lm_result = lm_res.json()
+
+    extracted_text = ""
+    if 'choices' in lm_result and len(lm_result['choices']) > 0 and completion_text(lm_result['choices'][0]) is not None:
+        extracted_text = completion_text(lm_result['choices'][0]).strip()
+        # 마크다운 코드 블록 제거 로직 (더욱 엄격하게 JSON 배열로 시작하는지 확인)
+        if extracted_text.startswith("```json"):
+            extracted_text = extracted_text[len("```json"):].strip()
+        if extracted_text.endswith("```"):
+            extracted_text = extracted_text[:-len("```")].strip()
+    return extracted_text, lm_result
+
+def is_truncated(lm_result: Dict) -> bool:
+    """max_tokens에 걸려 응답이 중간에 끊겼는지 (finish_reason == "length")"""
+    choices = lm_result.get("choices") or [{}]
+    return choices[0].get("finish_reason") == "length"
+
+def budget_for(request: DialogueRequest, plans: List[Dict]) -> int:
+    """날짜 계획들을 한 번에 생성할 때의 max_tokens (적응형 상한은 날짜마다 적용)"""
+    expected_utterances = sum(plan["turns"] * 2 for plan in plans)
+    tokens = token_budget.budget(LM_STUDIO_MODEL, request.situation, expected_utterances, fallback_tokens(plans), units=len(plans))
+    return min(tokens, max_output_tokens())
+
+async def request_budgeted_completion(request: DialogueRequest, plans: List[Dict]) -> Tuple[str, Dict]:
+    """적응형 예산으로 호출하고, 예산이 부족해 응답이 잘리면 fallback 예산으로 한 번 다시 호출"""
+    max_tokens = budget_for(request, plans)
+    extracted_text, lm_result = await request_completion(request, plans, max_tokens)
+    if is_truncated(lm_result):
+        retry_tokens = fallback_tokens(plans)
+        retry = max_tokens < retry_tokens
+        token_budget.record_truncation(retry)
+        if retry:
+            print(f"응답이 max_tokens={max_tokens}에서 잘려 {retry_tokens}으로 다시 요청합니다.")
+            extracted_text, lm_result = await request_completion(request, plans, retry_tokens)
+    return extracted_text, lm_result
+
+def parse_date_records(extracted_text: str) -> List[Dict]:
+    """응답 텍스트를 날짜 기록 객체 배열로 파싱 (형식이 다르면 json.JSONDecodeError 또는 ValueError)
+    json 모드 응답({DATE_RECORDS_KEY: [...]})은 안의 배열을 꺼냅니다."""
+    parsed_lm_data = json.loads(extracted_text)
+    if isinstance(parsed_lm_data, dict) and DATE_RECORDS_KEY in parsed_lm_data:
+        parsed_lm_data = parsed_lm_data[DATE_RECORDS_KEY]
+    if not isinstance(parsed_lm_data, list) or \
+       not all(isinstance(item, dict) and "날짜" in item and "대화목록" in item for item in parsed_lm_data):
+        raise ValueError("LM Studio 응답이 예상된 JSON 배열 형식이 아닙니다.")
+    return parsed_lm_data
+
+def is_valid_daily_entry(daily_entry: Dict) -> bool:
+    """묶음 응답에서 꺼낸 날짜 기록이 그대로 쓸 수 있는지 확인 (대화목록이 비어 있지 않은 객체 배열)"""
+    dialogues = daily_entry.get("대화목록")
+    return isinstance(dialogues, list) and len(dialogues) > 0 and all(isinstance(item, dict) for item in dialogues)
+
+def record_token_usage(request: DialogueRequest, lm_result: Dict, daily_entries: List[Dict]) -> None:
+    """발화당 완료 토큰 수 기록 (다음 요청의 max_tokens 계산에 사용)"""
+    token_budget.record(
+        LM_STUDIO_MODEL,
+        request.situation,
+        (lm_result.get("usage") or {}).get("completion_tokens", 0),
+        sum(len(daily_entry.get("대화목록") or []) for daily_entry in daily_entries)
+    )
+
+class DialogueClock:
+    """날짜 하나의 대화 시각 생성기 (시작 시각부터 평균 간격의 0.5~1.5배씩 진행하고 날짜를 넘기지 않음)"""
+
+    def __init__(self, plan: Dict, dialogue_count: int):
+        self.rng = plan["rng"]
+        self.date = plan["date"]
+        self.pointer = datetime.combine(self.date, plan["start_time"].time())
+        # 총 대화 시간(초)을 발화 수로 나눈 평균 간격
+        self.avg_interval = plan["minutes"] * 60 / dialogue_count if dialogue_count > 0 else 0
+
+    def next(self) -> str:
+        if self.avg_interval > 0:
+            interval = self.rng.uniform(self.avg_interval * 0.5, self.avg_interval * 1.5)
+            self.pointer += timedelta(seconds=interval)
+
+        if self.pointer.date() > self.date:
+            self.pointer = datetime.combine(self.date, datetime.max.time())
+        return self.pointer.strftime("%H:%M:%S")
+
+def dialogue_result(dialogue_item_from_lm: Dict, time_str: str) -> Dict:
+    """대화목록 항목 하나를 응답 형식으로 변환"""
+    return {
+        "time": time_str, # 실제 시간으로 재설정
+        "speaker": dialogue_item_from_lm.get("화자", "알 수 없음"),
+        "dialogue_text": dialogue_item_from_lm.get("텍스트", "대화 내용 없음"),
+        "emotions": dialogue_item_from_lm.get("감정", [])
+    }
+
+def build_daily_result(request: DialogueRequest, plan: Dict, daily_entry: Dict) -> Dict:
+    """LM Studio가 준 날짜 기록에 실제 시간 정보를 붙여 응답 형식으로 변환"""
+    date_from_lm = daily_entry.get("날짜", plan["date_str"])
+    daily_dialogues_list = []
+
+    # 각 대화에 실제 시간 정보를 추가 (LM Studio가 임의 시간 생성 가능하도록 프롬프트에 예시를 줬지만, 여기서도 다시 처리)
+    if daily_entry.get("대화목록"):
+        # 실제 생성된 대화 발화 수 (각 턴이 사용자+챗봇이므로 총 발화 수는 턴 수의 2배가 될 수 있지만,
+        # LM Studio가 대화목록에 직접 리스트로 넣어주므로 그 길이를 사용)
+        clock = DialogueClock(plan, len(daily_entry["대화목록"]))
+        for dialogue_item_from_lm in daily_entry["대화목록"]:
+            daily_dialogues_list.append(dialogue_result(dialogue_item_from_lm, clock.next()))
+
+    # FastAPI 응답 형식에 맞게 변환
+    return {
+        "name": request.name,
+        "age": request.age,
+        "gender": request.gender,
+        "situation": request.situation,
+        "date": date_from_lm, # LM Studio가 준 날짜 또는 기본값
+        "daily_dialogues": daily_dialogues_list
+    }
+
+async def generate_single_date(request: DialogueRequest, plan: Dict) -> List[Dict]:
+    """날짜 하나에 대한 대화 생성 (응답 형식이 잘못되면 HTTPException 500)"""
+    extracted_text, lm_result = await request_budgeted_completion(request, [plan])
+
+    # LM Studio 응답 파싱 로직: 전체 JSON 배열을 기대
+    if not extracted_text:
+        raise HTTPException(status_code=500, detail={"message": "LM Studio에서 대화 내용이 응답되지 않았습니다.", "error_details": "No text received from LM Studio."})
+    try:
+        parsed_lm_data = parse_date_records(extracted_text)
+    except json.JSONDecodeError as e:
+        print(f"JSON 파싱 오류: {e}")
+        print(f"원본 텍스트: {extracted_text}")
+        raise HTTPException(status_code=500, detail={
+            "message": f"LM Studio 응답 JSON 파싱 오류: {e}",
+            "error_details": extracted_text
+        })
+    except ValueError as e:
+        print(f"데이터 형식 오류: {e}")
+        print(f"원본 텍스트: {extracted_text}")
+        raise HTTPException(status_code=500, detail={
+            "message": f"LM Studio 응답 데이터 형식 오류: {e}",
+            "error_details": extracted_text
+        })
+
+    record_token_usage(request, lm_result, parsed_lm_data)
+
+    # LM Studio가 이미 요청한 형식대로 날짜별 대화목록을 생성해 주었다고 가정
+    return [build_daily_result(request, plan, daily_entry) for daily_entry in parsed_lm_data]
+
+async def generate_date_batch(request: DialogueRequest, plans: List[Dict]) -> List[Dict]:
+    """여러 날짜를 한 번의 호출로 생성하고, 응답 배열을 '날짜'로 나눠 날짜별 결과로 변환
+    빠졌거나 형식이 잘못된 날짜는 단일 날짜 호출로 다시 생성합니다."""
+    extracted_text, lm_result = await request_budgeted_completion(request, plans)
+    batch_stats["batched_calls"] += 1
+
+    entries_by_date = {}
+    try:
+        for daily_entry in parse_date_records(extracted_text):
+            entries_by_date.setdefault(str(daily_entry["날짜"]).strip(), daily_entry)
+    except (json.JSONDecodeError, ValueError) as e:
+        # 잘린 응답 등으로 배열 전체를 파싱할 수 없으면 모든 날짜를 단일 호출로 생성
+        print(f"묶음 응답 파싱 오류, 날짜별로 다시 생성합니다: {e}")
+
+    valid_entries = {date_str: entry for date_str, entry in entries_by_date.items() if is_valid_daily_entry(entry)}
+    record_token_usage(request, lm_result, [valid_entries[plan["date_str"]] for plan in plans if plan["date_str"] in valid_entries])
+
+    results = []
+    for plan in plans:
+        daily_entry = valid_entries.get(plan["date_str"])
+        if daily_entry is not None:
+            batch_stats["batched_dates"] += 1
+            results.append(build_daily_result(request, plan, daily_entry))
+        else:
+            batch_stats["fallback_dates"] += 1
+            results.extend(await generate_single_date(request, plan))
+    return results
+
+def completion_delta(event: Dict) -> Optional[str]:
+    """스트리밍 이벤트 하나에서 새로 생성된 텍스트 조각 추출 (completions API는 text, 채팅 API는 delta.content)"""
+    choices = event.get("choices")
+    if not choices:
+        return None
+    if "text" in choices[0]:
+        return choices[0]["text"]
+    return (choices[0].get("delta") or {}).get("content")
+
+async def decode_stream_events(lm_res: httpx.Response, decoder: StreamDecoder) -> AsyncGenerator[Dict, None]:
+    """응답 바이트를 디코더에 넣어 완성된 JSON 이벤트를 차례로 반환 (스트림 끝에 남은 이벤트 포함)"""
+    async for chunk in lm_res.aiter_bytes():
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.close():
+        yield event
+
+async def stream_completion(request: DialogueRequest, plans: List[Dict], max_tokens: int, usage: Dict) -> AsyncGenerator[str, None]:
+    """LM Studio API를 stream=True로 호출해 생성된 텍스트 조각을 도착하는 대로 반환
+    usage["completion_tokens"]에는 서버가 마지막 이벤트에 보낸 토큰 수를, 없으면 받은 조각 수(조각 하나가 대략 토큰 하나)를 넣습니다."""
+    headers = {"Content-Type": "application/json"}
+    body = build_completion_body(request, plans, max_tokens)
+    body["stream"] = True
+    body["stream_options"] = {"include_usage": True}
+    async with app.state.lm_client.stream("POST", completion_url(), headers=headers, json=body) as lm_res:
+        if lm_res.is_error:
+            await lm_res.aread()
+            check_lm_response(lm_res)
+        deltas = 0
+        async for event in decode_stream_events(lm_res, StreamDecoder("sse")):
+            text = completion_delta(event)
+            if text:
+                deltas += 1
+                usage["completion_tokens"] = deltas
+                yield text
+            if event.get("usage"):
+                usage["completion_tokens"] = event["usage"].get("completion_tokens", deltas)
+
+def ndjson_line(record: Dict) -> str:
+    """스트리밍 응답의 NDJSON 줄 하나"""
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+async def stream_dialogue_dates(request: DialogueRequest, plans: List[Dict]) -> AsyncGenerator[str, None]:
+    """날짜 하나(또는 묶음)를 스트리밍으로 생성해 대화목록 항목이 닫힐 때마다 시간 정보를 붙인 NDJSON 줄로 반환
+
+    대화 수를 미리 알 수 없으므로 시간 간격은 요청한 턴 수(turns * 2)로 나눠 계산합니다.
+    날짜 기록은 '날짜' 값(없거나 맞지 않으면 배열 순서)으로 날짜 계획에 연결하고, 묶음 응답에서 대화를 하나도 받지 못한 날짜는
+    단일 날짜 호출로 다시 생성합니다. 단일 날짜 호출에서도 받지 못하면 HTTPException 500.
+    """
+    max_tokens = budget_for(request, plans)
+    plans_by_date = {plan["date_str"]: plan for plan in plans}
+    parser = JsonArrayStreamParser("대화목록") # json 모드의 {"날짜기록": [...]}도 첫 '[' 앞을 건너뛰므로 그대로 읽음
+    record_plans: Dict[int, Optional[Dict]] = {} # 기록 번호 -> 날짜 계획 (중복된 날짜의 기록은 None)
+    clocks: Dict[str, DialogueClock] = {}
+    dialogue_counts: Dict[str, int] = {}
+    finished_dates = set()
+    usage: Dict = {}
+
+    def plan_for_record(record_index: int) -> Optional[Dict]:
+        if record_index not in record_plans:
+            date_from_lm = str(parser.record.get("날짜", "")).strip()
+            plan = plans_by_date.get(date_from_lm) or (plans[record_index] if record_index < len(plans) else None)
+            claimed = {claimed_plan["date_str"] for claimed_plan in record_plans.values() if claimed_plan is not None}
+            record_plans[record_index] = plan if plan is not None and plan["date_str"] not in claimed else None
+        return record_plans[record_index]
+
+    def daily_summary(plan: Dict, complete: bool) -> str:
+        return ndjson_line({
+            "status": "daily_summary",
+            "name": request.name,
+            "age": request.age,
+            "gender": request.gender,
+            "situation": request.situation,
+            "date": plan["date_str"],
+            "total_dialogues": dialogue_counts[plan["date_str"]],
+            "complete": complete, # False면 응답이 중간에 끊겨 받은 대화까지만 포함
+        })
+
+    lm_stream = stream_completion(request, plans, max_tokens, usage)
+    try:
+        async for delta in lm_stream:
+            for kind, record_index, payload in parser.feed(delta):
+                plan = plan_for_record(record_index)
+                if plan is None:
+                    continue
+                date_str = plan["date_str"]
+                if kind == "item":
+                    clock = clocks.setdefault(date_str, DialogueClock(plan, plan["turns"] * 2))
+                    index = dialogue_counts.get(date_str, 0)
+                    dialogue_counts[date_str] = index + 1
+                    yield ndjson_line({"date": date_str, "index": index, **dialogue_result(payload, clock.next())})
+                elif dialogue_counts.get(date_str):
+                    finished_dates.add(date_str)
+                    yield daily_summary(plan, True)
+    finally:
+        # 중간에 멈추면 httpx 스트림 컨텍스트를 빠져나가며 LM Studio 연결도 닫힘
+        await lm_stream.aclose()
+
+    for plan in plans:
+        if dialogue_counts.get(plan["date_str"]) and plan["date_str"] not in finished_dates:
+            print(f"LM Studio 응답이 끝나기 전에 끊겼습니다 ({plan['date_str']}, 대화 {dialogue_counts[plan['date_str']]}개까지 사용)")
+            yield daily_summary(plan, False)
+    token_budget.record(LM_STUDIO_MODEL, request.situation, usage.get("completion_tokens", 0), sum(dialogue_counts.values()))
+
+    missing = [plan for plan in plans if not dialogue_counts.get(plan["date_str"])]
+    if len(plans) == 1:
+        if missing:
+            raise HTTPException(status_code=500, detail={"message": "LM Studio에서 대화 내용이 응답되지 않았습니다.", "error_details": f"No dialogues parsed from LM Studio stream ({parser.stats})."})
+        return
+    batch_stats["batched_calls"] += 1
+    batch_stats["batched_dates"] += len(plans) - len(missing)
+    for plan in missing:
+        batch_stats["fallback_dates"] += 1
+        async for line in stream_dialogue_dates(request, [plan]):
+            yield line
+
+@app.get("/token-budget-stats/")
+async def get_token_budget_stats():
+    """적응형 max_tokens 계산에 쓰이는 (모델, 상황)별 발화당 토큰 통계"""
+    return token_budget.snapshot()
+
+@app.get("/batch-stats/")
+async def get_batch_stats():
+    """여러 날짜 묶음 생성의 호출 수와 단일 날짜로 다시 생성한 날짜 수"""
+    return batch_stats
+
+@app.post("/generate_dialogues", response_model=Dict[str, Union[str, List[Dict[str, Union[str, int, List[Dict[str, Union[str, List[str]]]]]]]]])
 async def generate_dialogues(request: DialogueRequest):
     """
     사용자 정보와 상황에 기반한 공감형 대화문을 생성하고, 각 대화에 느껴지는 감정을 포함하여 반환합니다.
     챗봇과 사용자의 대화가 번갈아 가며 생성되며, 대화 흐름에 따라 감정이 변화하는 것을 반영하려고 합니다.
     가능한 감정은 '기쁨', '분노', '슬픔', '두려움', '놀람', '혐오'의 6가지입니다.
+    batch_size가 1보다 크면 그 수만큼의 날짜를 한 번의 LLM 호출로 생성합니다.
     """
-    emotions = ["기쁨", "분노", "슬픔", "두려움", "놀람", "혐오"]
     try:
         dialogue_results = []
-        
-        start_dt_only_date = date.fromisoformat(request.start_date)
-
-        # Step과 갯수를 고려한 대화 생성
-        for i in range(request.num_dialogues_per_step):
-            current_date_for_dialogues = start_dt_only_date + timedelta(days=request.step_days * i)
-            current_date_str = current_date_for_dialogues.strftime("%Y-%m-%d")
-
-            minutes = random.uniform(5, 10)
-            # 챗봇-사용자 '쌍' 대화 턴 수. 각 턴은 2개의 발화로 구성.
-            dialogue_turns_count = random.randint(int(minutes * 5), int(minutes * 5.5)) 
-
-            dialogue_start_time = datetime.combine(current_date_for_dialogues, datetime.min.time()) + timedelta(hours=random.randint(8, 10), minutes=random.randint(0, 59))
-
-            # LM Studio API 프롬프트 생성 - JSON 형식 예시를 더욱 명확하고 요청하신 구조에 가깝게 제시
-            prompt = (
-                f"당신은 사용자의 감정을 공감하고 지원하는 챗봇입니다. "
-                f"사용자는 '{request.name}'(나이: {request.age}세, 성별: {'남성' if request.gender == 'male' else '여성'})이며, 현재 '{request.situation}' 상황에 있습니다. "
-                f"오늘 날짜는 {current_date_str} 입니다.\n"
-                f"{minutes:.1f}분 동안 진행될 챗봇과 사용자의 공감형 대화문 {dialogue_turns_count}쌍(턴)을 생성해줘. "
-                "각 대화는 1~2문장으로 자연스럽고 현실적으로 만들어줘. "
-                "대화는 사용자의 감정을 이해하고 긍정적인 방향으로 이끌어가는 데 초점을 맞춰야 해. "
-                f"대화가 진행됨에 따라 사용자와 챗봇의 감정이 자연스럽게 변화하는 모습을 보여줘. "
-                f"생성된 대화에 나타나는 감정은 '{', '.join(emotions)}' 중 하나 또는 여러 개가 될 수 있어. "
-                "응답은 반드시 JSON 배열 형태로만 제공해야 해. 배열의 각 요소는 하나의 날짜에 대한 대화 기록 객체여야 해. "
-                "각 날짜 기록 객체는 '날짜' 필드와 '대화목록' 배열을 포함해야 해. "
-                "각 대화목록 요소는 '시간', '화자', '텍스트', '감정' 필드를 포함해야 해. '감정'은 해당 대화 텍스트에서 느껴지는 주요 감정들을 담은 배열이야.\n"
-                "다른 설명이나 추가적인 문장 없이 JSON 배열만 출력해야 해. 다음 예시 형식을 정확히 따라야 해.\n"
-                f"예시:\n"
-                f"[\n"
-                f"  {{\n"
-                f"    \"날짜\": \"{current_date_str}\",\n"
-                f"    \"대화목록\": [\n"
-                f"      {{\n"
-                f"        \"시간\": \"{dialogue_start_time.strftime('%H:%M')}\",\n"
-                f"        \"화자\": \"사용자\",\n"
-                f"        \"텍스트\": \"오늘 학교에서 발표를 망쳐서 너무 슬프고 화가 나요.\",\n"
-                f"        \"감정\": [\"슬픔\", \"분노\"]\n"
-                f"      }},\n"
-                f"      {{\n"
-                f"        \"시간\": \"{(dialogue_start_time + timedelta(minutes=random.randint(1,2))).strftime('%H:%M')}\",\n"
-                f"        \"화자\": \"챗봇\",\n"
-                f"        \"텍스트\": \"정말 속상하고 힘들었겠어요. 어떤 부분이 가장 힘들었나요? 제가 공감해 드릴게요.\",\n"
-                f"        \"감정\": [\"공감\", \"위로\"]\n" # 챗봇의 감정도 표현 가능하도록 (여기서는 예시이므로 '공감' 추가)
-                f"      }}\n"
-                f"    ]\n"
-                f"  }}\n"
-                f"]"
-            )
-
-            # LM Studio API 호출 (이전 코드와 동일)
-            api_url = "http://localhost:1234/v1/completions" # LM Studio 서버 URL 확인
-            headers = {"Content-Type": "application/json"}
-            body = {
-                "model": "eeve-korean-instruct-10.8b-v1.0", # 사용 중인 모델 이름 확인
-                "prompt": prompt,
-                "max_tokens": 4096,
-                "temperature": 0.7,
-                "stop": ["```", "```json"] # JSON 응답 외 다른 출력 방지
-            }
-            
-            lm_res = requests.post(api_url, headers=headers, json=body, timeout=300) 
-            lm_res.raise_for_status() 
-
-            lm_result = lm_res.json()
-            
-            extracted_text = ""
-            if 'choices' in lm_result and len(lm_result['choices']) > 0 and 'text' in lm_result['choices'][0]:
-                extracted_text = lm_result['choices'][0]['text'].strip()
-                # 마크다운 코드 블록 제거 로직 (더욱 엄격하게 JSON 배열로 시작하는지 확인)
-                if extracted_text.startswith("```json"):
-                    extracted_text = extracted_text[len("```json"):].strip()
-                if extracted_text.endswith("```"):
-                    extracted_text = extracted_text[:-len("```")].strip()
-            
-            # LM Studio 응답 파싱 로직 수정: 이제 전체 JSON 배열을 기대
-            parsed_lm_data = []
-            if extracted_text:
-                try:
-                    parsed_lm_data = json.loads(extracted_text)
-                    if not isinstance(parsed_lm_data, list) or \
-                       not all(isinstance(item, dict) and "날짜" in item and "대화목록" in item for item in parsed_lm_data):
-                        raise ValueError("LM Studio 응답이 예상된 JSON 배열 형식이 아닙니다.")
-                except json.JSONDecodeError as e:
-                    print(f"JSON 파싱 오류: {e}")
-                    print(f"원본 텍스트: {extracted_text}")
-                    raise HTTPException(status_code=500, detail={
-                        "message": f"LM Studio 응답 JSON 파싱 오류: {e}",
-                        "error_details": extracted_text
-                    })
-                except ValueError as e:
-                    print(f"데이터 형식 오류: {e}")
-                    print(f"원본 텍스트: {extracted_text}")
-                    raise HTTPException(status_code=500, detail={
-                        "message": f"LM Studio 응답 데이터 형식 오류: {e}",
-                        "error_details": extracted_text
-                    })
+
+        # Step과 갯수를 고려한 날짜별 계획
+        plans = [plan_dialogue_date(request, i) for i in range(request.num_dialogues_per_step)]
+
+        # batch_size개씩 묶어서 생성 (1이면 기존처럼 날짜마다 한 번씩 호출)
+        for batch_start in range(0, len(plans), request.batch_size):
+            batch = plans[batch_start:batch_start + request.batch_size]
+            if len(batch) == 1:
+                dialogue_results.extend(await generate_single_date(request, batch[0]))
             else:
-                raise HTTPException(status_code=500, detail={"message": "LM Studio에서 대화 내용이 응답되지 않았습니다.", "error_details": "No text received from LM Studio."})
-
-            # LM Studio에서 받은 데이터를 바탕으로 결과 구성
-            # LM Studio가 이미 요청한 형식대로 날짜별 대화목록을 생성해 주었다고 가정
-            for daily_entry in parsed_lm_data:
-                date_from_lm = daily_entry.get("날짜", current_date_str)
-                daily_dialogues_list = []
-                
-                # 각 대화에 실제 시간 정보를 추가 (LM Studio가 임의 시간 생성 가능하도록 프롬프트에 예시를 줬지만, 여기서도 다시 처리)
-                dialogue_time_pointer = datetime.combine(current_date_for_dialogues, dialogue_start_time.time())
-                
-                if daily_entry.get("대화목록"):
-                    # 총 대화 시간에 해당하는 초
-                    total_seconds_for_dialogues = minutes * 60 
-                    # 실제 생성된 대화 발화 수 (각 턴이 사용자+챗봇이므로 총 발화 수는 턴 수의 2배가 될 수 있지만,
-                    # LM Studio가 대화목록에 직접 리스트로 넣어주므로 그 길이를 사용)
-                    actual_dialogues_generated = len(daily_entry["대화목록"])
-                    avg_interval_seconds_per_dialogue = total_seconds_for_dialogues / actual_dialogues_generated if actual_dialogues_generated > 0 else 0
-
-                    for k, dialogue_item_from_lm in enumerate(daily_entry["대화목록"]):
-                        if avg_interval_seconds_per_dialogue > 0:
-                            interval = random.uniform(avg_interval_seconds_per_dialogue * 0.5, avg_interval_seconds_per_dialogue * 1.5)
-                            dialogue_time_pointer += timedelta(seconds=interval)
-
-                        if dialogue_time_pointer.date() > current_date_for_dialogues:
-                            dialogue_time_pointer = datetime.combine(current_date_for_dialogues, datetime.max.time())
-
-                        daily_dialogues_list.append({
-                            "time": dialogue_time_pointer.strftime("%H:%M:%S"), # 실제 시간으로 재설정
-                            "speaker": dialogue_item_from_lm.get("화자", "알 수 없음"),
-                            "dialogue_text": dialogue_item_from_lm.get("텍스트", "대화 내용 없음"),
-                            "emotions": dialogue_item_from_lm.get("감정", [])
-                        })
-                
-                # FastAPI 응답 형식에 맞게 변환
-                dialogue_results.append({
-                    "name": request.name,
-                    "age": request.age,
-                    "gender": request.gender,
-                    "situation": request.situation,
-                    "date": date_from_lm, # LM Studio가 준 날짜 또는 기본값
-                    "daily_dialogues": daily_dialogues_list
-                })
+                dialogue_results.extend(await generate_date_batch(request, batch))
 
         return {"status": "success", "message": "감정 정보가 포함된 대화문이 성공적으로 생성되었습니다.", "data": dialogue_results}
 
-    except requests.exceptions.Timeout:
+    except HTTPException:
+        raise
+    except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail={"message": "LM Studio 서버 응답 시간 초과", "error_details": "LM Studio API connection timed out."})
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(status_code=503, detail={"message": "LM Studio 서버 연결 실패", "error_details": "Could not connect to LM Studio API."})
-    except requests.exceptions.RequestException as e:
-        error_detail = ""
-        if 'lm_res' in locals():
-            try:
-                error_detail = lm_res.json()
-            except json.JSONDecodeError:
-                error_detail = lm_res.text
-        raise HTTPException(status_code=500, detail={"message": f"LM Studio API 오류: {e}", "error_details": error_detail})
-    except json.JSONDecodeError as e: # LM Studio 응답 자체의 JSON 파싱 오류는 위에서 처리되므로 여기는 남은 경우
-        raise HTTPException(status_code=500, detail={"message": f"LM Studio 응답을 최종 파싱하는 도중 오류: {e}", "error_details": extracted_text if 'extracted_text' in locals() else "응답 텍스트 없음"})
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail={"message": f"LM Studio API 오류: {e}", "error_details": str(e)})
+    except json.JSONDecodeError as e: # LM Studio 응답 자체의 JSON 파싱 오류
+        raise HTTPException(status_code=500, detail={"message": f"LM Studio 응답을 최종 파싱하는 도중 오류: {e}", "error_details": str(e)})
     except Exception as e:
-        raise HTTPException(status_code=500, detail={"message": f"서버 오류: {e}", "error_details": str(e)})
\ No newline at end of file
+        raise HTTPException(status_code=500, detail={"message": f"서버 오류: {e}", "error_details": str(e)})
+
+@app.post("/generate_dialogues_stream")
+async def generate_dialogues_stream(request: DialogueRequest):
+    """
+    /generate_dialogues와 같은 대화문을 NDJSON 스트림으로 반환합니다.
+    LM Studio 응답을 조각 단위로 읽어 대화목록 항목 하나가 닫힐 때마다 시간 정보를 붙여 바로 보내므로,
+    JSON 배열 전체가 끝나기 전에 첫 대화를 받을 수 있고 서버는 응답 전체를 메모리에 쌓지 않습니다.
+
+    줄 형식 (status가 없는 줄이 대화 하나):
+    - {"status": "generating"} 시작
+    - {"date", "index", "time", "speaker", "dialogue_text", "emotions"} 대화 하나
+    - {"status": "daily_summary", ...} 날짜 하나 완료 (total_dialogues, complete)
+    - {"status": "complete"} 또는 {"status": "error", "message", "error_details"}
+    """
+    async def generate_lines():
+        yield ndjson_line({"status": "generating", "message": "대화 생성을 시작합니다..."})
+        plans = [plan_dialogue_date(request, i) for i in range(request.num_dialogues_per_step)]
+        try:
+            for batch_start in range(0, len(plans), request.batch_size):
+                async for line in stream_dialogue_dates(request, plans[batch_start:batch_start + request.batch_size]):
+                    yield line
+        except HTTPException as e:
+            yield ndjson_line({"status": "error", **e.detail})
+            return
+        except httpx.TimeoutException:
+            yield ndjson_line({"status": "error", "message": "LM Studio 서버 응답 시간 초과", "error_details": "LM Studio API connection timed out."})
+            return
+        except httpx.ConnectError:
+            yield ndjson_line({"status": "error", "message": "LM Studio 서버 연결 실패", "error_details": "Could not connect to LM Studio API."})
+            return
+        except httpx.HTTPError as e:
+            yield ndjson_line({"status": "error", "message": f"LM Studio API 오류: {e}", "error_details": str(e)})
+            return
+        yield ndjson_line({"status": "complete", "message": "감정 정보가 포함된 대화문이 성공적으로 생성되었습니다."})
+
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
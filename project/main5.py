@@ -1,13 +1,61 @@
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware # CORS 미들웨어 추가
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
 import random
 import json
-import requests
-from typing import Literal, List, Dict, Union
+import math
+import os
+import asyncio
+import uuid
+import httpx
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Literal, List, Dict, Union, Optional, Tuple
+from llm_common.llm_backends import Backend, BackendRegistry, CircuitOpenError, build_chat_payload, extract_chat_result
+from llm_common.llm_cache import ResponseCache, make_cache_key
+from llm_common.llm_retry import RetryPolicy
+from llm_common.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from llm_common.checkpoint import CheckpointConflictError, CheckpointStore
+from llm_common.hedging import HedgePolicy
+from llm_common.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, observe_generation, observe_parse_yield, registry as metrics_registry, track_generation
+from llm_common.singleflight import SingleFlight
+from llm_common.token_budget import TokenBudget
+from llm_common.utterance_parser import UtteranceParser
+from jobs import Job, JobManager
+from task_queue import TaskQueue
 
-app = FastAPI()
+# LM Studio 호출용 커넥션 풀 설정 (keep-alive 연결을 재사용)
+LM_CLIENT_MAX_CONNECTIONS = int(os.getenv("LM_CLIENT_MAX_CONNECTIONS", "20"))
+LM_CLIENT_MAX_KEEPALIVE = int(os.getenv("LM_CLIENT_MAX_KEEPALIVE", "10"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """앱 시작 시 공유 HTTP 클라이언트를 만들고 종료 시 닫기"""
+    app.state.lm_client = httpx.AsyncClient(
+        timeout=300.0, # 타임아웃 5분
+        limits=httpx.Limits(
+            max_connections=LM_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=LM_CLIENT_MAX_KEEPALIVE,
+        ),
+    )
+    health_task = asyncio.create_task(llm_registry.health_check_loop(app.state.lm_client))
+    # 서버가 멈추기 전에 끝나지 않은 /jobs 작업은 저장된 날짜를 건너뛰고 이어서 생성
+    await asyncio.to_thread(checkpoint_store.prune)
+    for entry in await asyncio.to_thread(checkpoint_store.unfinished_jobs):
+        # 재시작 전에 이미 수락한 작업이므로 한도 검사 없이 사용량에만 반영
+        ticket = admission.admit("resumed", entry["total"], force=True)
+        await submit_generation_job(UserInput(**entry["request"], job_id=entry["job_id"]), ticket) # max_concurrency 등 실행 옵션도 그대로
+    yield
+    # 종료로 취소된 작업은 체크포인트 상태가 running으로 남아 다음 시작 때 이어서 생성됨
+    await job_manager.shutdown()
+    health_task.cancel()
+    await app.state.lm_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# 엔드포인트별 요청 수와 처리 시간 기록 (/metrics)
+app.add_middleware(MetricsMiddleware)
 
 # CORS 설정: Streamlit 앱이 FastAPI 서버에 접근할 수 있도록 허용
 # 실제 배포 시에는 특정 도메인으로 제한하는 것이 좋습니다.
@@ -26,7 +74,53 @@ app.add_middleware(
 )
 
 # LM Studio 모델의 API 엔드포인트 (기본값, 필요에 따라 수정)
-LM_STUDIO_API_URL = "http://localhost:1234/v1/chat/completions" # LM Studio 기본 포트
+LM_STUDIO_API_URL = os.getenv("LM_STUDIO_API_URL", "http://localhost:1234/v1/chat/completions") # LM Studio 기본 포트
+LM_STUDIO_MODEL = "eeve-korean-instruct-10.8b-v1.0" # 사용하려는 모델명
+
+# 추론 서버 목록 (LLM_BACKENDS 환경 변수가 없으면 LM_STUDIO_API_URL 하나만 사용)
+# 백엔드 하나당 동시 처리 한도는 max_concurrency(기본값: LM_STUDIO_MAX_CONCURRENCY 환경 변수)로 조절합니다.
+llm_registry = BackendRegistry.from_env(LM_STUDIO_API_URL, default_model=LM_STUDIO_MODEL)
+
+# 일시적인 오류(연결 실패, 타임아웃, 429/5xx)는 지터를 준 지수 백오프로 재시도 (LLM_RETRY_* 환경 변수)
+retry_policy = RetryPolicy()
+
+# 관측한 지연 시간의 백분위수를 넘긴 생성은 다른 백엔드에 한 번 더 요청하고 먼저 끝난 쪽을 사용 (LLM_HEDGE_* 환경 변수)
+hedge_policy = HedgePolicy()
+
+# 같은 프롬프트/샘플링 파라미터의 생성 결과를 재사용하는 캐시 (메모리 LRU + 디스크)
+response_cache = ResponseCache()
+
+# 동시에 들어온 동일한 생성 요청을 하나의 생성 작업으로 병합
+request_flight = SingleFlight()
+
+# 관측한 발화당 완료 토큰 수로 max_tokens 결정 (모델, 상황별)
+token_budget = TokenBudget()
+
+# 오래 걸리는 생성을 요청과 분리해 백그라운드에서 실행하는 작업 관리자 (/jobs, LLM_JOB_* 환경 변수)
+job_manager = JobManager()
+
+# 전체/클라이언트별 동시 생성 요청 수와 대기 중인 날짜 수 제한 (넘으면 429 + Retry-After, LLM_ADMISSION_* 환경 변수)
+admission = AdmissionController()
+
+# 날짜별로 완성된 대화문을 job_id 기준으로 저장해 재시작/실패 후 남은 날짜만 생성 (LLM_CHECKPOINT_* 환경 변수)
+checkpoint_store = CheckpointStore()
+
+# 생성 실행 방식: inline(API 프로세스에서 직접 생성) 또는 queue(날짜별 작업을 큐에 넣고 worker.py 프로세스들이 생성)
+LLM_EXECUTION_MODE = os.getenv("LLM_EXECUTION_MODE", "inline")
+LLM_QUEUE_POLL_INTERVAL = float(os.getenv("LLM_QUEUE_POLL_INTERVAL", "0.5")) # queue 모드에서 결과를 확인하는 간격(초)
+task_queue = TaskQueue() if LLM_EXECUTION_MODE == "queue" else None
+
+# 응답 형식: text('참여자: 내용 | 감정: ...' 줄) 또는 json(JSON 스키마로 제한한 구조화 출력, 형식 오류 없이 모든 발화를 파싱)
+LLM_OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "text")
+
+# 백엔드별 세마포어 (여러 요청이 동시에 들어와도 백엔드당 한도를 넘지 않도록 공유)
+backend_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def get_backend_semaphore(backend: Backend) -> asyncio.Semaphore:
+    """백엔드별 동시 처리 한도 세마포어 반환"""
+    if backend.name not in backend_semaphores:
+        backend_semaphores[backend.name] = asyncio.Semaphore(backend.max_concurrency)
+    return backend_semaphores[backend.name]
 
 # 나이 그룹 정의
 AGE_GROUPS = {
@@ -46,6 +140,7 @@ SITUATION_OPTIONS = {
 
 # 정의된 감정
 EMOTIONS = ["기쁨", "분노", "슬픔", "두려움", "놀람", "혐오"]
+utterance_parser = UtteranceParser(EMOTIONS) # 응답 줄 파서 (형식 오류는 이유별로 집계)
 
 class UserInput(BaseModel):
     person_name: Literal["Alice", "Peter", "Sue"] = Field(..., description="대화할 사람의 이름")
@@ -55,6 +150,14 @@ class UserInput(BaseModel):
     start_timestamp: datetime = Field(datetime(2025, 6, 1), description="대화문 생성 기준 시작 타임스탬프 (기본값: 2025-06-01)")
     step_days: int = Field(..., ge=1, description="대화문 생성 간격 (일 단위)")
     num_conversations: int = Field(..., ge=1, description="생성할 대화문의 갯수")
+    max_concurrency: int = Field(1, ge=1, description="날짜별 대화문을 동시에 생성할 최대 개수 (기본값 1: 순차 생성)")
+    use_cache: bool = Field(True, description="같은 조건으로 생성한 결과가 캐시에 있거나 같은 요청이 처리 중이면 재사용 (False면 항상 새로 생성)")
+    seed: Optional[int] = Field(None, description="지정하면 같은 입력에 대해 항상 같은 프롬프트/샘플링 시드를 사용 (재현 가능한 생성)")
+    job_id: Optional[str] = Field(None, min_length=1, max_length=128, description="지정하면 날짜별 결과를 체크포인트로 저장하고, 같은 job_id로 다시 요청하면 남은 날짜만 생성")
+    output_mode: Optional[Literal["text", "json"]] = Field(None, description="LLM 응답 형식 (text: 줄 형식, json: JSON 스키마로 제한한 구조화 출력, 없으면 LLM_OUTPUT_MODE)")
+
+# 체크포인트를 이어받을 때 비교하지 않는 필드 (생성 결과에 영향을 주지 않는 실행 옵션, 저장은 함)
+CHECKPOINT_IGNORED_FIELDS = {"max_concurrency", "use_cache"}
 
 def get_age_group(age: int) -> str:
     """나이에 따른 연령대 반환"""
@@ -67,116 +170,305 @@ def get_age_group(age: int) -> str:
     else: # 65세 이상
         return "senior"
 
+def make_request_rng(seed: Optional[int], key: str) -> random.Random:
+    """seed가 주어지면 (seed, key)로 결정되는 독립 RNG를, 없으면 임의 시드 RNG를 반환"""
+    return random.Random(f"{seed}:{key}") if seed is not None else random.Random()
+
+# 모든 요청에 똑같이 들어가는 지시문 (프롬프트 맨 앞에 고정)
+# 요청마다 달라지는 값(이름, 날짜, 감정 등)을 이 뒤에만 붙여야 백엔드가 앞부분의 프롬프트(KV) 캐시를 재사용할 수 있습니다.
+# 이 문자열을 바꾸면 모든 백엔드의 프롬프트 캐시가 한 번씩 무효화됩니다.
+PROMPT_GUIDELINES = f"""당신은 공감형 대화 생성 챗봇입니다. 아래 지침과 마지막의 대화 정보를 바탕으로 사용자(챗봇)와 대화 상대 간의 자연스러운 대화문을 생성해주세요.
+
+---
+**대화 지침:**
+- **대화 목표:** 대화 상대의 감정을 이해하고 공감하며, 자연스러운 대화 흐름을 유지합니다.
+- **감정:** {EMOTIONS} 중 대화 정보의 '포함될 감정'을 반드시 포함하며, 대화 흐름에 따라 자연스럽게 여러 감정이 나타나도록 해주세요. 하나의 감정에 고정되지 않고, 대화 중간에 감정이 변화하는 것처럼 보이도록 생성해주세요.
+
+"""
+PROMPT_INSTRUCTIONS = PROMPT_GUIDELINES + """---
+**대화 형식:**
+각 발화는 '참여자: [내용] | 감정: [감정1], [감정2]' 형식으로 표현해주세요. 참여자는 '사용자' 또는 대화 상대의 이름입니다. 감정은 쉼표로 구분하여 여러 개를 표현할 수 있습니다.
+최소 1개에서 최대 3개의 감정을 표현해주세요.
+예시:
+사용자: 안녕하세요! 오늘 하루는 어떠셨어요? | 감정: 기쁨
+(대화 상대 이름): 아, 네. 그냥 그랬어요. 좀 피곤하네요. | 감정: 슬픔, 피곤
+"""
+# json 모드: 형식은 응답 스키마(conversation_schema)로 강제되므로 필드의 의미만 설명
+PROMPT_INSTRUCTIONS_JSON = PROMPT_GUIDELINES + """---
+**대화 형식:**
+{"utterances": [...]} 형식의 JSON 객체로만 응답해주세요. 각 발화는 speaker(참여자: '사용자' 또는 대화 상대의 이름), content(발화 내용), emotions(감정 1~3개의 배열)를 가진 객체입니다.
+예시:
+{"utterances": [{"speaker": "사용자", "content": "안녕하세요! 오늘 하루는 어떠셨어요?", "emotions": ["기쁨"]}, {"speaker": "(대화 상대 이름)", "content": "아, 네. 그냥 그랬어요. 좀 피곤하네요.", "emotions": ["슬픔"]}]}
+"""
+
+def conversation_schema(person_name: str) -> Dict:
+    """json 모드 응답 스키마 (화자와 감정을 허용된 값으로만 제한)"""
+    return {
+        "type": "object",
+        "properties": {
+            "utterances": {
+                "type": "array",
+                "minItems": 1,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "speaker": {"type": "string", "enum": ["사용자", person_name]},
+                        "content": {"type": "string", "minLength": 1},
+                        "emotions": {"type": "array", "items": {"type": "string", "enum": EMOTIONS}, "minItems": 1, "maxItems": 3},
+                    },
+                    "required": ["speaker", "content", "emotions"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["utterances"],
+        "additionalProperties": False,
+    }
+
 def generate_prompt(
     person_name: str,
     age: int,
     gender: str,
     situation: str,
     conversation_length_minutes: int,
-    current_date: str
-) -> str:
-    """LM Studio 모델에 전달할 프롬프트 생성"""
-    num_utterances = random.randint(conversation_length_minutes * 10, conversation_length_minutes * 11)
+    current_date: str,
+    rng: Optional[random.Random] = None,
+    output_mode: str = "text"
+) -> Tuple[str, int]:
+    """LM Studio 모델에 전달할 프롬프트 생성 (rng를 주면 해당 RNG로만 무작위 값을 뽑음)
+
+    고정 지시문(PROMPT_INSTRUCTIONS, json 모드는 PROMPT_INSTRUCTIONS_JSON) 뒤에 요청별 정보를 붙입니다.
+    요청 하나의 날짜들은 참여자/상황까지 같으므로 자주 바뀌는 값(날짜, 길이, 감정)을 가장 뒤에 둡니다.
+    """
+    rng = rng or random
+    num_utterances = rng.randint(conversation_length_minutes * 10, conversation_length_minutes * 11)
     
     # 감정의 다양성을 높이기 위해 초기 감정 분포를 랜덤하게 설정
-    initial_emotions = random.sample(EMOTIONS, k=random.randint(2, min(len(EMOTIONS), 4)))
+    initial_emotions = rng.sample(EMOTIONS, k=rng.randint(2, min(len(EMOTIONS), 4)))
     initial_emotion_str = ", ".join(initial_emotions) if initial_emotions else "다양한 감정"
 
-    prompt = f"""
-    당신은 공감형 대화 생성 챗봇입니다. 아래 정보를 바탕으로 사용자(챗봇)와 {person_name} 간의 자연스러운 대화문을 생성해주세요.
-
-    ---
-    **대화 정보:**
-    - **참여자:** 사용자(챗봇)와 {person_name}
-    - **{person_name} 정보:**
-        - **이름:** {person_name}
-        - **나이:** {age}세 ({get_age_group(age)} 그룹)
-        - **성별:** {gender}
-    - **상황:** {situation}
-    - **현재 날짜:** {current_date}
-    - **대화 목표:** {person_name}의 감정을 이해하고 공감하며, 자연스러운 대화 흐름을 유지합니다.
-    - **대화 길이:** 약 {conversation_length_minutes}분 (총 {num_utterances}개 내외의 발화)
-    - **포함될 감정:** {EMOTIONS} 중 적어도 {initial_emotion_str}을(를) 포함하며, 대화 흐름에 따라 자연스럽게 여러 감정이 나타나도록 해주세요. 하나의 감정에 고정되지 않고, 대화 중간에 감정이 변화하는 것처럼 보이도록 생성해주세요.
-
-    ---
-    **대화 형식:**
-    각 발화는 '참여자: [내용] | 감정: [감정1], [감정2]' 형식으로 표현해주세요. 감정은 쉼표로 구분하여 여러 개를 표현할 수 있습니다. 
-    최소 1개에서 최대 3개의 감정을 표현해주세요.
-    예시:
-    사용자: 안녕하세요! 오늘 하루는 어떠셨어요? | 감정: 기쁨
-    {person_name}: 아, 네. 그냥 그랬어요. 좀 피곤하네요. | 감정: 슬픔, 피곤
-
-    ---
-    **대화 시작:**
-    사용자: 안녕하세요, {person_name}님. 요즘 {situation} 관련해서 어떠신지 궁금해서요.
-    {person_name}:
-    """
+    if output_mode == "json":
+        instructions = PROMPT_INSTRUCTIONS_JSON
+        utterance_format = f'{{"speaker": "{person_name}", "content": [내용], "emotions": [[감정1], [감정2]]}}'
+        opening = f'첫 발화는 사용자의 "안녕하세요, {person_name}님. 요즘 {situation} 관련해서 어떠신지 궁금해서요."이고, 이어서 {person_name}이(가) 답합니다.\n'
+    else:
+        instructions = PROMPT_INSTRUCTIONS
+        utterance_format = f"{person_name}: [내용] | 감정: [감정1], [감정2]"
+        opening = f"사용자: 안녕하세요, {person_name}님. 요즘 {situation} 관련해서 어떠신지 궁금해서요.\n{person_name}:\n"
+
+    prompt = instructions + f"""
+---
+**대화 정보:**
+- **참여자:** 사용자(챗봇)와 {person_name}
+- **{person_name} 정보:**
+    - **이름:** {person_name}
+    - **나이:** {age}세 ({get_age_group(age)} 그룹)
+    - **성별:** {gender}
+- **상황:** {situation}
+- **{person_name}의 발화 형식:** {utterance_format}
+- **현재 날짜:** {current_date}
+- **대화 길이:** 약 {conversation_length_minutes}분 (총 {num_utterances}개 내외의 발화)
+- **포함될 감정:** {initial_emotion_str}
+
+---
+**대화 시작:**
+{opening}"""
     return prompt, num_utterances
 
-def call_lm_studio(prompt: str, max_tokens: int) -> str:
-    """LM Studio API 호출 및 응답 반환"""
+async def request_chat_completion(
+    backend: Backend, messages: List[Dict], max_tokens: int, sampling: Dict, response_schema: Optional[Dict] = None
+) -> Tuple[str, int]:
+    """백엔드 하나에 채팅 요청을 한 번 보내고 (생성 텍스트, 완료 토큰 수) 반환"""
     headers = {"Content-Type": "application/json"}
-    data = {
-        "model": "eeve-korean-instruct-10.8b-v1.0", # 사용하려는 모델명
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": max_tokens,
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "frequency_penalty": 0.0,
-        "presence_penalty": 0.0
-    }
-    try:
-        response = requests.post(LM_STUDIO_API_URL, headers=headers, json=data, timeout=300) # 타임아웃 5분
-        response.raise_for_status()  # HTTP 오류 발생 시 예외 발생
-        completion = response.json()
-        return completion["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"LM Studio API 호출 오류: {e}. LM Studio 서버가 실행 중인지 확인해주세요 (http://localhost:1234).")
-
-def parse_conversation_data(raw_text: str, person_name: str, total_utterances: int) -> List[Dict]:
-    """LM Studio 응답 텍스트를 파싱하여 JSON 형식으로 변환"""
-    parsed_data = []
-    lines = raw_text.strip().split('\n')
-    
-    for line in lines:
-        if ':' in line and '|' in line:
-            try:
-                parts = line.split('|')
-                speaker_content = parts[0].strip()
-                emotion_content = parts[1].strip()
-
-                speaker_name, content = speaker_content.split(':', 1)
-                speaker_name = speaker_name.strip()
-                content = content.strip()
-
-                emotions_str = emotion_content.replace('감정:', '').strip()
-                emotions = [e.strip() for e in emotions_str.split(',') if e.strip() in EMOTIONS]
-
-                if speaker_name in ["사용자", person_name]:
-                    parsed_data.append({
-                        "speaker": speaker_name,
-                        "content": content,
-                        "emotions": emotions if emotions else [random.choice(EMOTIONS)] # 감정 없으면 랜덤 감정 추가
-                    })
-            except Exception:
-                pass # 잘못된 형식의 줄은 건너뛰기
-    
+    data = build_chat_payload(backend, LM_STUDIO_MODEL, messages, max_tokens, response_schema=response_schema, **sampling)
+    # 세마포어 대기 중인 요청도 outstanding으로 집계되어 라우팅에 반영됨
+    with llm_registry.track(backend):
+        async with get_backend_semaphore(backend):
+            with track_generation(backend.name, data["model"]):
+                started = asyncio.get_running_loop().time()
+                # 타임아웃은 세마포어 대기가 아닌 실제 요청에만 적용됨
+                response = await app.state.lm_client.post(backend.chat_url(), headers=headers, json=data, timeout=retry_policy.timeout())
+                response.raise_for_status()  # HTTP 오류 발생 시 예외 발생
+                content, completion_tokens = extract_chat_result(backend, response.json())
+                elapsed = asyncio.get_running_loop().time() - started
+                backend.observe(completion_tokens, elapsed)
+                observe_generation(backend.name, data["model"], elapsed, completion_tokens)
+    return content, completion_tokens
+
+async def call_lm_studio(
+    prompt: str,
+    max_tokens: int,
+    use_cache: bool = True,
+    seed: Optional[int] = None,
+    usage: Optional[Dict] = None,
+    response_schema: Optional[Dict] = None
+) -> str:
+    """
+    레지스트리에서 고른 백엔드로 LLM API 호출 및 응답 반환 (캐시에 있으면 재사용)
+    일시적인 오류는 retry_policy에 따라 (다른 백엔드를 다시 골라) 재시도하고, 모든 백엔드의 서킷이 열려 있으면 바로 503을 반환합니다.
+    헤징이 켜져 있으면 오래 걸리는 시도는 다른 백엔드에도 보내 먼저 끝난 결과를 사용합니다.
+    usage를 넘기면 완료 토큰 수(completion_tokens)와 캐시 사용 여부(cached)를 채워줍니다.
+    response_schema를 넘기면 백엔드가 해당 JSON 스키마에 맞는 응답만 생성하도록 요청합니다.
+    """
+    usage = usage if usage is not None else {}
+    messages = [{"role": "user", "content": prompt}]
+    sampling = {"temperature": 0.7, "top_p": 0.9, "frequency_penalty": 0.0, "presence_penalty": 0.0}
+    if seed is not None:
+        sampling["seed"] = seed # 백엔드 샘플링 시드 (지원하는 서버에서 같은 출력 재현)
+    # 스키마는 json 모드에서만 키에 넣어 기존 text 모드 캐시 키가 바뀌지 않도록 함
+    schema_params = {"response_schema": response_schema} if response_schema is not None else {}
+    cache_key = make_cache_key(LM_STUDIO_MODEL, messages, max_tokens=max_tokens, **schema_params, **sampling)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            usage.update(completion_tokens=0, cached=True)
+            return cached
+
+    attempt = 0
+    while True:
+        try:
+            backend = llm_registry.pick()
+        except CircuitOpenError as e:
+            retry_policy.stats["circuit_open"] += 1
+            raise HTTPException(status_code=503, detail=f"LM Studio API 호출 오류: {e}", headers={"Retry-After": str(math.ceil(e.retry_after))})
+        retry_policy.stats["attempts"] += 1
+
+        def hedge_request():
+            alternative = llm_registry.pick_alternative(backend.name)
+            return request_chat_completion(alternative, messages, max_tokens, sampling, response_schema) if alternative else None
+
+        try:
+            content, completion_tokens = await hedge_policy.run(
+                lambda: request_chat_completion(backend, messages, max_tokens, sampling, response_schema), hedge_request
+            )
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            if retry_policy.should_retry(e, attempt):
+                print(f"LM Studio API 호출 실패 ({backend.name}, {attempt + 1}번째 시도): {e!r}. 재시도합니다.")
+                await retry_policy.backoff(attempt)
+                attempt += 1
+                continue
+            raise HTTPException(status_code=500, detail=f"LM Studio API 호출 오류: {e}. LM Studio 서버가 실행 중인지 확인해주세요 ({backend.url}).")
+        break
+
+    usage.update(completion_tokens=completion_tokens, cached=False)
+    if use_cache:
+        response_cache.set(cache_key, content)
+    return content
+
+def extract_utterances(raw_text: str, person_name: str, rng: Optional[random.Random] = None) -> List[Dict]:
+    """LM Studio 응답 텍스트에서 형식에 맞는 발화만 추출 (개수 조절 없음)"""
+    return utterance_parser.parse(raw_text, person_name, rng)
+
+def fit_utterance_count(parsed_data: List[Dict], total_utterances: int, rng: Optional[random.Random] = None) -> List[Dict]:
+    """생성된 발화 수가 너무 적거나 많을 경우 조절 (단순히 잘라내거나 반복)"""
+    rng = rng or random
     # 생성된 발화 수가 너무 적거나 많을 경우 조절 (단순히 잘라내거나 반복)
     if len(parsed_data) > total_utterances * 1.5:
         parsed_data = parsed_data[:int(total_utterances * 1.2)]
     elif len(parsed_data) < total_utterances * 0.5:
         if parsed_data:
             while len(parsed_data) < total_utterances * 0.8:
-                parsed_data.extend(random.sample(parsed_data, k=min(len(parsed_data), 5)))
+                parsed_data.extend(rng.sample(parsed_data, k=min(len(parsed_data), 5)))
 
     return parsed_data
 
+def parse_conversation_data(raw_text: str, person_name: str, total_utterances: int, rng: Optional[random.Random] = None) -> List[Dict]:
+    """LM Studio 응답 텍스트를 파싱하여 JSON 형식으로 변환"""
+    return fit_utterance_count(extract_utterances(raw_text, person_name, rng), total_utterances, rng)
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Empathy Conversation Generator API (FastAPI Server)!"}
 
-@app.post("/generate_conversation/")
-async def generate_conversation_endpoint(user_input: UserInput):
+async def generate_single_conversation(
+    person_name: str,
+    age: int,
+    gender: str,
+    situation: str,
+    formatted_date: str,
+    use_cache: bool = True,
+    seed: Optional[int] = None,
+    output_mode: Optional[str] = None
+) -> Dict:
+    """하나의 날짜에 대한 대화문 생성 (백엔드 동시 처리 한도 적용)
+
+    json 모드에서는 conversation_schema로 응답 형식을 제한해 형식 오류로 버려지는 발화가 없도록 합니다.
+    """
+    mode = output_mode or LLM_OUTPUT_MODE
+    # 날짜마다 독립된 RNG를 써서 동시 생성 순서와 관계없이 같은 seed면 같은 결과가 나오도록 함
+    rng = make_request_rng(seed, formatted_date)
+    conversation_length_minutes = rng.randint(5, 10) # 5분-10분 랜덤
+    prompt, total_expected_utterances = generate_prompt(
+        person_name, age, gender, situation, conversation_length_minutes, formatted_date, rng, mode
+    )
+    backend_seed = rng.randrange(2**31) if seed is not None else None
+
+    # JSON은 키와 따옴표만큼 발화당 토큰이 더 들므로 예산 통계를 모드별로 따로 둠
+    if mode == "json":
+        budget_model, response_schema, fallback_tokens = f"{LM_STUDIO_MODEL}:json", conversation_schema(person_name), total_expected_utterances * 45
+    else:
+        budget_model, response_schema, fallback_tokens = LM_STUDIO_MODEL, None, total_expected_utterances * 30
+    max_tokens_for_lm = token_budget.budget(budget_model, situation, total_expected_utterances, fallback_tokens)
+
+    try:
+        usage = {}
+        raw_lm_response = await call_lm_studio(prompt, max_tokens_for_lm, use_cache, backend_seed, usage, response_schema)
+        if mode == "json":
+            utterances = utterance_parser.parse_json(raw_lm_response, person_name, rng)
+        else:
+            utterances = extract_utterances(raw_lm_response, person_name, rng)
+        observe_parse_yield(len(utterances), total_expected_utterances)
+        token_budget.record(budget_model, situation, usage.get("completion_tokens", 0), len(utterances))
+        parsed_conversation = fit_utterance_count(utterances, total_expected_utterances, rng)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"대화 생성 중 오류 발생: {e}")
+
+    return {
+        "timestamp": formatted_date,
+        "person_name": person_name,
+        "age": age,
+        "gender": gender,
+        "situation": situation,
+        "conversation_length_minutes": conversation_length_minutes,
+        "total_utterances_expected": total_expected_utterances,
+        "total_utterances_generated": len(parsed_conversation),
+        "conversation": parsed_conversation
+    }
+
+async def generate_via_queue(queue_job_id: str, index: int, payload: Dict) -> Dict:
+    """날짜 하나를 작업 큐에 넣고 워커가 결과를 기록할 때까지 대기 (queue 모드)
+
+    큐는 sqlite이고 워커가 쓰기 잠금을 잡고 있으면 busy timeout까지 기다릴 수 있으므로, 모든 호출을 스레드에서 실행해 이벤트 루프를 막지 않습니다.
+    """
+    await asyncio.to_thread(task_queue.enqueue, queue_job_id, [(index, payload)])
+    try:
+        while True:
+            status, result, error = await asyncio.to_thread(task_queue.result, queue_job_id, index)
+            if status == "done":
+                return result
+            if status in ("failed", "cancelled", "missing"):
+                raise HTTPException(status_code=500, detail=f"대화 생성 중 오류 발생: {error or status}")
+            await asyncio.sleep(LLM_QUEUE_POLL_INTERVAL)
+    except asyncio.CancelledError:
+        # 요청이 취소되면 아직 워커가 가져가지 않은 날짜는 생성하지 않음
+        await asyncio.to_thread(task_queue.cancel, queue_job_id)
+        raise
+
+def checkpoint_request(user_input: UserInput) -> Dict:
+    """체크포인트에 저장하는 요청 내용 (재시작 후 이 내용으로 UserInput을 다시 만듦)"""
+    return user_input.model_dump(mode="json", exclude={"job_id"})
+
+async def generate_all_conversations(
+    user_input: UserInput,
+    on_conversation: Optional[Callable[[int, Dict], Awaitable[None]]] = None,
+    mode: str = "request"
+) -> List[Dict]:
+    """요청의 모든 날짜에 대한 대화문을 생성해 timestamp 순서대로 반환 (on_conversation이 있으면 날짜 하나가 끝날 때마다 호출)
+
+    user_input.job_id가 있으면 날짜마다 체크포인트를 저장하고, 이미 저장된 날짜는 다시 생성하지 않습니다.
+    """
     person_name = user_input.person_name
     age = user_input.age
     gender = user_input.gender
@@ -184,39 +476,115 @@ async def generate_conversation_endpoint(user_input: UserInput):
     start_timestamp = user_input.start_timestamp
     step_days = user_input.step_days
     num_conversations = user_input.num_conversations
+    job_id = user_input.job_id
 
-    all_conversation_data = []
+    completed: Dict[int, Dict] = {}
+    if job_id is not None:
+        try:
+            completed = await asyncio.to_thread(
+                checkpoint_store.start_job, job_id, checkpoint_request(user_input), num_conversations, mode,
+                CHECKPOINT_IGNORED_FIELDS,
+            )
+        except CheckpointConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
 
-    for i in range(num_conversations):
-        current_date = start_timestamp + timedelta(days=i * step_days)
-        formatted_date = current_date.strftime("%Y-%m-%d")
+    # queue 모드에서 큐 작업을 묶는 ID (job_id가 있으면 같은 ID로 다시 요청할 때 이미 끝난 큐 작업도 재사용)
+    queue_job_id = job_id or uuid.uuid4().hex
 
-        conversation_length_minutes = random.randint(5, 10) # 5분-10분 랜덤
-        prompt, total_expected_utterances = generate_prompt(
-            person_name, age, gender, situation, conversation_length_minutes, formatted_date
-        )
-        
-        max_tokens_for_lm = total_expected_utterances * 30 
+    # 요청 하나가 동시에 생성할 수 있는 날짜 수 제한 (백엔드 한도는 call_lm_studio에서 별도로 적용)
+    request_semaphore = asyncio.Semaphore(user_input.max_concurrency)
 
-        try:
-            raw_lm_response = call_lm_studio(prompt, max_tokens_for_lm)
-            parsed_conversation = parse_conversation_data(raw_lm_response, person_name, total_expected_utterances)
-            
-            all_conversation_data.append({
-                "timestamp": formatted_date,
-                "person_name": person_name,
-                "age": age,
-                "gender": gender,
-                "situation": situation,
-                "conversation_length_minutes": conversation_length_minutes,
-                "total_utterances_expected": total_expected_utterances,
-                "total_utterances_generated": len(parsed_conversation),
-                "conversation": parsed_conversation
-            })
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"대화 생성 중 오류 발생: {e}")
+    async def generate_for_index(i: int) -> Dict:
+        if i in completed:
+            conversation = completed[i] # 이전 실행에서 저장된 날짜
+        else:
+            current_date = start_timestamp + timedelta(days=i * step_days)
+            formatted_date = current_date.strftime("%Y-%m-%d")
+            if task_queue is not None:
+                # 동시 생성 수는 워커 수와 워커별 --concurrency로 조절되므로 모든 날짜를 바로 큐에 넣음
+                conversation = await generate_via_queue(queue_job_id, i, {
+                    "person_name": person_name, "age": age, "gender": gender, "situation": situation,
+                    "formatted_date": formatted_date, "use_cache": user_input.use_cache, "seed": user_input.seed,
+                    "output_mode": user_input.output_mode,
+                })
+            else:
+                async with request_semaphore:
+                    conversation = await generate_single_conversation(
+                        person_name, age, gender, situation, formatted_date, user_input.use_cache, user_input.seed,
+                        user_input.output_mode
+                    )
+            if job_id is not None:
+                # 커밋마다 fsync하므로 이벤트 루프 밖에서 기록
+                await asyncio.to_thread(checkpoint_store.save, job_id, i, conversation)
+        if on_conversation is not None:
+            await on_conversation(i, conversation)
+        return conversation
+
+    tasks = [asyncio.create_task(generate_for_index(i)) for i in range(num_conversations)]
+    succeeded = False
+    try:
+        # gather는 결과를 tasks 순서(= timestamp 오름차순)대로 돌려줍니다.
+        all_conversation_data = await asyncio.gather(*tasks)
+        succeeded = True
+    except Exception as e:
+        # 하나라도 실패하면 나머지 날짜 생성은 취소 (완료된 날짜의 체크포인트는 남아 있어 같은 job_id로 이어서 생성 가능)
+        for task in tasks:
+            task.cancel()
+        # 취소된 날짜가 큐에서 자기 작업을 cancelled로 바꿀 때까지 기다린 뒤 정리
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if job_id is not None:
+            await asyncio.to_thread(checkpoint_store.set_status, job_id, "failed", str(getattr(e, "detail", e)))
+        raise
+    finally:
+        # job_id 없이 실패/취소된 요청은 다시 이어받을 수 없으므로 워커가 처리 중인 행까지 함께 삭제
+        # (job_id가 있으면 실패 시 남겨 두어 같은 job_id로 다시 요청할 때 이미 끝난 날짜를 재사용)
+        if task_queue is not None and (succeeded or job_id is None):
+            await asyncio.to_thread(task_queue.purge, queue_job_id, not succeeded)
+    if job_id is not None:
+        await asyncio.to_thread(checkpoint_store.set_status, job_id, "succeeded")
+    return all_conversation_data
+
+def request_key(user_input: UserInput) -> str:
+    """요청 병합에 쓰는 키 (요청 본문 전체)"""
+    return json.dumps(user_input.model_dump(mode="json"), ensure_ascii=False, sort_keys=True)
+
+def client_id(request: Request) -> str:
+    """수락 제어에 쓰는 클라이언트 구분값 (X-Client-Id 헤더, 없으면 접속 IP)"""
+    return request.headers.get("X-Client-Id") or (request.client.host if request.client else "unknown")
+
+def admit_request(request: Request, user_input: UserInput) -> AdmissionTicket:
+    """수락 한도를 넘으면 429와 예상 대기 시간(Retry-After)으로 거절"""
+    try:
+        return admission.admit(client_id(request), user_input.num_conversations)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+async def generate_admitted(user_input: UserInput, ticket: Optional[AdmissionTicket], mode: str = "request", on_conversation=None) -> List[Dict]:
+    """수락된 요청의 생성: 날짜가 끝날 때마다 대기 날짜 수를 줄이고, 끝나면(실패/취소 포함) 티켓 반환"""
+    async def report(index: int, conversation: Dict):
+        if ticket is not None:
+            ticket.date_done()
+        if on_conversation is not None:
+            await on_conversation(index, conversation)
+
+    try:
+        return await generate_all_conversations(user_input, on_conversation=report, mode=mode)
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+@app.post("/generate_conversation/")
+async def generate_conversation_endpoint(user_input: UserInput, request: Request):
+    key = request_key(user_input)
+    if user_input.use_cache and request_flight.in_flight(key):
+        # 같은 요청이 이미 처리 중이면 백엔드 부하가 늘지 않으므로 수락 제어 없이 그 결과를 함께 받음
+        all_conversation_data = await request_flight.do(key, lambda: generate_all_conversations(user_input))
+    else:
+        ticket = admit_request(request, user_input)
+        if user_input.use_cache:
+            all_conversation_data = await request_flight.do(key, lambda: generate_admitted(user_input, ticket))
+        else:
+            all_conversation_data = await generate_admitted(user_input, ticket)
 
     # JSON 파일로 다운로드할 수 있도록 응답 (Streamlit에서 처리)
     json_output = json.dumps(all_conversation_data, indent=4, ensure_ascii=False)
@@ -225,6 +593,161 @@ async def generate_conversation_endpoint(user_input: UserInput):
     return Response(content=json_output, media_type="application/json")
 
 
+def job_response(job: Job) -> Dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="해당 작업을 찾을 수 없습니다. (만료되었거나 잘못된 작업 ID)")
+    return job
+
+async def submit_generation_job(user_input: UserInput, ticket: Optional[AdmissionTicket] = None) -> Job:
+    """대화문 생성을 백그라운드 작업으로 등록 (작업 ID로 체크포인트를 저장하므로 재시작 후 이어서 생성 가능)
+
+    실행 슬롯을 기다리는 작업도 체크포인트에 queued로 기록해 두므로 재시작 후 이어서 실행됩니다.
+    티켓은 작업 단위로 반환하므로, 실행 슬롯을 기다리는 동안 취소된 작업도 수락 한도를 계속 차지하지 않습니다.
+    """
+    if user_input.job_id is None:
+        user_input = user_input.model_copy(update={"job_id": uuid.uuid4().hex})
+    try:
+        await asyncio.to_thread(
+            checkpoint_store.queue_job, user_input.job_id, checkpoint_request(user_input), user_input.num_conversations,
+            "job", CHECKPOINT_IGNORED_FIELDS,
+        )
+    except CheckpointConflictError as e:
+        if ticket is not None:
+            ticket.release()
+        raise HTTPException(status_code=409, detail=str(e))
+
+    async def run(job: Job):
+        job_input = user_input.model_copy(update={"job_id": job.id})
+        await generate_admitted(job_input, ticket, mode="job", on_conversation=job.add_result)
+
+    return job_manager.submit(
+        user_input.model_dump(mode="json"), user_input.num_conversations, run, job_id=user_input.job_id,
+        on_finished=ticket.release if ticket is not None else None,
+    )
+
+# 대화문 생성 작업 등록: 생성이 끝날 때까지 기다리지 않고 작업 ID를 바로 반환
+# 생성은 백그라운드에서 계속되므로 클라이언트 연결이 끊겨도 상태 조회로 결과를 다시 받을 수 있습니다.
+# job_id를 지정하면 그 ID로 저장된 날짜는 건너뛰고 남은 날짜만 생성합니다.
+# 대기 중인 작업의 날짜도 수락 한도에 포함되므로, 한도를 넘으면 작업을 등록하지 않고 429를 반환합니다.
+@app.post("/jobs", status_code=202)
+async def create_job(user_input: UserInput, request: Request):
+    existing = job_manager.get(user_input.job_id) if user_input.job_id else None
+    if existing is not None and not existing.finished:
+        return job_response(existing)
+    return job_response(await submit_generation_job(user_input, admit_request(request, user_input)))
+
+
+# 작업 상태와 지금까지 생성된 대화문(timestamp 순서) 조회
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return get_job_or_404(job_id).snapshot()
+
+
+# 작업 진행 이벤트 스트림 (NDJSON: 상태 변경과 날짜별 대화문 완료를 한 줄씩, 지난 이벤트부터 다시 전송)
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    job = get_job_or_404(job_id)
+
+    async def event_stream():
+        async for event in job.subscribe():
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+# 작업 취소 (진행 중인 LLM 요청도 함께 취소)
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = get_job_or_404(job_id)
+    await job_manager.cancel(job_id)
+    if job.status == "cancelled":
+        await asyncio.to_thread(checkpoint_store.set_status, job_id, "cancelled") # 재시작 후 이어서 생성하지 않음
+    return job_response(job)
+
+
+# 작업 관리자 상태 조회 (상태별 작업 수)
+@app.get("/job-stats/")
+async def get_job_stats():
+    return job_manager.snapshot()
+
+
+# 수락 제어 상태 조회 (진행 중인 요청 수, 대기 중인 날짜 수, 클라이언트별 사용량, 관측 처리량, 거절 횟수)
+@app.get("/admission-stats/")
+async def get_admission_stats():
+    return admission.snapshot()
+
+
+# 작업 큐 상태 조회 (queue 모드: 상태별 작업 수, 작업 중인 워커 수, 가장 오래 기다린 작업의 대기 시간)
+@app.get("/queue-stats/")
+async def get_queue_stats():
+    if task_queue is None:
+        return {"mode": LLM_EXECUTION_MODE}
+    return {"mode": LLM_EXECUTION_MODE, **(await asyncio.to_thread(task_queue.snapshot))}
+
+
+# 체크포인트 통계 조회 (dates_saved: 저장한 날짜 수, dates_restored: 다시 생성하지 않고 재사용한 날짜 수)
+@app.get("/checkpoint-stats/")
+async def get_checkpoint_stats():
+    return checkpoint_store.snapshot()
+
+
+# Prometheus 형식 메트릭 (엔드포인트별 요청 수/지연, LLM 생성 시간과 토큰/초, 파싱 수율, 진행 중인 생성 수)
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+# 추론 서버별 상태(처리 중인 요청 수, 헬스 체크, 관측 처리량) 조회
+@app.get("/backends/")
+async def get_backends():
+    return llm_registry.snapshot()
+
+
+# LLM 호출 재시도 통계 조회 (retries: 재시도 횟수, exhausted: 재시도를 모두 써도 실패, circuit_open: 서킷이 열려 바로 거절)
+@app.get("/retry-stats/")
+async def get_retry_stats():
+    return retry_policy.snapshot()
+
+
+# 헤징 통계 조회 (hedge_rate: 헤지 요청 비율, hedge_wins: 헤지 쪽이 먼저 끝난 횟수, estimated_latency_saved_seconds: 줄인 지연 시간 추정치)
+@app.get("/hedge-stats/")
+async def get_hedge_stats():
+    return hedge_policy.snapshot()
+
+
+# 생성 결과 캐시 적중/미스 통계 조회
+@app.get("/cache-stats/")
+async def get_cache_stats():
+    return response_cache.snapshot()
+
+
+# 동일 요청 병합 통계 조회 (leaders: 실제 생성, coalesced: 진행 중인 생성에 합류)
+@app.get("/coalescing-stats/")
+async def get_coalescing_stats():
+    return request_flight.snapshot()
+
+
+# 응답 줄 파싱 결과(파싱한 줄 수, 이유별로 버리거나 보정한 줄 수) 조회
+@app.get("/parse-stats/")
+async def get_parse_stats():
+    return utterance_parser.snapshot()
+
+
+# 적응형 max_tokens 계산에 쓰이는 (모델, 상황)별 발화당 토큰 통계 조회
+@app.get("/token-budget-stats/")
+async def get_token_budget_stats():
+    return token_budget.snapshot()
+
+
 # 상황 옵션을 동적으로 가져오는 엔드포인트
 @app.get("/get_situation_options/")
 async def get_situation_options(age: int):
@@ -0,0 +1,198 @@
+"""
+날짜별 대화문 생성 작업 큐 (SQLite, 워커 모드)
+
+API 서버(main5.py, LLM_EXECUTION_MODE=queue)는 날짜 하나를 작업 하나로 큐에 넣고 결과가 기록되기를 기다리며,
+생성은 별도 프로세스로 띄운 워커(worker.py)가 큐에서 작업을 가져가 처리합니다.
+외부 서비스 없이 SQLite 파일 하나로 동작하므로 같은 머신의 워커 여러 개, 또는 파일을 공유하는 여러 머신에서 쓸 수 있습니다.
+(네트워크 파일 시스템은 파일 잠금을 제대로 지원하는 경우에만 사용하세요.)
+
+- 워커는 작업을 가져갈 때 lease_seconds 동안 임대(lease)하고, 생성 중에는 주기적으로 임대를 연장합니다.
+- 워커가 죽어 임대가 만료된 작업은 다른 워커가 다시 가져갑니다.
+- 실패한 작업은 max_attempts번까지 다시 큐에 넣고, 그 뒤에는 failed로 기록해 API 서버가 오류를 반환하게 합니다.
+
+환경 변수:
+    LLM_QUEUE_PATH           큐 SQLite 파일 경로 (기본값: task_queue.sqlite3)
+    LLM_QUEUE_LEASE_SECONDS  작업 임대 시간(초). 이 시간 동안 연장이 없으면 다른 워커가 가져감 (기본값: 60)
+    LLM_QUEUE_MAX_ATTEMPTS   작업 하나의 최대 시도 횟수 (기본값: 3)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LLM_QUEUE_PATH = os.getenv("LLM_QUEUE_PATH", "task_queue.sqlite3")
+LLM_QUEUE_LEASE_SECONDS = float(os.getenv("LLM_QUEUE_LEASE_SECONDS", "60"))
+LLM_QUEUE_MAX_ATTEMPTS = int(os.getenv("LLM_QUEUE_MAX_ATTEMPTS", "3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    date_index INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (job_id, date_index)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, lease_expires, task_id);
+"""
+
+
+class TaskQueue:
+    def __init__(
+        self,
+        path: str = LLM_QUEUE_PATH,
+        lease_seconds: float = LLM_QUEUE_LEASE_SECONDS,
+        max_attempts: int = LLM_QUEUE_MAX_ATTEMPTS,
+    ):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        if self.path.parent != Path("."):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 프로세스마다 자기 연결을 쓰고, 다른 프로세스가 쓰는 중이면 busy timeout 동안 기다림
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def enqueue(self, job_id: str, items: List[Tuple[int, Dict]]) -> None:
+        """(날짜 인덱스, 생성 인자) 목록을 큐에 추가 (이미 있는 날짜가 failed/cancelled면 다시 queued로)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for index, payload in items:
+                    self._conn.execute(
+                        """
+                        INSERT INTO tasks (job_id, date_index, payload, status, created_at, updated_at)
+                        VALUES (?, ?, ?, 'queued', ?, ?)
+                        ON CONFLICT (job_id, date_index) DO UPDATE SET
+                            payload = excluded.payload, status = 'queued', attempts = 0, error = NULL, updated_at = excluded.updated_at
+                        WHERE tasks.status IN ('failed', 'cancelled')
+                        """,
+                        (job_id, index, json.dumps(payload, ensure_ascii=False), now, now),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """가장 오래된 대기 작업(또는 임대가 만료된 작업)을 임대해 반환 (없으면 None)"""
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡아 두 워커가 같은 작업을 가져가지 않게 함
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT task_id, job_id, date_index, payload, attempts FROM tasks
+                    WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?)
+                    ORDER BY task_id LIMIT 1
+                    """,
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                        (worker_id, now + self.lease_seconds, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        task_id, job_id, date_index, payload, attempts = row
+        return {"task_id": task_id, "job_id": job_id, "date_index": date_index, "payload": json.loads(payload), "attempt": attempts + 1}
+
+    def _update_leased(self, sql: str, params: Tuple) -> bool:
+        """임대 중인 작업만 갱신 (임대가 만료되어 다른 워커가 가져간 작업이면 False)"""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+        return cursor.rowcount > 0
+
+    def renew(self, task_id: int, worker_id: str) -> bool:
+        """생성 중인 작업의 임대 연장"""
+        now = time.time()
+        return self._update_leased(
+            "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE task_id = ? AND worker_id = ? AND status = 'leased'",
+            (now + self.lease_seconds, now, task_id, worker_id),
+        )
+
+    def complete(self, task_id: int, worker_id: str, result: Dict) -> bool:
+        return self._update_leased(
+            "UPDATE tasks SET status = 'done', result = ?, lease_expires = NULL, updated_at = ? WHERE task_id = ? AND worker_id = ? AND status = 'leased'",
+            (json.dumps(result, ensure_ascii=False), time.time(), task_id, worker_id),
+        )
+
+    def fail(self, task_id: int, worker_id: str, error: str, retryable: bool = True) -> bool:
+        """작업 실패 기록: 시도 횟수가 남았고 retryable이면 다시 대기열로, 아니면 failed"""
+        return self._update_leased(
+            """
+            UPDATE tasks SET
+                status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END,
+                error = ?, worker_id = NULL, lease_expires = NULL, updated_at = ?
+            WHERE task_id = ? AND worker_id = ? AND status = 'leased'
+            """,
+            (int(retryable), self.max_attempts, error, time.time(), task_id, worker_id),
+        )
+
+    def cancel(self, job_id: str) -> None:
+        """아직 워커가 가져가지 않은 작업 취소 (처리 중인 작업은 끝까지 실행되지만 결과는 쓰이지 않음)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+
+    def result(self, job_id: str, index: int) -> Tuple[str, Optional[Dict], Optional[str]]:
+        """날짜 하나의 (상태, 결과, 오류)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, error FROM tasks WHERE job_id = ? AND date_index = ?", (job_id, index)
+            ).fetchone()
+        if row is None:
+            return "missing", None, None
+        status, result, error = row
+        return status, json.loads(result) if result is not None else None, error
+
+    def purge(self, job_id: str, include_leased: bool = False) -> None:
+        """API 서버가 결과를 받아 간 작업 삭제
+
+        include_leased=True이면 워커가 처리 중인 작업도 삭제 (요청이 실패/취소되어 결과를 받아 갈 곳이 없을 때).
+        처리 중이던 워커의 renew/complete는 행이 없으므로 아무것도 하지 않습니다.
+        """
+        statuses = ("done", "failed", "cancelled", "leased") if include_leased else ("done", "failed", "cancelled")
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM tasks WHERE job_id = ? AND status IN ({', '.join('?' * len(statuses))})",
+                (job_id, *statuses),
+            )
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+            workers = self._conn.execute(
+                "SELECT COUNT(DISTINCT worker_id) FROM tasks WHERE status = 'leased' AND lease_expires >= ?", (now,)
+            ).fetchone()[0]
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM tasks WHERE status = 'queued'").fetchone()[0]
+        return {
+            "path": str(self.path),
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts,
+            "tasks_by_status": counts,
+            "active_workers": workers,
+            "oldest_queued_seconds": round(now - oldest, 3) if oldest is not None else None,
+        }
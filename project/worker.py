@@ -0,0 +1,106 @@
+"""
+대화문 생성 워커 (main5.py를 LLM_EXECUTION_MODE=queue로 실행할 때 사용)
+
+API 서버가 큐(task_queue.py)에 넣은 날짜별 작업을 가져와 main5.py와 같은 방식
+(프롬프트 생성, 백엔드 선택/재시도/헤징, 캐시, 파싱)으로 대화문을 만들고 결과를 큐에 기록합니다.
+처리량은 uvicorn 프로세스가 아니라 워커 수로 늘립니다. 같은 큐 파일을 보는 워커를 원하는 만큼 띄우면 됩니다.
+
+- --concurrency: 워커 하나가 동시에 처리할 작업 수 (백엔드별 동시 처리 한도는 워커 프로세스마다 따로 적용됨)
+- 생성 중에는 임대를 주기적으로 연장하고, 종료(Ctrl+C)되면 처리 중이던 작업을 바로 큐에 돌려놓습니다.
+- 큐는 sqlite이고 다른 프로세스가 쓰기 잠금을 잡고 있으면 busy timeout까지 기다릴 수 있으므로, 큐 호출은 모두 스레드에서 실행해
+  한 슬롯의 대기가 다른 슬롯의 생성이나 임대 연장을 막지 않도록 합니다.
+
+실행 예시:
+    LLM_EXECUTION_MODE=queue uvicorn main5:app --port 8080
+    python worker.py --concurrency 2
+    LLM_QUEUE_PATH=/shared/task_queue.sqlite3 python worker.py --worker-id gpu-1
+"""
+import argparse
+import asyncio
+import os
+import socket
+import uuid
+from typing import Dict
+
+import httpx
+from fastapi import HTTPException
+
+import main5
+from task_queue import TaskQueue
+
+LLM_WORKER_CONCURRENCY = int(os.getenv("LLM_WORKER_CONCURRENCY", "1"))
+LLM_WORKER_POLL_INTERVAL = float(os.getenv("LLM_WORKER_POLL_INTERVAL", "0.5"))
+
+
+async def keep_leased(queue: TaskQueue, task_id: int, worker_id: str) -> None:
+    """생성이 끝날 때까지 임대 시간의 1/3마다 임대 연장"""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not await asyncio.to_thread(queue.renew, task_id, worker_id):
+            print(f"[{worker_id}] 작업 {task_id}의 임대가 만료되어 다른 워커에게 넘어갔거나 요청이 취소되었습니다.")
+            return
+
+
+async def process_task(queue: TaskQueue, worker_id: str, task: Dict) -> None:
+    task_id = task["task_id"]
+    renew_task = asyncio.create_task(keep_leased(queue, task_id, worker_id))
+    try:
+        conversation = await main5.generate_single_conversation(**task["payload"])
+    except asyncio.CancelledError:
+        await asyncio.to_thread(queue.fail, task_id, worker_id, "워커 종료", True) # 다른 워커가 바로 가져갈 수 있도록 반환
+        raise
+    except HTTPException as e:
+        # 백엔드 재시도를 모두 쓴 실패도 다른 워커(다른 백엔드 상태)에서는 성공할 수 있으므로 큐 시도 횟수까지 다시 시도
+        print(f"[{worker_id}] 작업 {task_id} ({task['payload']['formatted_date']}) 실패 ({task['attempt']}번째 시도): {e.detail}")
+        await asyncio.to_thread(queue.fail, task_id, worker_id, str(e.detail))
+    except Exception as e:
+        print(f"[{worker_id}] 작업 {task_id} 처리 중 오류: {e!r}")
+        await asyncio.to_thread(queue.fail, task_id, worker_id, f"대화 생성 중 오류 발생: {e}")
+    else:
+        await asyncio.to_thread(queue.complete, task_id, worker_id, conversation)
+    finally:
+        renew_task.cancel()
+
+
+async def worker_slot(queue: TaskQueue, worker_id: str, poll_interval: float) -> None:
+    while True:
+        task = await asyncio.to_thread(queue.claim, worker_id)
+        if task is None:
+            await asyncio.sleep(poll_interval)
+            continue
+        await process_task(queue, worker_id, task)
+
+
+async def run_worker(worker_id: str, concurrency: int, poll_interval: float) -> None:
+    queue = TaskQueue()
+    # main5의 LLM 호출 함수가 쓰는 공유 클라이언트를 워커 프로세스에서 직접 생성
+    main5.app.state.lm_client = httpx.AsyncClient(
+        timeout=300.0,
+        limits=httpx.Limits(
+            max_connections=main5.LM_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=main5.LM_CLIENT_MAX_KEEPALIVE,
+        ),
+    )
+    health_task = asyncio.create_task(main5.llm_registry.health_check_loop(main5.app.state.lm_client))
+    print(f"[{worker_id}] 워커 시작 (큐: {queue.path}, 동시 처리: {concurrency})")
+    try:
+        await asyncio.gather(*(worker_slot(queue, worker_id, poll_interval) for _ in range(concurrency)))
+    finally:
+        health_task.cancel()
+        await main5.app.state.lm_client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="작업 큐에서 날짜별 대화문 생성 작업을 가져와 처리하는 워커")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}")
+    parser.add_argument("--concurrency", type=int, default=LLM_WORKER_CONCURRENCY, help="동시에 처리할 작업 수")
+    parser.add_argument("--poll-interval", type=float, default=LLM_WORKER_POLL_INTERVAL, help="큐가 비었을 때 다시 확인하는 간격(초)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_worker(args.worker_id, max(1, args.concurrency), args.poll_interval))
+    except KeyboardInterrupt:
+        print(f"[{args.worker_id}] 워커 종료")
+
+
+if __name__ == "__main__":
+    main()
@@ -128,8 +128,10 @@ if submitted:
             "situation": situation, # Use the text input value
             "start_timestamp": start_date_str,
             "step_days": step_days,
-            "num_conversations": num_conversations
+            "num_conversations": num_conversations,
+            "stream_mode": "utterance" # Receive each utterance as soon as it is generated
         }
+        current_utterances = [] # Utterances of the conversation currently being generated
 
         fastapi_stream_endpoint = f"{FASTAPI_URL}/generate-stream/"
 
@@ -154,6 +156,24 @@ if submitted:
                             elif chunk.get("status") == "complete":
                                 progress_container.success(chunk.get("message"))
                                 break
+                            elif chunk.get("status") == "utterance":
+                                current_utterances.append({
+                                    "speaker": chunk.get("speaker"),
+                                    "content": chunk.get("content"),
+                                    "emotions": chunk.get("emotions", [])
+                                })
+                                with report_placeholder.container():
+                                    render_conversations_report(
+                                        st.session_state.full_report_data
+                                        + [{"timestamp": chunk.get("timestamp"), "conversation": current_utterances}]
+                                    )
+                            elif chunk.get("status") == "conversation_summary":
+                                summary = {k: v for k, v in chunk.items() if k != "status"}
+                                st.session_state.full_report_data.append({**summary, "conversation": current_utterances})
+                                current_utterances = []
+                                with report_placeholder.container():
+                                    render_conversations_report(st.session_state.full_report_data)
+                                st.rerun() # Keep rerun for real-time updates as discussed
                             else: # Actual conversation data chunk
                                 st.session_state.full_report_data.append(chunk)
                                 with report_placeholder.container():
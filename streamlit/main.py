@@ -1,16 +1,92 @@
-from fastapi import FastAPI, HTTPException, Response, Query
+from fastapi import FastAPI, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
 import random
 import json
 import httpx # Use httpx for async requests
-from typing import Literal, List, Dict, Union, AsyncGenerator
+from typing import Literal, List, Dict, Union, AsyncGenerator, Optional
+from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
 import asyncio # Import asyncio for async operations
 import os # For saving files
-
-app = FastAPI()
+import math
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# The LLM client modules (backends, retry, cache, admission, ...) are shared with the project/ apps as the
+# project/llm_common package. Inserted first so an unrelated installed `llm_common` can't shadow it; everything
+# is imported through the package name, so project/'s own scripts (main.py, ...) are never picked up by accident.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "project"))
+
+from llm_common.llm_backends import Backend, BackendRegistry, CircuitOpenError, build_chat_payload, extract_stream_delta
+from llm_common.llm_cache import ResponseCache, make_cache_key
+from llm_common.llm_retry import RetryPolicy
+from llm_common.admission import AdmissionController, AdmissionRejected
+from llm_common.checkpoint import CheckpointConflictError, CheckpointStore
+from llm_common.hedging import HedgePolicy
+from llm_common.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, LLM_TIME_TO_FIRST_TOKEN, MetricsMiddleware, observe_generation, observe_parse_yield, registry as metrics_registry, track_generation
+from llm_common.singleflight import StreamFlight
+from llm_common.token_budget import TokenBudget
+from llm_common.sse_decoder import StreamDecoder
+from llm_common.utterance_parser import UtteranceParser
+
+try:
+    import h2 # noqa: F401 - HTTP/2 support for httpx is optional
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection pool settings for the shared LM Studio client (tunable via environment variables)
+LM_CLIENT_MAX_CONNECTIONS = int(os.getenv("LM_CLIENT_MAX_CONNECTIONS", "20"))
+LM_CLIENT_MAX_KEEPALIVE = int(os.getenv("LM_CLIENT_MAX_KEEPALIVE", "10"))
+LM_CLIENT_KEEPALIVE_EXPIRY = float(os.getenv("LM_CLIENT_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 is negotiated via ALPN, so it only takes effect for https backends and when `h2` is installed
+LM_CLIENT_HTTP2 = os.getenv("LM_CLIENT_HTTP2", "true").lower() in ("1", "true", "yes") and HTTP2_AVAILABLE
+
+# Per-backend connection counters, filled in by the httpcore trace hook
+connection_metrics: Dict[str, Dict[str, int]] = {}
+
+def make_connection_tracer(backend_url: str):
+    """Return an httpcore trace callback that counts requests and newly opened connections for a backend."""
+    stats = connection_metrics.setdefault(
+        backend_url, {"requests": 0, "new_connections": 0, "http2_requests": 0}
+    )
+
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            stats["new_connections"] += 1
+        elif event_name == "http11.send_request_headers.started":
+            stats["requests"] += 1
+        elif event_name == "http2.send_request_headers.started":
+            stats["requests"] += 1
+            stats["http2_requests"] += 1
+
+    return trace
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create one pooled LM Studio client for all streaming generations and close it on shutdown."""
+    app.state.lm_client = httpx.AsyncClient(
+        timeout=300.0,
+        http2=LM_CLIENT_HTTP2,
+        limits=httpx.Limits(
+            max_connections=LM_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=LM_CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=LM_CLIENT_KEEPALIVE_EXPIRY,
+        ),
+    )
+    health_task = asyncio.create_task(llm_registry.health_check_loop(app.state.lm_client))
+    await asyncio.to_thread(checkpoint_store.prune)
+    yield
+    health_task.cancel()
+    await app.state.lm_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-endpoint request counts and latency for /metrics (streaming responses are timed to their last chunk)
+app.add_middleware(MetricsMiddleware)
 
 origins = [
     "*", # Streamlit's default port
@@ -24,7 +100,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-LM_STUDIO_API_URL = "http://localhost:1234/v1/chat/completions" # Ensure this is correct for your LM Studio setup
+LM_STUDIO_API_URL = os.getenv("LM_STUDIO_API_URL", "http://localhost:1234/v1/chat/completions") # Ensure this is correct for your LM Studio setup
+LM_STUDIO_MODEL = "eeve-korean-instruct-10.8b-v1.0"
+
+# Inference backends to route across (falls back to LM_STUDIO_API_URL when LLM_BACKENDS is not set)
+llm_registry = BackendRegistry.from_env(LM_STUDIO_API_URL, default_model=LM_STUDIO_MODEL)
+
+# Retries transient backend failures with jittered exponential backoff (LLM_RETRY_* environment variables)
+retry_policy = RetryPolicy()
+
+# Races a slow generation against a duplicate on another backend once it passes the observed latency percentile (LLM_HEDGE_* environment variables)
+hedge_policy = HedgePolicy()
+
+# Two-tier (memory LRU + disk) cache of full generations, keyed on the normalized prompt and sampling params
+response_cache = ResponseCache()
+
+# Identical concurrent /generate-stream/ requests share one generation and receive the same NDJSON chunks
+stream_flight = StreamFlight()
+
+# max_tokens sized from observed completion tokens per parsed utterance, per (model, situation)
+token_budget = TokenBudget()
+
+# Global and per-client caps on in-flight generations and pending dates; excess requests get 429 + Retry-After (LLM_ADMISSION_* environment variables)
+admission = AdmissionController()
+
+# Completed dates are checkpointed to SQLite under the request's job_id so a retried request only generates what is missing (LLM_CHECKPOINT_* environment variables)
+checkpoint_store = CheckpointStore()
 
 AGE_GROUPS = {
     "teenager": (13, 19),
@@ -41,6 +142,7 @@ SITUATION_OPTIONS = {
 }
 
 EMOTIONS = ["기쁨", "분노", "슬픔", "두려움", "놀람"]
+utterance_parser = UtteranceParser(EMOTIONS) # Single-pass line parser with per-reason error counters
 
 class UserInput(BaseModel):
     person_name: str = Field(..., description="대화할 사람의 이름")
@@ -50,6 +152,16 @@ class UserInput(BaseModel):
     start_timestamp: datetime = Field(datetime(2025, 6, 1), description="대화문 생성 기준 시작 타임스탬프 (기본값: 2025-06-01)")
     step_days: int = Field(..., ge=1, description="대화문 생성 간격 (일 단위)")
     num_conversations: int = Field(..., ge=1, description="생성할 대화문의 갯수")
+    use_cache: bool = Field(True, description="같은 조건으로 생성한 결과가 캐시에 있거나 같은 요청이 처리 중이면 재사용 (False면 항상 새로 생성)")
+    seed: Optional[int] = Field(None, description="지정하면 같은 입력에 대해 항상 같은 프롬프트/샘플링 시드를 사용 (재현 가능한 생성)")
+    stream_mode: Literal["conversation", "utterance"] = Field(
+        "conversation",
+        description="conversation: 대화 하나가 끝날 때마다 전송, utterance: 발화가 완성될 때마다 전송한 뒤 대화별 요약 전송"
+    )
+    job_id: Optional[str] = Field(None, min_length=1, max_length=128, description="지정하면 날짜별 결과를 체크포인트로 저장하고, 같은 job_id로 다시 요청하면 남은 날짜만 생성")
+
+# Options that do not change the generated conversations, so a job can be resumed with different values
+CHECKPOINT_IGNORED_FIELDS = {"use_cache", "stream_mode"}
 
 def get_age_group(age: int) -> str:
     if 13 <= age <= 19:
@@ -63,136 +175,269 @@ def get_age_group(age: int) -> str:
     else:
         return "not_target"
 
+def make_request_rng(seed: Optional[int], key: str) -> random.Random:
+    """Isolated RNG for one conversation: deterministic for a given (seed, key), randomly seeded when seed is None."""
+    return random.Random(f"{seed}:{key}") if seed is not None else random.Random()
+
+# Instructions shared by every request, kept at the very start of the prompt. Per-request values
+# (name, date, emotion, ...) are only appended after it so prefix-caching backends can reuse its KV cache.
+# Editing this text invalidates every backend's prompt cache once.
+PROMPT_INSTRUCTIONS = """당신은 공감형 대화 생성 전문가 입니다. 아래 지침과 마지막의 대화 정보를 바탕으로 챗봇과 대화 상대 간의 자연스럽고 **다채로운 대화문**을 생성해주세요.
+**중복되는 대화 패턴이나 어조는 최대한 피하고, 창의적인 대화 흐름을 만들어 주세요.**
+
+---
+**대화 지침:**
+- **대화 목표:** 대화 상대와의 자연스러운 대화 흐름을 유지합니다.
+- **감정:** 대화 정보의 '주된 감정'이 대화 전반에 걸쳐 자연스럽게 드러나도록 해주세요. 하지만, 대화의 맥락과 흐름에 따라 **다른 감정들도 자연스럽게 나타날 수 있도록** 복합적인 감정 표현을 시도해주세요. 하나의 감정에만 고정되지 않도록 해주세요.
+
+---
+**대화 형식:**
+각 발화는 '참여자: [내용] | 감정: [감정1], [감정2]' 형식으로 표현해주세요. 참여자는 '사용자' 또는 대화 상대의 이름입니다. 감정은 쉼표로 구분하여 여러 개를 표현할 수 있습니다.
+5개의 감정을 순차적으로 표현해주세요.
+예시:
+사용자: 안녕하세요! 오늘 하루는 어떠셨어요? | 감정: 기쁨
+(대화 상대 이름): 아, 네. 그냥 그랬어요. 좀 피곤하네요. | 감정: 슬픔, 피곤
+"""
+
 def generate_prompt(
     person_name: str,
     age_group: str,
     gender: str,
     situation: str,
     conversation_length_minutes: int,
-    current_date: str
+    current_date: str,
+    rng: Optional[random.Random] = None
 ) -> tuple[str, int]:
-    num_utterances = random.randint(conversation_length_minutes * 10, conversation_length_minutes * 11)
+    """Build the prompt as PROMPT_INSTRUCTIONS plus a per-request tail, with the per-date values (date, length, emotion) last."""
+    rng = rng or random
+    num_utterances = rng.randint(conversation_length_minutes * 10, conversation_length_minutes * 11)
     
-    selected_emotion = random.choice(EMOTIONS) # 주된 감정 하나 선택
-
-    prompt = f"""
-    당신은 공감형 대화 생성 전문가 입니다. 아래 정보를 바탕으로 챗봇과 {person_name} 간의 자연스럽고 **다채로운 대화문**을 생성해주세요.
-    **중복되는 대화 패턴이나 어조는 최대한 피하고, 창의적인 대화 흐름을 만들어 주세요.**
-
-    ---
-    **대화 정보:**
-    - **참여자:** 챗봇과 {person_name}
-    - **{person_name} 정보:**
-        - **이름:** {person_name}
-        - **나이:** {age_group} 그룹
-        - **성별:** {gender}
-    - **상황:** {situation}
-    - **현재 날짜:** {current_date}
-    - **대화 목표:** {person_name}과의 자연스러운 대화 흐름을 유지합니다.
-    - **대화 길이:** 약 {conversation_length_minutes}분 (총 {num_utterances}개 내외의 발화)
-    - **포함될 감정:** 이 대화의 주된 감정은 '{selected_emotion}'입니다. 대화 전반에 걸쳐 이 감정이 자연스럽게 드러나도록 해주세요. 하지만, 대화의 맥락과 흐름에 따라 **다른 감정들도 자연스럽게 나타날 수 있도록** 복합적인 감정 표현을 시도해주세요. 하나의 감정에만 고정되지 않도록 해주세요.
-
-    ---
-    **대화 형식:**
-    각 발화는 '참여자: [내용] | 감정: [감정1], [감정2]' 형식으로 표현해주세요. 감정은 쉼표로 구분하여 여러 개를 표현할 수 있습니다. 
-    5개의 감정을 순차적으로 표현해주세요.
-    예시:
-    사용자: 안녕하세요! 오늘 하루는 어떠셨어요? | 감정: 기쁨
-    {person_name}: 아, 네. 그냥 그랬어요. 좀 피곤하네요. | 감정: 슬픔, 피곤
-
-    ---
-    **대화 시작:**
-    사용자: 안녕하세요, {person_name}님. 요즘 {situation} 관련해서 어떠신지 궁금해서요.
-    {person_name}:
-    """
+    selected_emotion = rng.choice(EMOTIONS) # 주된 감정 하나 선택
+
+    prompt = PROMPT_INSTRUCTIONS + f"""
+---
+**대화 정보:**
+- **참여자:** 챗봇과 {person_name}
+- **{person_name} 정보:**
+    - **이름:** {person_name}
+    - **나이:** {age_group} 그룹
+    - **성별:** {gender}
+- **상황:** {situation}
+- **{person_name}의 발화 형식:** {person_name}: [내용] | 감정: [감정1], [감정2]
+- **현재 날짜:** {current_date}
+- **대화 길이:** 약 {conversation_length_minutes}분 (총 {num_utterances}개 내외의 발화)
+- **주된 감정:** {selected_emotion}
+
+---
+**대화 시작:**
+사용자: 안녕하세요, {person_name}님. 요즘 {situation} 관련해서 어떠신지 궁금해서요.
+{person_name}:
+"""
     return prompt, num_utterances
 
-async def call_lm_studio_stream(prompt: str, max_tokens: int) -> AsyncGenerator[str, None]:
+# Per-backend totals from the stream decoder (malformed events, invalid UTF-8 lines, bytes read)
+stream_decode_metrics: Dict[str, Dict[str, int]] = {}
+
+def record_decode_stats(backend_url: str, stats: Dict[str, int]) -> None:
+    totals = stream_decode_metrics.setdefault(backend_url, {"streams": 0})
+    totals["streams"] += 1
+    for name, value in stats.items():
+        totals[name] = totals.get(name, 0) + value
+
+async def decode_stream_events(response: httpx.Response, decoder: StreamDecoder) -> AsyncGenerator[Dict, None]:
+    """Feed raw response bytes through the decoder, yielding complete JSON events (including any left at end of stream)."""
+    async for chunk in response.aiter_bytes():
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.close():
+        yield event
+
+async def stream_from_backend(backend: Backend, messages: List[Dict], max_tokens: int, sampling: Dict) -> AsyncGenerator[str, None]:
+    """One streaming attempt against a single backend, yielding text deltas."""
     headers = {"Content-Type": "application/json"}
-    payload = {
-        "model": "eeve-korean-instruct-10.8b-v1.0",
-        "messages": [
-            {"role": "system", "content": "You are a helpful AI assistant."},
-            {"role": "user", "content": prompt},
-        ],
-        "max_tokens": max_tokens,
-        "temperature": 0.7,
-        "stream": True
-    }
-    
-    async with httpx.AsyncClient(timeout=300.0) as client:
+    payload = build_chat_payload(backend, LM_STUDIO_MODEL, messages, max_tokens, stream=True, **sampling)
+    loop = asyncio.get_running_loop()
+    with llm_registry.track(backend), track_generation(backend.name, payload["model"]):
+        started = loop.time()
+        delta_count = 0
         try:
-            async with client.stream("POST", LM_STUDIO_API_URL, headers=headers, json=payload, timeout=None) as r:
+            # The read timeout bounds the wait between chunks, so a stalled stream fails instead of hanging
+            async with app.state.lm_client.stream(
+                "POST", backend.chat_url(), headers=headers, json=payload, timeout=retry_policy.timeout(),
+                extensions={"trace": make_connection_tracer(backend.url)},
+            ) as r:
+                if r.is_error:
+                    await r.aread() # Load the error body so it can be reported by the caller
                 r.raise_for_status()
-                async for chunk in r.aiter_bytes():
-                    try:
-                        chunk_str = chunk.decode("utf-8")
-                        for line in chunk_str.splitlines():
-                            if line.startswith("data: "):
-                                json_data = line[len("data: "):]
-                                if json_data.strip() == "[DONE]":
-                                    continue
-                                try:
-                                    data = json.loads(json_data)
-                                    if "choices" in data and data["choices"]:
-                                        delta = data["choices"][0]["delta"]
-                                        if "content" in delta:
-                                            yield delta["content"]
-                                except json.JSONDecodeError:
-                                    print(f"Invalid JSON chunk from LM Studio: {json_data}")
-                                    continue
-                    except UnicodeDecodeError:
-                        print(f"UnicodeDecodeError on chunk from LM Studio: {chunk}")
-                        continue
-        except httpx.RequestError as exc:
-            raise HTTPException(status_code=500, detail=f"LM Studio API 요청 중 오류 발생: {exc}. LM Studio 서버가 실행 중인지 확인해주세요.")
-        except httpx.HTTPStatusError as exc:
-            raise HTTPException(status_code=500, detail=f"LM Studio API 응답 오류: {exc.response.status_code} - {exc.response.text}")
-
-def parse_conversation_data(raw_text: str, person_name: str, total_utterances_expected: int) -> List[Dict]:
-    parsed_data = []
-    lines = raw_text.strip().split('\n')
-    
-    for line in lines:
-        if ':' in line and '|' in line:
-            try:
-                parts = line.split('|')
-                speaker_content = parts[0].strip()
-                emotion_content = parts[1].strip()
-
-                speaker_name, content = speaker_content.split(':', 1)
-                speaker_name = speaker_name.strip()
-                content = content.strip()
-
-                emotions_str = emotion_content.replace('감정:', '').strip()
-                emotions = [e.strip() for e in emotions_str.split(',') if e.strip() in EMOTIONS]
-
-                if speaker_name in ["사용자", person_name]:
-                    parsed_data.append({
-                        "speaker": speaker_name,
-                        "content": content,
-                        "emotions": emotions if emotions else [random.choice(EMOTIONS)]
-                    })
-            except Exception as e:
-                print(f"Error parsing line: '{line}' - {e}")
+                # OpenAI-compatible servers send SSE "data: " events, Ollama sends plain NDJSON lines
+                decoder = StreamDecoder("ndjson" if backend.kind == "ollama" else "sse")
+                try:
+                    async for event in decode_stream_events(r, decoder):
+                        content = extract_stream_delta(backend, event)
+                        if content:
+                            if delta_count == 0:
+                                LLM_TIME_TO_FIRST_TOKEN.observe(loop.time() - started, backend=backend.name, model=payload["model"])
+                            delta_count += 1
+                            yield content
+                finally:
+                    record_decode_stats(backend.url, decoder.stats)
+        except GeneratorExit:
+            # The caller stopped early because it had enough utterances; that is still a successful generation
+            observe_generation(backend.name, payload["model"], loop.time() - started, delta_count)
+            raise
+        # Each streamed delta is roughly one token, which is close enough for routing decisions
+        backend.observe(delta_count, loop.time() - started)
+        observe_generation(backend.name, payload["model"], loop.time() - started, delta_count)
+
+async def call_lm_studio_stream(
+    prompt: str,
+    max_tokens: int,
+    use_cache: bool = True,
+    seed: Optional[int] = None,
+    usage: Optional[Dict] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Stream generated text from the routed backend (or replay it from the cache).
+    If `usage` is given it is kept up to date with the streamed delta count as "completion_tokens" and whether the result was "cached",
+    so it is meaningful even when the caller stops reading early.
+    Transient failures are retried on a freshly picked backend as long as nothing has been yielded yet;
+    once text has been streamed a failure is raised, since the caller has already consumed part of it.
+    With hedging enabled, an attempt that has not produced its first tokens by the latency threshold is raced
+    against a duplicate on another backend, and the slower stream is cancelled.
+    The text is cached when the stream ends, or when the caller closes it early after setting usage["complete"] = True
+    (it already has everything it needs, e.g. enough utterances); then the consumed text so far is cached, so a replay
+    yields the same result. Any other early close (client disconnect, error) caches nothing.
+    """
+    usage = usage if usage is not None else {}
+    messages = [
+        {"role": "system", "content": "You are a helpful AI assistant."},
+        {"role": "user", "content": prompt},
+    ]
+    sampling = {"temperature": 0.7}
+    if seed is not None:
+        sampling["seed"] = seed # Backend sampling seed, so supporting servers replay the same output
+    cache_key = make_cache_key(LM_STUDIO_MODEL, messages, max_tokens=max_tokens, **sampling)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            usage.update(completion_tokens=0, cached=True)
+            yield cached
+            return
+
+    attempt = 0
+    delta_count = 0
+    while True:
+        try:
+            backend = llm_registry.pick()
+        except CircuitOpenError as exc:
+            retry_policy.stats["circuit_open"] += 1
+            raise HTTPException(status_code=503, detail=f"LM Studio API 요청 중 오류 발생: {exc}", headers={"Retry-After": str(math.ceil(exc.retry_after))})
+        retry_policy.stats["attempts"] += 1
+
+        def hedge_stream():
+            alternative = llm_registry.pick_alternative(backend.name)
+            return stream_from_backend(alternative, messages, max_tokens, sampling) if alternative else None
+
+        attempt_stream = hedge_policy.stream(lambda: stream_from_backend(backend, messages, max_tokens, sampling), hedge_stream)
+        generated_parts = []
+        finished = False
+        try:
+            async for content in attempt_stream:
+                delta_count += 1
+                usage.update(completion_tokens=delta_count, cached=False)
+                generated_parts.append(content)
+                yield content
+            finished = True
+            return
+        except httpx.HTTPError as exc:
+            if delta_count == 0 and retry_policy.should_retry(exc, attempt):
+                print(f"LM Studio stream failed on {backend.name} (attempt {attempt + 1}): {exc!r}; retrying")
+                await retry_policy.backoff(attempt)
+                attempt += 1
                 continue
-    
+            if isinstance(exc, httpx.HTTPStatusError):
+                raise HTTPException(status_code=500, detail=f"LM Studio API 응답 오류: {exc.response.status_code} - {exc.response.text}")
+            raise HTTPException(status_code=500, detail=f"LM Studio API 요청 중 오류 발생: {exc}. LM Studio 서버가 실행 중인지 확인해주세요 ({backend.url}).")
+        finally:
+            # Closes the upstream stream(s) even when the caller stops reading early
+            await attempt_stream.aclose()
+            if use_cache and generated_parts and (finished or usage.get("complete")):
+                response_cache.set(cache_key, "".join(generated_parts))
+
+def extract_utterances(raw_text: str, person_name: str, rng: Optional[random.Random] = None) -> List[Dict]:
+    """Parse well-formed '참여자: 내용 | 감정: ...' lines without adjusting the utterance count."""
+    return utterance_parser.parse(raw_text, person_name, rng)
+
+class IncrementalUtteranceParser:
+    """Parse streamed LLM deltas into utterances as soon as each line is complete."""
+
+    def __init__(self, person_name: str, rng: Optional[random.Random] = None):
+        self.person_name = person_name
+        self.rng = rng
+        self.buffer = ""
+        self.utterances: List[Dict] = []
+
+    def feed(self, text: str) -> List[Dict]:
+        """Add a delta and return the utterances completed by it."""
+        self.buffer += text
+        *complete_lines, self.buffer = self.buffer.split('\n')
+        return self._parse_lines(complete_lines)
+
+    def close(self) -> List[Dict]:
+        """Parse whatever is left after the stream ends (the last line has no trailing newline)."""
+        remaining, self.buffer = self.buffer, ""
+        return self._parse_lines([remaining])
+
+    def _parse_lines(self, lines: List[str]) -> List[Dict]:
+        new_utterances = extract_utterances("\n".join(lines), self.person_name, self.rng)
+        self.utterances.extend(new_utterances)
+        return new_utterances
+
+def fit_utterance_count(parsed_data: List[Dict], total_utterances_expected: int, rng: Optional[random.Random] = None) -> List[Dict]:
+    """Trim or pad the parsed utterances toward the expected count."""
+    rng = rng or random
     current_utterances = len(parsed_data)
     if current_utterances > total_utterances_expected * 1.5:
         parsed_data = parsed_data[:int(total_utterances_expected * 1.2)]
     elif current_utterances < total_utterances_expected * 0.5:
         if parsed_data:
             while len(parsed_data) < total_utterances_expected * 0.8:
-                parsed_data.extend(random.sample(parsed_data, k=min(len(parsed_data), 5)))
+                parsed_data.extend(rng.sample(parsed_data, k=min(len(parsed_data), 5)))
 
     return parsed_data
 
+def parse_conversation_data(raw_text: str, person_name: str, total_utterances_expected: int, rng: Optional[random.Random] = None) -> List[Dict]:
+    return fit_utterance_count(extract_utterances(raw_text, person_name, rng), total_utterances_expected, rng)
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Empathy Conversation Generator API (FastAPI Server)!"}
 
+def utterance_record(timestamp: str, index: int, utterance: Dict, padded: bool = False) -> str:
+    """NDJSON line for a single utterance in stream_mode="utterance"."""
+    record = {"status": "utterance", "timestamp": timestamp, "index": index, **utterance}
+    if padded:
+        record["padded"] = True
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def checkpoint_lines(conversation: Dict, per_utterance: bool) -> List[str]:
+    """NDJSON lines that replay a checkpointed conversation in the requested stream_mode."""
+    if not per_utterance:
+        lines = [json.dumps(conversation, ensure_ascii=False) + "\n"]
+    else:
+        lines = [
+            utterance_record(conversation["timestamp"], index, utterance)
+            for index, utterance in enumerate(conversation["conversation"])
+        ]
+        summary = {key: value for key, value in conversation.items() if key != "conversation"}
+        lines.append(json.dumps({"status": "conversation_summary", **summary}, ensure_ascii=False) + "\n")
+    lines.append(json.dumps({"status": "progress", "message": f"날짜 {conversation['timestamp']} 대화 생성 완료."}, ensure_ascii=False) + "\n")
+    return lines
+
 @app.post("/generate-stream/")
-async def generate_conversation_stream_endpoint(user_input: UserInput):
+async def generate_conversation_stream_endpoint(user_input: UserInput, request: Request):
+    ticket = None
+
     async def generate_chunks():
         person_name = user_input.person_name
         age = user_input.age
@@ -205,30 +450,82 @@ async def generate_conversation_stream_endpoint(user_input: UserInput):
 
         yield json.dumps({"status": "generating", "message": "대화 생성을 시작합니다..."}, ensure_ascii=False) + "\n"
 
+        job_id = user_input.job_id
+        completed: Dict[int, Dict] = {}
+        if job_id is not None:
+            try:
+                checkpoint_request = user_input.model_dump(mode="json", exclude={"job_id"})
+                completed = await asyncio.to_thread(
+                    checkpoint_store.start_job, job_id, checkpoint_request, num_conversations, "request",
+                    CHECKPOINT_IGNORED_FIELDS,
+                )
+            except CheckpointConflictError as e:
+                yield json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+                return
+
         for i in range(num_conversations):
+            if i in completed:
+                # Generated by an earlier run of this job_id: replay the checkpoint instead of calling the LLM
+                if ticket is not None:
+                    ticket.date_done()
+                for line in checkpoint_lines(completed[i], user_input.stream_mode == "utterance"):
+                    yield line
+                continue
+
             current_date = start_timestamp + timedelta(days=i * step_days)
             formatted_date = current_date.strftime("%Y-%m-%d")
 
-            conversation_length_minutes = random.randint(5, 10)
+            rng = make_request_rng(user_input.seed, formatted_date)
+            conversation_length_minutes = rng.randint(5, 10)
             prompt, total_expected_utterances = generate_prompt(
-                person_name, age_group, gender, situation, conversation_length_minutes, formatted_date
+                person_name, age_group, gender, situation, conversation_length_minutes, formatted_date, rng
             )
+            backend_seed = rng.randrange(2**31) if user_input.seed is not None else None
             
-            max_tokens_for_lm = total_expected_utterances * 50 
-
-            full_lm_response_content = ""
+            max_tokens_for_lm = token_budget.budget(LM_STUDIO_MODEL, situation, total_expected_utterances, total_expected_utterances * 50)
+            usage = {}
+
+            # Stop reading (and close the upstream request) once we have as many utterances as
+            # fit_utterance_count would keep anyway; anything after that would be discarded.
+            utterance_target = int(total_expected_utterances * 1.2)
+            parser = IncrementalUtteranceParser(person_name, rng)
+            per_utterance = user_input.stream_mode == "utterance"
+            streamed = 0
+            lm_stream = call_lm_studio_stream(prompt, max_tokens_for_lm, user_input.use_cache, backend_seed, usage)
             try:
-                async for content_chunk in call_lm_studio_stream(prompt, max_tokens_for_lm):
-                    full_lm_response_content += content_chunk
+                async for content_chunk in lm_stream:
+                    new_utterances = parser.feed(content_chunk)
+                    if per_utterance:
+                        for utterance in new_utterances[:utterance_target - streamed]:
+                            yield utterance_record(formatted_date, streamed, utterance)
+                            streamed += 1
+                    if len(parser.utterances) >= utterance_target:
+                        usage["complete"] = True # Lets call_lm_studio_stream cache the text read so far
+                        break
+                else:
+                    new_utterances = parser.close()
+                    if per_utterance:
+                        for utterance in new_utterances[:utterance_target - streamed]:
+                            yield utterance_record(formatted_date, streamed, utterance)
+                            streamed += 1
             except HTTPException as e:
+                if job_id is not None:
+                    await asyncio.to_thread(checkpoint_store.set_status, job_id, "failed", str(e.detail))
                 yield json.dumps({"status": "error", "message": str(e.detail)}, ensure_ascii=False) + "\n"
                 return
             except Exception as e:
+                if job_id is not None:
+                    await asyncio.to_thread(checkpoint_store.set_status, job_id, "failed", str(e))
                 yield json.dumps({"status": "error", "message": f"LM Studio 응답 처리 중 오류 발생: {e}"}, ensure_ascii=False) + "\n"
                 return
-
-            parsed_conversation = parse_conversation_data(full_lm_response_content, person_name, total_expected_utterances)
-            
+            finally:
+                # Closing the generator exits the httpx stream context, which drops the upstream connection
+                await lm_stream.aclose()
+
+            utterances = parser.utterances[:utterance_target]
+            observe_parse_yield(len(utterances), total_expected_utterances)
+            token_budget.record(LM_STUDIO_MODEL, situation, usage.get("completion_tokens", 0), len(utterances))
+            parsed_conversation = fit_utterance_count(utterances, total_expected_utterances, rng)
             conversation_data_chunk = {
                 "timestamp": formatted_date,
                 "person_name": person_name,
@@ -240,13 +537,65 @@ async def generate_conversation_stream_endpoint(user_input: UserInput):
                 "total_utterances_generated": len(parsed_conversation),
                 "conversation": parsed_conversation
             }
+            if job_id is not None:
+                # The store fsyncs every commit; keep it off the event loop
+                await asyncio.to_thread(checkpoint_store.save, job_id, i, conversation_data_chunk)
+            if ticket is not None:
+                ticket.date_done()
+
+            if per_utterance:
+                # Utterances added by fit_utterance_count's padding were never streamed; send them now
+                for utterance in parsed_conversation[streamed:]:
+                    yield utterance_record(formatted_date, streamed, utterance, padded=True)
+                    streamed += 1
+                yield json.dumps({
+                    "status": "conversation_summary",
+                    "timestamp": formatted_date,
+                    "person_name": person_name,
+                    "age": age,
+                    "gender": gender,
+                    "situation": situation,
+                    "conversation_length_minutes": conversation_length_minutes,
+                    "total_utterances_expected": total_expected_utterances,
+                    "total_utterances_generated": len(parsed_conversation),
+                }, ensure_ascii=False) + "\n"
+                yield json.dumps({"status": "progress", "message": f"날짜 {formatted_date} 대화 생성 완료."}, ensure_ascii=False) + "\n"
+                continue
+            
             yield json.dumps(conversation_data_chunk, ensure_ascii=False) + "\n"
             
             yield json.dumps({"status": "progress", "message": f"날짜 {formatted_date} 대화 생성 완료."}, ensure_ascii=False) + "\n"
 
+        if job_id is not None:
+            await asyncio.to_thread(checkpoint_store.set_status, job_id, "succeeded")
         yield json.dumps({"status": "complete", "message": "모든 대화 생성이 완료되었습니다."}, ensure_ascii=False) + "\n"
 
-    return StreamingResponse(generate_chunks(), media_type="application/x-ndjson")
+    async def admitted_chunks():
+        # Release the admission slot however the generation ends (complete, error line, or closed early)
+        try:
+            async for chunk in generate_chunks():
+                yield chunk
+        finally:
+            ticket.release()
+
+    request_key = json.dumps(user_input.model_dump(mode="json"), ensure_ascii=False, sort_keys=True)
+    if user_input.use_cache and stream_flight.in_flight(request_key):
+        # Joining a generation already in flight adds no backend load, so it bypasses admission control
+        return StreamingResponse(stream_flight.subscribe(request_key, generate_chunks), media_type="application/x-ndjson")
+
+    client = request.headers.get("X-Client-Id") or (request.client.host if request.client else "unknown")
+    try:
+        ticket = admission.admit(client, user_input.num_conversations)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+    if user_input.use_cache:
+        # subscribe registers the flight before returning, so an identical request arriving next joins it
+        # without taking a ticket; the flight's own task drives admitted_chunks, whose finally releases this one
+        return StreamingResponse(stream_flight.subscribe(request_key, admitted_chunks), media_type="application/x-ndjson")
+    # A generator that is never iterated (client gone before the body starts) never reaches its finally,
+    # so the response's background task releases the ticket too (release is idempotent)
+    return StreamingResponse(admitted_chunks(), media_type="application/x-ndjson", background=BackgroundTask(ticket.release))
 
 @app.post("/save-conversations/")
 async def save_conversations(data: Dict[str, List[Dict]]):
@@ -323,6 +672,86 @@ async def save_user_utterances(data: Dict[str, List[Dict]]):
         raise HTTPException(status_code=500, detail=f"파일 저장 중 오류 발생: {e}")
 
 
+@app.get("/connection-metrics/")
+async def get_connection_metrics():
+    """
+    Report per-backend connection reuse for the shared LM Studio client.
+    A reuse ratio close to 1.0 means requests are riding on kept-alive connections.
+    """
+    backends = {}
+    for backend_url, stats in connection_metrics.items():
+        requests_sent = stats["requests"]
+        reused = max(requests_sent - stats["new_connections"], 0)
+        backends[backend_url] = {
+            **stats,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / requests_sent, 3) if requests_sent else None,
+        }
+    return {
+        "pool": {
+            "max_connections": LM_CLIENT_MAX_CONNECTIONS,
+            "max_keepalive_connections": LM_CLIENT_MAX_KEEPALIVE,
+            "keepalive_expiry": LM_CLIENT_KEEPALIVE_EXPIRY,
+            "http2": LM_CLIENT_HTTP2,
+        },
+        "backends": backends,
+    }
+
+@app.get("/admission-stats/")
+async def get_admission_stats():
+    """In-flight generations, pending dates per client, observed dates/sec and 429 rejections."""
+    return admission.snapshot()
+
+@app.get("/parse-stats/")
+async def get_parse_stats():
+    """Lines parsed from LLM output, plus dropped or repaired lines by reason."""
+    return utterance_parser.snapshot()
+
+@app.get("/checkpoint-stats/")
+async def get_checkpoint_stats():
+    """Dates checkpointed per job_id and how many were replayed instead of regenerated."""
+    return checkpoint_store.snapshot()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: per-endpoint requests/latency, LLM TTFT, generation time and tokens/sec, parse yield, in-flight generations."""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/backends/")
+async def get_backends():
+    """Current routing state of every inference backend (outstanding requests, health, observed tokens/sec)."""
+    return llm_registry.snapshot()
+
+@app.get("/retry-stats/")
+async def get_retry_stats():
+    """LLM call retries, attempts that ran out of retries, and requests rejected because every backend's circuit was open."""
+    return retry_policy.snapshot()
+
+@app.get("/hedge-stats/")
+async def get_hedge_stats():
+    """Hedge rate, which side won, and the estimated latency saved by hedged generations."""
+    return hedge_policy.snapshot()
+
+@app.get("/cache-stats/")
+async def get_cache_stats():
+    """Hit/miss counters and disk usage of the generation cache."""
+    return response_cache.snapshot()
+
+@app.get("/coalescing-stats/")
+async def get_coalescing_stats():
+    """How many /generate-stream/ requests started a generation vs. joined one already in flight."""
+    return stream_flight.snapshot()
+
+@app.get("/token-budget-stats/")
+async def get_token_budget_stats():
+    """Observed completion tokens per utterance for each (model, situation) that drive the adaptive max_tokens."""
+    return token_budget.snapshot()
+
+@app.get("/stream-decode-stats/")
+async def get_stream_decode_stats():
+    """Per-backend stream decoder counters; malformed_events and decode_errors should stay at zero."""
+    return stream_decode_metrics
+
 @app.get("/get_situation_options/")
 async def get_situation_options(age: int):
     age_group = get_age_group(age)